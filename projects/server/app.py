@@ -1,12 +1,31 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
 import os
 from logging.handlers import TimedRotatingFileHandler
 from fastapi.routing import APIRoute
 from services.path import get_log_folder, get_cache_folder
+from services.env import get_env_flag
+from services.removebg_worker import (
+    shutdown_removebg_workers,
+    warm_up_removebg_workers,
+)
 from routers.generation_router import router as generation_router
+from routers.job_router import router as job_router
+from routers.admin_router import router as admin_router
+from routers.asset_router import router as asset_router
+from routers.history_router import router as history_router
+from routers.metrics_router import router as metrics_router
+from services.gen_models.client_pool import client_pool
+from services.gen_models.mock.mock_provider import shutdown_mock_provider
+from services.jobs import job_manager
+from services.job_store import job_store
+from services.downloader import downloader
+from services.cache_manager import cache_manager
+from services.tracing import TracingMiddleware
 
 
 def setup_logging():
@@ -47,9 +66,27 @@ log_file = setup_logging()
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if get_env_flag("REMBG_WARMUP"):
+        logger.info("Warming up background removal model")
+        await asyncio.to_thread(warm_up_removebg_workers)
+    cache_manager.start()
+    await job_manager.interrupt_unfinished()
+    yield
+    await cache_manager.shutdown()
+    await job_manager.shutdown()
+    job_store.close()
+    client_pool.close()
+    shutdown_mock_provider()
+    downloader.shutdown()
+    shutdown_removebg_workers()
+
+
 app = FastAPI(
     title="PiXelDa Server",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -59,11 +96,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TracingMiddleware)
 
 frames_dir = os.path.join(get_cache_folder(), "frames")
 os.makedirs(frames_dir, exist_ok=True)
 
 app.include_router(generation_router)
+app.include_router(job_router)
+app.include_router(admin_router)
+app.include_router(asset_router)
+app.include_router(history_router)
+app.include_router(metrics_router)
 
 app.mount("/frames", StaticFiles(directory=frames_dir), name="frames")
 
@@ -0,0 +1,493 @@
+"""Offline benchmarks of the frame pipeline on synthetic sprite videos.
+
+Run from projects/server:
+
+    python -m benchmarks.frame_pipeline --output results.json
+    python -m benchmarks.frame_pipeline --baseline results.json
+
+Exits with status 1 when a benchmark is slower per frame than its ceiling in
+thresholds.json, or slower than the same benchmark in the baseline results by more
+than --max-regression. The walk cycle comparison of the animation removebg mode
+also fails when its mean alpha error against full segmentation is over its ceiling.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+from typing import Callable, Optional
+
+# Keep benchmark videos, splits and zips out of the server's cache and job history,
+# which a running server may be writing to at the same time
+_data_dir = tempfile.mkdtemp(prefix="pixelda-bench-")
+os.environ.setdefault("JOB_STORE_PATH", os.path.join(_data_dir, "jobs.sqlite3"))
+os.environ.setdefault("CACHE_FOLDER", os.path.join(_data_dir, "cache"))
+
+import cv2
+import logging
+import numpy as np
+
+from benchmarks.synth import CODEC_EXTENSIONS, render_sprite_frame, write_sprite_video
+from services.path import get_cache_folder
+from services.asset_cache import get_asset_name, get_staging_path, ingest_asset
+from services.video_index import get_index_path, get_or_build_video_index
+from services.frame_writer import get_encoder_settings
+from services.image_tools import chroma_key_frames, detect_key_color
+from services.removebg_worker import (
+    get_removebg_workers,
+    remove_background_batch,
+    shutdown_removebg_workers,
+)
+from services.frame import (
+    FRAMES_ENDPOINT,
+    ANIMATION_BATCH_SIZE,
+    _make_animation_remover,
+    extract_frames_from_video,
+    process_split_frames,
+    zip_frames,
+)
+from services.job_store import job_store
+from defs import (
+    DEFAULT_KEY_SOFTNESS,
+    DEFAULT_KEY_TOLERANCE,
+    FrameSplitRequest,
+    REMOVEBG_MODE_ANIMATION,
+    REMOVEBG_MODE_CHROMA,
+    REMOVEBG_MODE_REMBG,
+    ZipFramesRequest,
+)
+
+DEFAULT_RESOLUTIONS = ["256x256", "512x512", "1280x720"]
+DEFAULT_SECONDS = [2.0, 8.0]
+DEFAULT_CODECS = ["mp4v", "MJPG"]
+DEFAULT_FPS = 24.0
+DEFAULT_REPETITIONS = 3
+DEFAULT_SPLIT_COUNT = 16
+DEFAULT_MAX_REGRESSION = 0.25
+# Differences below this are timer and scheduler noise, not regressions
+MIN_REGRESSION_SECONDS = 0.005
+DEFAULT_THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), "thresholds.json")
+BENCHMARK_URL_TEMPLATE = "http://benchmark.invalid/{}"
+
+BENCH_SPLIT = "process_split_frames"
+BENCH_EXTRACT = "extract_frames_from_video"
+BENCH_ZIP = "zip_frames"
+BENCH_REMOVEBG = "remove_background"
+BENCH_WALK_CYCLE = "animation_walk_cycle"
+
+# Animation mode against segmenting every frame of one synthetic walk cycle
+WALK_CYCLE_FRAMES = 40
+WALK_CYCLE_SIZE = (512, 512)
+
+
+class Case:
+    """One synthetic video and the benchmarks run on it"""
+
+    def __init__(self, codec: str, width: int, height: int, seconds: float, fps: float):
+        self.codec = codec
+        self.width = width
+        self.height = height
+        self.seconds = seconds
+        self.fps = fps
+        self.video_path: Optional[str] = None
+        self.frame_count = 0
+        self.gop_size = 0
+
+    @property
+    def case_id(self) -> str:
+        return f"{self.codec}-{self.width}x{self.height}-{self.seconds:g}s"
+
+    def to_dict(self) -> dict:
+        return {
+            "codec": self.codec,
+            "width": self.width,
+            "height": self.height,
+            "seconds": self.seconds,
+            "fps": self.fps,
+            "frame_count": self.frame_count,
+            "gop_size": self.gop_size,
+        }
+
+
+def parse_resolution(value: str) -> tuple[int, int]:
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid resolution: {value}")
+    return width, height
+
+
+def measure(
+    run: Callable[[], int],
+    repetitions: int,
+    setup: Optional[Callable[[], None]] = None,
+) -> tuple[list[float], int]:
+    """Time run after one untimed warm-up, returning the durations and the number of
+    frames the last run processed"""
+    frames = 0
+    durations = []
+    for i in range(repetitions + 1):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        frames = run()
+        if i > 0:
+            durations.append(time.perf_counter() - started)
+    return durations, frames
+
+
+def summarize(
+    benchmark: str, case: Case, durations: list[float], frames: int, **extra
+) -> dict:
+    median = statistics.median(durations)
+    return {
+        "name": f"{benchmark}[{case.case_id}]",
+        "benchmark": benchmark,
+        "case": case.to_dict(),
+        "repetitions": len(durations),
+        "seconds": {
+            "min": min(durations),
+            "median": median,
+            "mean": statistics.fmean(durations),
+            "max": max(durations),
+        },
+        "frames": frames,
+        "ms_per_frame": median * 1000 / frames if frames else None,
+        "frames_per_second": frames / median if median > 0 else None,
+        **extra,
+    }
+
+
+def prepare_video(case: Case) -> str:
+    """Synthesize the case's video into the benchmark's asset store, returning its URL"""
+    extension = CODEC_EXTENSIONS[case.codec]
+    url = BENCHMARK_URL_TEMPLATE.format(f"{case.case_id}{extension}")
+    staging_path = get_staging_path(get_asset_name(url))
+    case.frame_count = write_sprite_video(
+        staging_path, case.width, case.height, case.seconds, case.fps, case.codec
+    )
+    case.video_path = ingest_asset(get_asset_name(url), staging_path)
+    # A video is indexed once, on its first split; time the splits after that
+    case.gop_size = get_or_build_video_index(case.video_path).gop_size
+    return url
+
+
+def remove_video(case: Case) -> None:
+    for path in (case.video_path, get_index_path(case.video_path)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def get_frame_dir(frame_url: str) -> str:
+    frame_dir_name = frame_url.strip("/").split("/")[1]
+    return os.path.join(get_cache_folder(), FRAMES_ENDPOINT, frame_dir_name)
+
+
+def run_case(case: Case, args, work_dir: str) -> list[dict]:
+    results = []
+    url = prepare_video(case)
+    count = min(args.split_count, case.frame_count)
+    split_request = FrameSplitRequest(
+        task_id=f"benchmark-{case.case_id}",
+        video_url=url,
+        from_time=0.0,
+        to_time=(case.frame_count - 1) / case.fps,
+        count=count,
+    )
+
+    frame_urls: list[str] = []
+
+    def clear_split() -> None:
+        # Cold splits: drop the cached frames of the previous run
+        if frame_urls:
+            shutil.rmtree(get_frame_dir(frame_urls[0]), ignore_errors=True)
+
+    def split() -> int:
+        frame_urls[:] = process_split_frames(split_request)["frames"]
+        return len(frame_urls)
+
+    durations, frames = measure(split, args.repetitions, setup=clear_split)
+    results.append(summarize(BENCH_SPLIT, case, durations, frames))
+
+    extract_dir = os.path.join(work_dir, f"extract-{case.case_id}")
+
+    def clear_extract() -> None:
+        shutil.rmtree(extract_dir, ignore_errors=True)
+        os.makedirs(extract_dir)
+
+    def extract() -> int:
+        return len(
+            extract_frames_from_video(
+                case.video_path,
+                max(1, case.frame_count // count),
+                count,
+                extract_dir,
+            )
+        )
+
+    durations, frames = measure(extract, args.repetitions, setup=clear_extract)
+    results.append(summarize(BENCH_EXTRACT, case, durations, frames))
+    shutil.rmtree(extract_dir, ignore_errors=True)
+
+    zip_modes = [None, REMOVEBG_MODE_CHROMA]
+    if args.rembg:
+        zip_modes += [REMOVEBG_MODE_REMBG, REMOVEBG_MODE_ANIMATION]
+    for mode in zip_modes:
+        zip_request = ZipFramesRequest(
+            name="benchmark",
+            frame_urls=frame_urls,
+            removebg=mode is not None,
+            removebg_mode=mode or REMOVEBG_MODE_REMBG,
+        )
+        zip_size = 0
+
+        def zip_all() -> int:
+            nonlocal zip_size
+            zip_size = sum(len(chunk) for chunk in zip_frames(zip_request))
+            return len(frame_urls)
+
+        durations, frames = measure(zip_all, args.repetitions)
+        results.append(
+            summarize(
+                f"{BENCH_ZIP}[{mode}]" if mode else BENCH_ZIP,
+                case,
+                durations,
+                frames,
+                zip_bytes=zip_size,
+            )
+        )
+
+    frame_dir = get_frame_dir(frame_urls[0])
+    stack = np.stack(
+        [
+            cv2.imread(os.path.join(frame_dir, url.rsplit("/", 1)[1]))
+            for url in frame_urls
+        ]
+    )
+    key_color = detect_key_color(stack)
+    removers = {
+        REMOVEBG_MODE_CHROMA: lambda: chroma_key_frames(
+            stack, key_color, DEFAULT_KEY_TOLERANCE, DEFAULT_KEY_SOFTNESS
+        )
+    }
+    if args.rembg:
+        removers[REMOVEBG_MODE_REMBG] = lambda: remove_background_batch(stack)
+    for mode, remove in removers.items():
+        durations, frames = measure(lambda: len(remove()), args.repetitions)
+        results.append(summarize(f"{BENCH_REMOVEBG}[{mode}]", case, durations, frames))
+
+    shutil.rmtree(frame_dir, ignore_errors=True)
+    remove_video(case)
+    return results
+
+
+def run_walk_cycle(args) -> dict:
+    """Compare animation mode with segmenting every frame of a walk cycle, counting
+    the frames it segments and its mean alpha error against full segmentation.
+
+    The segmenter is rembg with --rembg, otherwise a chroma key, which isolates the
+    cost of propagating masks with optical flow from rembg's own errors.
+    """
+    width, height = WALK_CYCLE_SIZE
+    frames = np.stack(
+        [
+            render_sprite_frame(width, height, i / args.fps)
+            for i in range(WALK_CYCLE_FRAMES)
+        ]
+    )
+    if args.rembg:
+        segmenter = REMOVEBG_MODE_REMBG
+        segment = remove_background_batch
+    else:
+        segmenter = REMOVEBG_MODE_CHROMA
+        key_color = detect_key_color(frames)
+
+        def segment(batch: np.ndarray) -> np.ndarray:
+            return chroma_key_frames(
+                batch, key_color, DEFAULT_KEY_TOLERANCE, DEFAULT_KEY_SOFTNESS
+            )
+
+    reference = segment(frames)[..., 3].astype(np.float32)
+
+    segmented = 0
+
+    def counted_segment(batch: np.ndarray) -> np.ndarray:
+        nonlocal segmented
+        segmented += len(batch)
+        return segment(batch)
+
+    request = ZipFramesRequest(
+        name="benchmark", frame_urls=[], removebg_mode=REMOVEBG_MODE_ANIMATION
+    )
+    output = None
+
+    def remove_all() -> int:
+        nonlocal segmented, output
+        segmented = 0
+        # Batched like zip_frames, with the reference mask carried between batches
+        remove = _make_animation_remover(request, counted_segment)
+        output = np.concatenate(
+            [
+                remove(frames[start : start + ANIMATION_BATCH_SIZE])
+                for start in range(0, len(frames), ANIMATION_BATCH_SIZE)
+            ]
+        )
+        return len(frames)
+
+    durations, count = measure(remove_all, args.repetitions)
+    alpha_error = np.abs(output[..., 3].astype(np.float32) - reference).mean() / 255
+    case = Case("synthetic", width, height, WALK_CYCLE_FRAMES / args.fps, args.fps)
+    case.frame_count = WALK_CYCLE_FRAMES
+    return summarize(
+        BENCH_WALK_CYCLE,
+        case,
+        durations,
+        count,
+        segmenter=segmenter,
+        segmented_frames=segmented,
+        mean_alpha_error=float(alpha_error),
+    )
+
+
+def check_results(
+    results: list[dict],
+    thresholds: dict,
+    baseline: Optional[dict],
+    max_regression: float,
+) -> list[str]:
+    """Describe every result over its per-frame ceiling or slower than its baseline"""
+    failures = []
+    ceilings = thresholds.get("max_ms_per_frame", {})
+    max_alpha_errors = thresholds.get("max_mean_alpha_error", {})
+    previous = {r["name"]: r for r in baseline["results"]} if baseline else {}
+
+    for result in results:
+        ceiling = ceilings.get(result["benchmark"])
+        if ceiling is not None and result["ms_per_frame"] > ceiling:
+            failures.append(
+                f"{result['name']}: {result['ms_per_frame']:.2f} ms/frame, "
+                f"ceiling {ceiling} ms/frame"
+            )
+        max_alpha_error = max_alpha_errors.get(result["benchmark"])
+        if (
+            max_alpha_error is not None
+            and result.get("mean_alpha_error", 0) > max_alpha_error
+        ):
+            failures.append(
+                f"{result['name']}: mean alpha error {result['mean_alpha_error']:.2%}, "
+                f"ceiling {max_alpha_error:.2%}"
+            )
+
+        before = previous.get(result["name"])
+        if before is None:
+            continue
+        median = result["seconds"]["median"]
+        before_median = before["seconds"]["median"]
+        if (
+            median > before_median * (1 + max_regression)
+            and median - before_median > MIN_REGRESSION_SECONDS
+        ):
+            failures.append(
+                f"{result['name']}: median {median:.4f}s, baseline "
+                f"{before_median:.4f}s (+{median / before_median - 1:.0%})"
+            )
+    return failures
+
+
+def get_environment() -> dict:
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+        "frame_encoder": get_encoder_settings(),
+        "removebg_workers": get_removebg_workers(),
+    }
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the frame pipeline on synthetic sprite videos"
+    )
+    parser.add_argument(
+        "--resolutions",
+        nargs="+",
+        type=parse_resolution,
+        default=[parse_resolution(r) for r in DEFAULT_RESOLUTIONS],
+    )
+    parser.add_argument("--seconds", nargs="+", type=float, default=DEFAULT_SECONDS)
+    parser.add_argument(
+        "--codecs", nargs="+", choices=sorted(CODEC_EXTENSIONS), default=DEFAULT_CODECS
+    )
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS)
+    parser.add_argument("--repetitions", type=int, default=DEFAULT_REPETITIONS)
+    parser.add_argument("--split-count", type=int, default=DEFAULT_SPLIT_COUNT)
+    parser.add_argument(
+        "--rembg",
+        action="store_true",
+        help="Also benchmark the rembg and animation modes, which need the rembg model",
+    )
+    parser.add_argument("--output", help="Write the results here instead of stdout")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS_PATH)
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    with open(args.thresholds, "r", encoding="utf-8") as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="pixelda-bench-", dir=_data_dir)
+    try:
+        for codec in args.codecs:
+            for width, height in args.resolutions:
+                for seconds in args.seconds:
+                    case = Case(codec, width, height, seconds, args.fps)
+                    print(f"Benchmarking {case.case_id}", file=sys.stderr)
+                    results.extend(run_case(case, args, work_dir))
+        print(f"Benchmarking {BENCH_WALK_CYCLE}", file=sys.stderr)
+        results.append(run_walk_cycle(args))
+    finally:
+        if args.rembg:
+            shutdown_removebg_workers()
+        job_store.close()
+        shutil.rmtree(_data_dir, ignore_errors=True)
+
+    failures = check_results(results, thresholds, baseline, args.max_regression)
+    report = {
+        "created_at": time.time(),
+        "environment": get_environment(),
+        "results": results,
+        "failures": failures,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""Load test the generation routes against the mock provider.
+
+Run from projects/server:
+
+    python -m benchmarks.load_test --kind image --concurrency 32 --requests 500
+
+Starts the server with MOCK_PROVIDER=1 and provider limits raised out of the way,
+keeps --concurrency requests in flight against /generate/<kind> with
+model_type=mock, and reports throughput, latency percentiles and the server's
+thread count and memory as JSON. The mock provider reads its latency distribution
+and failure rates from the environment (MOCK_IMAGE_LATENCY, MOCK_VIDEO_LATENCY,
+MOCK_LATENCY_DISTRIBUTION, MOCK_LATENCY_SPREAD, MOCK_FAILURE_RATE, ...), which the
+server inherits. Use --url to load an already running server instead, and --pid to
+still sample its threads and memory.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import socket
+import shutil
+import signal
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+
+from services.gen_models.mock.mock_provider import MOCK_MODEL_TYPE
+from defs import JOB_KIND_IMAGE, JOB_KIND_VIDEO
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_REQUESTS = 200
+DEFAULT_API_KEYS = 4
+DEFAULT_TIMEOUT = 600.0
+SERVER_START_TIMEOUT = 60.0
+SERVER_STOP_TIMEOUT = 30.0
+PROCESS_SAMPLE_INTERVAL = 0.25
+PERCENTILES = (50, 90, 99)
+ROUTES = {
+    JOB_KIND_IMAGE: "/generate/image",
+    JOB_KIND_VIDEO: "/generate/video",
+}
+PLACEHOLDER_IMAGE_URL = "http://127.0.0.1/mock-input.png"
+
+# Provider limits that would otherwise measure the queue instead of the server;
+# set any of them in the environment to load test with limits on
+SERVER_ENV_DEFAULTS = {
+    "MOCK_PROVIDER": "1",
+    "MOCK_MAX_CONCURRENCY": "100000",
+    "MOCK_KEY_MAX_CONCURRENCY": "100000",
+    "MOCK_RATE_LIMIT": "100000",
+    "MOCK_KEY_RATE_LIMIT": "100000",
+    "MOCK_BURST": "100000",
+    "PROVIDER_QUEUE_SIZE": "100000",
+    "MOCK_IMAGE_LATENCY": "2",
+    "MOCK_VIDEO_LATENCY": "10",
+}
+
+
+def percentile(values: list[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, data_dir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    for name, value in SERVER_ENV_DEFAULTS.items():
+        env.setdefault(name, value)
+    env["PORT"] = str(port)
+    env["HOST"] = "127.0.0.1"
+    # Keep load test jobs and their results out of the server's history and caches
+    env.setdefault("JOB_STORE_PATH", os.path.join(data_dir, "jobs.sqlite3"))
+    env.setdefault("CACHE_FOLDER", os.path.join(data_dir, "cache"))
+    return subprocess.Popen(
+        [sys.executable, "app.py"],
+        cwd=SERVER_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_for_server(url: str, process: Optional[subprocess.Popen]) -> None:
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            requests.get(f"{url}/", timeout=1).raise_for_status()
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not answer at {url}")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    # SIGINT runs the lifespan shutdown, like stopping it from a terminal
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(SERVER_STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+class ProcessSampler:
+    """Track the thread count and resident memory of a process from /proc"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.threads: list[int] = []
+        self.rss_bytes: list[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> None:
+        with open(f"/proc/{self.pid}/status", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        self.threads.append(int(fields["Threads"]))
+        self.rss_bytes.append(int(fields["VmRSS"].split()[0]) * 1024)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._sample()
+            except (OSError, KeyError, ValueError):
+                return
+            self._stop.wait(PROCESS_SAMPLE_INTERVAL)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        if not self.threads:
+            return {}
+        return {
+            "pid": self.pid,
+            "threads_start": self.threads[0],
+            "threads_max": max(self.threads),
+            "threads_end": self.threads[-1],
+            "rss_bytes_start": self.rss_bytes[0],
+            "rss_bytes_max": max(self.rss_bytes),
+            "rss_bytes_end": self.rss_bytes[-1],
+        }
+
+
+def build_payload(kind: str, i: int, api_keys: int) -> dict:
+    payload = {
+        "prompt": f"load test sprite {i}",
+        "model_type": MOCK_MODEL_TYPE,
+        # Several keys, as several users would send, spread the per-key limits
+        "api_key": f"load-test-key-{i % api_keys}",
+    }
+    if kind == JOB_KIND_VIDEO:
+        payload["base_image_url"] = PLACEHOLDER_IMAGE_URL
+    return payload
+
+
+def run_load(url: str, args) -> tuple[list[dict], float]:
+    local = threading.local()
+
+    def send(i: int) -> dict:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        started = time.monotonic()
+        try:
+            response = local.session.post(
+                f"{url}{ROUTES[args.kind]}",
+                json=build_payload(args.kind, i, args.api_keys),
+                timeout=args.timeout,
+            )
+            outcome = str(response.status_code)
+        except requests.RequestException as e:
+            outcome = type(e).__name__
+        return {"outcome": outcome, "seconds": time.monotonic() - started}
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(send, range(args.requests)))
+    return results, time.monotonic() - started
+
+
+def summarize(results: list[dict], duration: float) -> dict:
+    outcomes = Counter(result["outcome"] for result in results)
+    latencies = [r["seconds"] for r in results if r["outcome"] == "200"]
+    return {
+        "requests": len(results),
+        "succeeded": len(latencies),
+        "outcomes": dict(outcomes),
+        "duration": duration,
+        "throughput": len(latencies) / duration if duration > 0 else None,
+        "latency": {
+            **{f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+            "mean": statistics.fmean(latencies) if latencies else None,
+            "max": max(latencies, default=None),
+        },
+    }
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Load test the generation routes against the mock provider"
+    )
+    parser.add_argument("--kind", choices=sorted(ROUTES), default=JOB_KIND_IMAGE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument("--api-keys", type=int, default=DEFAULT_API_KEYS)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--url", help="Load this server instead of starting one")
+    parser.add_argument("--pid", type=int, help="Process of the server at --url")
+    parser.add_argument("--output", help="Write the report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+
+    process = None
+    data_dir = tempfile.mkdtemp(prefix="pixelda-load-")
+    url = args.url
+    if url is None:
+        port = get_free_port()
+        url = f"http://127.0.0.1:{port}"
+        process = start_server(port, data_dir)
+
+    try:
+        wait_for_server(url, process)
+        pid = process.pid if process is not None else args.pid
+        sampler = ProcessSampler(pid) if pid else None
+        if sampler is not None:
+            sampler.start()
+
+        print(
+            f"Sending {args.requests} {args.kind} requests, {args.concurrency} at a time",
+            file=sys.stderr,
+        )
+        results, duration = run_load(url, args)
+        server = sampler.stop() if sampler is not None else {}
+    finally:
+        if process is not None:
+            stop_server(process)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "created_at": time.time(),
+        "config": {
+            "url": url,
+            "kind": args.kind,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "api_keys": args.api_keys,
+            "mock": {
+                name: os.getenv(name, SERVER_ENV_DEFAULTS.get(name))
+                for name in sorted(set(SERVER_ENV_DEFAULTS) | set(os.environ))
+                if name.startswith("MOCK_")
+            },
+        },
+        "environment": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        **summarize(results, duration),
+        "server": server,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0 if report["succeeded"] == report["requests"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import math
+import cv2
+import numpy as np
+
+# Provider animations are rendered on a green screen for keying
+BACKGROUND_COLOR = (0, 255, 0)
+# The sprite is drawn on a coarse grid and scaled up, like pixel art
+PIXEL_SIZE = 8
+
+# FourCC -> container; OpenCV fixes the keyframe interval of its encoders, so the
+# codec decides the GOP size: MJPG is all keyframes, MPEG-4 Part 2 one every 12
+CODEC_EXTENSIONS = {
+    "mp4v": ".mp4",
+    "XVID": ".avi",
+    "MJPG": ".avi",
+}
+
+
+def render_sprite_frame(width: int, height: int, t: float) -> np.ndarray:
+    """Draw a walking pixel-art figure crossing a flat background at time t"""
+    grid_w = max(1, width // PIXEL_SIZE)
+    grid_h = max(1, height // PIXEL_SIZE)
+    canvas = np.empty((grid_h, grid_w, 3), dtype=np.uint8)
+    canvas[:] = BACKGROUND_COLOR
+
+    unit = max(1, grid_h // 16)
+    x = int((t * 0.25 % 1.0) * grid_w)
+    ground = grid_h - 2 * unit
+    swing = int(round(math.sin(t * 2 * math.pi * 2) * 2 * unit))
+    bob = int(round(abs(math.sin(t * 2 * math.pi * 2)) * unit))
+
+    hip = ground - 4 * unit - bob
+    shoulder = hip - 5 * unit
+    # Legs, body, arms and head, with an outline colour like most sprites
+    cv2.line(canvas, (x, hip), (x - swing, ground), (40, 40, 160), unit)
+    cv2.line(canvas, (x, hip), (x + swing, ground), (40, 40, 200), unit)
+    cv2.rectangle(
+        canvas, (x - 2 * unit, shoulder), (x + 2 * unit, hip), (200, 80, 30), -1
+    )
+    cv2.line(canvas, (x, shoulder), (x + swing, hip), (60, 170, 240), unit)
+    cv2.circle(canvas, (x, shoulder - 2 * unit), 2 * unit, (120, 190, 250), -1)
+    cv2.rectangle(
+        canvas, (x - 2 * unit, shoulder), (x + 2 * unit, hip), (20, 20, 20), 1
+    )
+
+    return cv2.resize(canvas, (width, height), interpolation=cv2.INTER_NEAREST)
+
+
+def write_sprite_video(
+    path: str, width: int, height: int, seconds: float, fps: float, codec: str
+) -> int:
+    """Write a synthetic sprite animation, returning the number of frames written.
+
+    Raises RuntimeError if this OpenCV build cannot encode the codec.
+    """
+    writer = cv2.VideoWriter(
+        path, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*codec), fps, (width, height)
+    )
+    if not writer.isOpened():
+        raise RuntimeError(f"OpenCV cannot encode {codec} video")
+
+    frame_count = int(round(seconds * fps))
+    try:
+        for i in range(frame_count):
+            writer.write(render_sprite_frame(width, height, i / fps))
+    finally:
+        writer.release()
+    return frame_count
@@ -11,6 +11,61 @@ DEFAULT_TONGYI_VIDEO_MODEL = "wan2.2-i2v-flash"
 DEFAULT_DOUBAO_IMAGE_MODEL = "doubao-seedream-4-0-250828"
 DEFAULT_DOUBAO_VIDEO_MODEL = "doubao-seedance-1-0-pro-250528"
 
+REMOVEBG_MODE_REMBG = "rembg"
+REMOVEBG_MODE_CHROMA = "chroma"
+REMOVEBG_MODE_ANIMATION = "animation"
+DEFAULT_KEY_TOLERANCE = 24.0
+DEFAULT_KEY_SOFTNESS = 16.0
+DEFAULT_KEYFRAME_THRESHOLD = 8.0
+DEFAULT_KEYFRAME_INTERVAL = 8
+
+SPLIT_EVENT_FRAME = "frame"
+SPLIT_EVENT_DONE = "done"
+SPLIT_EVENT_ERROR = "error"
+
+BATCH_EVENT_IMAGE = "image"
+BATCH_EVENT_ERROR = "error"
+BATCH_EVENT_DONE = "done"
+MAX_BATCH_IMAGES = 64
+
+JOB_KIND_IMAGE = "image"
+JOB_KIND_EDIT = "edit"
+JOB_KIND_VIDEO = "video"
+JOB_KIND_SPLIT = "split"
+JOB_KIND_ZIP = "zip"
+JOB_KINDS = (
+    JOB_KIND_IMAGE,
+    JOB_KIND_EDIT,
+    JOB_KIND_VIDEO,
+    JOB_KIND_SPLIT,
+    JOB_KIND_ZIP,
+)
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+# Unfinished when the server stopped; runs again once its client resumes it
+JOB_STATUS_INTERRUPTED = "interrupted"
+JOB_FINISHED_STATUSES = (JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED)
+JOB_STATUSES = (
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_RUNNING,
+    *JOB_FINISHED_STATUSES,
+    JOB_STATUS_INTERRUPTED,
+)
+DEFAULT_HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 200
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+
+ROUTING_FIXED = "fixed"
+ROUTING_FAILOVER = "failover"
+ROUTING_HEDGED = "hedged"
+ROUTING_POLICIES = (ROUTING_FIXED, ROUTING_FAILOVER, ROUTING_HEDGED)
+
 
 class ImageGenerationRequest(BaseModel):
     api_key: Optional[str] = None
@@ -20,6 +75,11 @@ class ImageGenerationRequest(BaseModel):
     size: str = DEFAULT_IMAGE_SIZE
     task_id: Optional[str] = None
     model_type: str = "tongyi"
+    priority: str = PRIORITY_INTERACTIVE
+    use_cache: bool = False
+    n: int = 1
+    routing: str = ROUTING_FIXED
+    fallback_api_key: Optional[str] = None
 
 
 class ImageEditRequest(ImageGenerationRequest):
@@ -34,6 +94,9 @@ class VideoGenerationRequest(BaseModel):
     resolution: str = DEFAULT_VIDEO_RESOLUTION
     task_id: Optional[str] = None
     model_type: str = "tongyi"
+    priority: str = PRIORITY_INTERACTIVE
+    routing: str = ROUTING_FIXED
+    fallback_api_key: Optional[str] = None
 
 
 class FrameSplitRequest(BaseModel):
@@ -48,6 +111,13 @@ class ZipFramesRequest(BaseModel):
     name: str
     frame_urls: List[str]
     removebg: bool = False
+    removebg_mode: str = REMOVEBG_MODE_REMBG
+    key_color: Optional[str] = None
+    key_tolerance: float = DEFAULT_KEY_TOLERANCE
+    key_softness: float = DEFAULT_KEY_SOFTNESS
+    despill: bool = True
+    keyframe_threshold: float = DEFAULT_KEYFRAME_THRESHOLD
+    keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL
 
 
 class FrameSplitResponse(BaseModel):
@@ -56,7 +126,77 @@ class FrameSplitResponse(BaseModel):
     error_info: Optional[str] = None
 
 
+class FrameSplitEvent(BaseModel):
+    event: str
+    task_id: str
+    index: Optional[int] = None
+    timestamp: Optional[float] = None
+    url: Optional[str] = None
+    count: Optional[int] = None
+    error_info: Optional[str] = None
+
+
 class GenerationResponse(BaseModel):
     url: str
+    asset_url: Optional[str] = None
+    task_id: Optional[str] = None
+    error_info: Optional[str] = None
+
+
+class JobInfo(BaseModel):
+    job_id: str
+    kind: str
+    model_type: Optional[str] = None
+    status: str = JOB_STATUS_QUEUED
+    task_id: Optional[str] = None
+    url: Optional[str] = None
+    error_info: Optional[str] = None
+    urls: List[str] = []
+    asset_urls: List[str] = []
+    provider: Optional[str] = None
+    provider_task_id: Optional[str] = None
+    cached: bool = False
+    created_at: float
+    updated_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class JobResumeRequest(BaseModel):
+    api_key: Optional[str] = None
+    fallback_api_key: Optional[str] = None
+
+
+class JobRecord(JobInfo):
+    params: dict = {}
+
+
+class HistoryPage(BaseModel):
+    items: List[JobRecord]
+    next_cursor: Optional[str] = None
+
+
+class BatchImageGenerationRequest(BaseModel):
+    api_key: Optional[str] = None
+    prompts: List[str]
+    n: int = 1
+    negative_prompt: str = ""
+    seed: int = -1
+    size: str = DEFAULT_IMAGE_SIZE
     task_id: Optional[str] = None
+    model_type: str = "tongyi"
+    priority: str = PRIORITY_BATCH
+    use_cache: bool = False
+    routing: str = ROUTING_FIXED
+    fallback_api_key: Optional[str] = None
+
+
+class BatchImageEvent(BaseModel):
+    event: str
+    task_id: str
+    prompt_index: Optional[int] = None
+    variant_index: Optional[int] = None
+    url: Optional[str] = None
+    job_id: Optional[str] = None
+    count: Optional[int] = None
     error_info: Optional[str] = None
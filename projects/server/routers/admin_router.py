@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+import asyncio
+import logging
+from services.cache_manager import cache_manager
+from services.gen_models.client_pool import client_pool
+from services.provider_queue import provider_queue
+from services.routing_policy import routing_policy
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin")
+
+
+@router.get("/clients")
+async def get_client_pool_stats():
+    return client_pool.stats()
+
+
+@router.get("/queue")
+async def get_provider_queue_stats():
+    return provider_queue.stats()
+
+
+@router.get("/routing")
+async def get_routing_stats():
+    return routing_policy.stats()
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    return await asyncio.to_thread(cache_manager.stats)
+
+
+@router.post("/cache/gc")
+async def collect_cache():
+    return await asyncio.to_thread(cache_manager.collect)
+
+
+@router.get("/traces")
+async def get_traces():
+    return tracer.recent()
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace not found: {trace_id}")
+    return trace.to_dict()
+
+
+@router.get("/traces/{trace_id}/profile", response_class=PlainTextResponse)
+async def get_trace_profile(trace_id: str):
+    """Stack samples of a profiled trace as folded stacks, for flame graph tools"""
+    trace = tracer.get(trace_id)
+    if trace is None or not trace.profile:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {trace_id}")
+    return trace.folded_stacks()
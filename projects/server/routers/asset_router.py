@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+import asyncio
+import logging
+from services.asset_cache import ASSETS_ROUTE, is_asset_name, wait_for_asset
+from services.cache_manager import touch
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix=ASSETS_ROUTE)
+
+# An asset name is derived from the provider object, so its content never changes
+ASSET_CACHE_CONTROL = "public, max-age=86400, immutable"
+DOWNLOAD_WAIT_SECONDS = 60
+
+
+@router.get("/{asset_name}")
+async def get_asset(asset_name: str):
+    """Serve a cached provider result, waiting for it if it is still downloading.
+
+    Range requests are answered with partial content, so video players can seek.
+    """
+    if not is_asset_name(asset_name):
+        raise HTTPException(status_code=404, detail=f"Asset not found: {asset_name}")
+
+    asset_path = await asyncio.to_thread(
+        wait_for_asset, asset_name, DOWNLOAD_WAIT_SECONDS
+    )
+    if asset_path is None:
+        raise HTTPException(status_code=404, detail=f"Asset not found: {asset_name}")
+
+    # Just used, so the last candidate for eviction
+    touch(asset_path)
+    return FileResponse(asset_path, headers={"Cache-Control": ASSET_CACHE_CONTROL})
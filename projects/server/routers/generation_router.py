@@ -1,8 +1,8 @@
 from fastapi import APIRouter, HTTPException, Header
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
+from urllib.parse import quote
 import asyncio
 import logging
-import os
 from defs import (
     ImageGenerationRequest,
     VideoGenerationRequest,
@@ -11,9 +11,18 @@ from defs import (
     GenerationResponse,
     ZipFramesRequest,
     ImageEditRequest,
+    JOB_KIND_EDIT,
+    JOB_KIND_IMAGE,
+    JOB_KIND_VIDEO,
+    JOB_STATUS_SUCCEEDED,
+)
+from services.jobs import job_manager
+from services.frame import (
+    prepare_split_frames,
+    process_split_frames,
+    stream_split_frames,
+    zip_frames,
 )
-from services.gen_models.model_wrapper import ModelRouter
-from services.frame import process_split_frames, zip_frames
 
 logger = logging.getLogger(__name__)
 
@@ -35,22 +44,21 @@ async def generate_image(
         )
 
     try:
-        result = await asyncio.to_thread(
-            ModelRouter.generate_image,
-            request,
-        )
+        job = job_manager.submit(JOB_KIND_IMAGE, request)
+        job = await job_manager.wait(job.job_id)
+        if job.status != JOB_STATUS_SUCCEEDED:
+            raise Exception(job.error_info)
 
+        result = job.url
         if not result:
             raise HTTPException(status_code=500, detail="No result URL returned")
 
-        response_task_id = request.task_id
-        if not response_task_id:
-            response_task_id = (
-                f"img_{request.prompt[:20].replace(' ', '_')}_{request.model_type}"
-            )
+        response_task_id = job.task_id
 
         logger.info(f"Image generated successfully: {result}")
-        return GenerationResponse(url=result, task_id=response_task_id)
+        return GenerationResponse(
+            url=result, asset_url=job.asset_urls[0], task_id=response_task_id
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -79,22 +87,21 @@ async def edit_image(
         )
 
     try:
-        result = await asyncio.to_thread(
-            ModelRouter.edit_image,
-            request,
-        )
+        job = job_manager.submit(JOB_KIND_EDIT, request)
+        job = await job_manager.wait(job.job_id)
+        if job.status != JOB_STATUS_SUCCEEDED:
+            raise Exception(job.error_info)
 
+        result = job.url
         if not result:
             raise HTTPException(status_code=500, detail="No result URL returned")
 
-        response_task_id = request.task_id
-        if not response_task_id:
-            response_task_id = (
-                f"edit_{request.prompt[:20].replace(' ', '_')}_{request.model_type}"
-            )
+        response_task_id = job.task_id
 
         logger.info(f"Image edited successfully: {result}")
-        return GenerationResponse(url=result, task_id=response_task_id)
+        return GenerationResponse(
+            url=result, asset_url=job.asset_urls[0], task_id=response_task_id
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -117,22 +124,21 @@ async def generate_video(
         )
 
     try:
-        result = await asyncio.to_thread(
-            ModelRouter.generate_video,
-            request,
-        )
+        job = job_manager.submit(JOB_KIND_VIDEO, request)
+        job = await job_manager.wait(job.job_id)
+        if job.status != JOB_STATUS_SUCCEEDED:
+            raise Exception(job.error_info)
 
+        result = job.url
         if not result:
             raise HTTPException(status_code=500, detail="No result URL returned")
 
-        response_task_id = request.task_id
-        if not response_task_id:
-            response_task_id = (
-                f"vid_{request.prompt[:20].replace(' ', '_')}_{request.model_type}"
-            )
+        response_task_id = job.task_id
 
         logger.info(f"Video generated successfully: {result}")
-        return GenerationResponse(url=result, task_id=response_task_id)
+        return GenerationResponse(
+            url=result, asset_url=job.asset_urls[0], task_id=response_task_id
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -167,6 +173,26 @@ async def split_video_frames(request: FrameSplitRequest):
         )
 
 
+@router.post("/generate/video_split_frames/stream")
+async def split_video_frames_stream(request: FrameSplitRequest):
+    logger.info(f"Streaming video frames for task: {request.task_id}")
+
+    try:
+        split_plan = await asyncio.to_thread(prepare_split_frames, request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error preparing video frame split: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error splitting video frames: {str(e)}"
+        )
+
+    return StreamingResponse(
+        stream_split_frames(request, *split_plan),
+        media_type="application/x-ndjson",
+    )
+
+
 @router.post("/frames/zip")
 async def zip_frames_endpoint(request: ZipFramesRequest):
     logger.info(
@@ -174,18 +200,16 @@ async def zip_frames_endpoint(request: ZipFramesRequest):
     )
 
     try:
-        zip_path = await asyncio.to_thread(
-            zip_frames, request.frame_urls, request.name, request.removebg
-        )
-
-        if not os.path.exists(zip_path):
-            raise HTTPException(status_code=500, detail="Zip file was not created")
+        zip_stream = await asyncio.to_thread(zip_frames, request)
 
-        logger.info(f"Frames zipped successfully: {zip_path}")
-        return FileResponse(
-            path=zip_path,
-            filename=os.path.basename(zip_path),
+        zip_filename = f"{request.name}_frames.zip"
+        logger.info(f"Streaming frames zip: {zip_filename}")
+        return StreamingResponse(
+            zip_stream,
             media_type="application/zip",
+            headers={
+                "Content-Disposition": f"attachment; filename*=utf-8''{quote(zip_filename)}"
+            },
         )
     except HTTPException:
         raise
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+import asyncio
+import logging
+from defs import (
+    DEFAULT_HISTORY_LIMIT,
+    HistoryPage,
+    JOB_KINDS,
+    JOB_STATUSES,
+    JobRecord,
+    MAX_HISTORY_LIMIT,
+)
+from services.job_store import job_store
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/history")
+
+
+@router.get("", response_model=HistoryPage)
+async def get_history(
+    kind: Optional[str] = None,
+    status: Optional[str] = None,
+    task_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_HISTORY_LIMIT,
+):
+    """Recorded jobs, newest first; pass next_cursor back as cursor for the next page"""
+    if kind and kind not in JOB_KINDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported kind: {kind}. Supported: {', '.join(JOB_KINDS)}",
+        )
+    if status and status not in JOB_STATUSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported status: {status}. Supported: {', '.join(JOB_STATUSES)}",
+        )
+    if not 1 <= limit <= MAX_HISTORY_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit must be between 1 and {MAX_HISTORY_LIMIT}",
+        )
+
+    try:
+        return await asyncio.to_thread(
+            job_store.history, kind, status, task_id, cursor, limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{job_id}", response_model=JobRecord)
+async def get_history_entry(job_id: str):
+    record = await asyncio.to_thread(job_store.get, job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return record
@@ -0,0 +1,160 @@
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+import logging
+from defs import (
+    BatchImageGenerationRequest,
+    ImageEditRequest,
+    ImageGenerationRequest,
+    JOB_KIND_EDIT,
+    JOB_KIND_IMAGE,
+    JOB_KIND_VIDEO,
+    JobInfo,
+    JobResumeRequest,
+    VideoGenerationRequest,
+)
+from services.gen_models.model_wrapper import ModelRouter
+from services.jobs import GenerationRequest, job_manager
+from services.image_batch import (
+    get_default_batch_task_id,
+    plan_image_batch,
+    stream_image_batch,
+    submit_image_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs")
+
+
+def submit_job(
+    kind: str, request: GenerationRequest, x_api_key: Optional[str]
+) -> JobInfo:
+    if x_api_key:
+        request.api_key = x_api_key
+    elif not request.api_key:
+        raise HTTPException(
+            status_code=400,
+            detail="API key is required. Provide it in X-API-Key header or request body.",
+        )
+
+    if kind == JOB_KIND_EDIT and not request.image_url:
+        raise HTTPException(
+            status_code=400,
+            detail="Base image URL is required for image editing.",
+        )
+
+    try:
+        ModelRouter.check_model_type(request.model_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if kind != JOB_KIND_VIDEO:
+        max_images = ModelRouter.max_images_per_task(request.model_type)
+        if not 1 <= request.n <= max_images:
+            raise HTTPException(
+                status_code=400,
+                detail=f"n must be between 1 and {max_images} for {request.model_type}, use /jobs/image/batch for more.",
+            )
+
+    return job_manager.submit(kind, request)
+
+
+@router.post("/image", response_model=JobInfo, status_code=202)
+async def submit_image_job(
+    request: ImageGenerationRequest, x_api_key: str = Header(None, alias="X-API-Key")
+):
+    logger.info(f"Submitting image job with prompt: {request.prompt}")
+    return submit_job(JOB_KIND_IMAGE, request, x_api_key)
+
+
+@router.post("/image/batch")
+async def submit_image_batch_job(
+    request: BatchImageGenerationRequest,
+    x_api_key: str = Header(None, alias="X-API-Key"),
+):
+    """Generate n variants of several prompts concurrently, streamed back as NDJSON"""
+    if x_api_key:
+        request.api_key = x_api_key
+    elif not request.api_key:
+        raise HTTPException(
+            status_code=400,
+            detail="API key is required. Provide it in X-API-Key header or request body.",
+        )
+
+    try:
+        ModelRouter.check_model_type(request.model_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    request.task_id = request.task_id or get_default_batch_task_id(request)
+    chunks = plan_image_batch(request)
+    jobs = submit_image_batch(chunks)
+    logger.info(
+        f"Submitted batch {request.task_id}: {len(request.prompts)} prompts x {request.n} variants in {len(jobs)} tasks"
+    )
+
+    return StreamingResponse(
+        stream_image_batch(request, chunks, jobs),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post("/edit", response_model=JobInfo, status_code=202)
+async def submit_edit_job(
+    request: ImageEditRequest, x_api_key: str = Header(None, alias="X-API-Key")
+):
+    logger.info(f"Submitting image edit job with prompt: {request.prompt}")
+    return submit_job(JOB_KIND_EDIT, request, x_api_key)
+
+
+@router.post("/video", response_model=JobInfo, status_code=202)
+async def submit_video_job(
+    request: VideoGenerationRequest, x_api_key: str = Header(None, alias="X-API-Key")
+):
+    logger.info(f"Submitting video job with prompt: {request.prompt}")
+    return submit_job(JOB_KIND_VIDEO, request, x_api_key)
+
+
+@router.get("/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str):
+    info = job_manager.get(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return info
+
+
+@router.post("/{job_id}/resume", response_model=JobInfo, status_code=202)
+async def resume_job(
+    job_id: str,
+    request: Optional[JobResumeRequest] = None,
+    x_api_key: str = Header(None, alias="X-API-Key"),
+):
+    """Resume a job interrupted by a server restart. API keys are never stored, so
+    the client supplies them again."""
+    request = request or JobResumeRequest()
+    api_key = x_api_key or request.api_key
+    if not api_key:
+        raise HTTPException(
+            status_code=400,
+            detail="API key is required. Provide it in X-API-Key header or request body.",
+        )
+    return job_manager.resume_job(job_id, api_key, request.fallback_api_key)
+
+
+async def _iter_job_events(job_id: str) -> AsyncIterator[str]:
+    async for info in job_manager.watch(job_id):
+        yield f"event: {info.status}\ndata: {info.model_dump_json()}\n\n"
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-sent events with the job state on every change, closed once it finishes"""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+    return StreamingResponse(
+        _iter_job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+import logging
+from services.jobs import job_manager
+from services.provider_queue import provider_queue
+from services.cache_manager import cache_manager
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class StateCollector:
+    """Read job, queue and cache state when scraped instead of mirroring every change"""
+
+    def collect(self):
+        in_flight = GaugeMetricFamily(
+            "pixelda_jobs_in_flight", "Unfinished jobs", labels=["kind"]
+        )
+        for kind, count in job_manager.in_flight().items():
+            in_flight.add_metric([kind], count)
+        yield in_flight
+
+        waiting = GaugeMetricFamily(
+            "pixelda_provider_queue_waiting",
+            "Jobs waiting for a provider slot",
+            labels=["provider", "priority"],
+        )
+        active = GaugeMetricFamily(
+            "pixelda_provider_queue_active",
+            "Jobs holding a provider slot",
+            labels=["provider"],
+        )
+        for provider, stats in provider_queue.stats().items():
+            for priority, count in stats["waiting"].items():
+                waiting.add_metric([provider, priority], count)
+            active.add_metric([provider], stats["active"])
+        yield waiting
+        yield active
+
+        hits = CounterMetricFamily(
+            "pixelda_cache_hits", "Cache lookups that were served", labels=["area"]
+        )
+        misses = CounterMetricFamily(
+            "pixelda_cache_misses", "Cache lookups that missed", labels=["area"]
+        )
+        evictions = CounterMetricFamily(
+            "pixelda_cache_evictions", "Cache entries evicted", labels=["area"]
+        )
+        written = CounterMetricFamily(
+            "pixelda_cache_written_bytes", "Bytes written to the cache", labels=["area"]
+        )
+        for area in cache_manager.areas():
+            hits.add_metric([area.name], area.hits)
+            misses.add_metric([area.name], area.misses)
+            evictions.add_metric([area.name], area.evictions)
+            written.add_metric([area.name], area.written_bytes)
+        yield hits
+        yield misses
+        yield evictions
+        yield written
+
+
+REGISTRY.register(StateCollector())
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # Collected on the event loop, which owns the job and queue state it reads
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from pathlib import PurePosixPath
+from typing import Optional
+from urllib.parse import unquote, urlparse
+
+from services.path import get_cache_folder, hash_file
+from services.downloader import downloader
+from services.metrics import observe_download
+from services.tracing import trace_future
+from services.cache_manager import (
+    GIB,
+    CacheArea,
+    cache_manager,
+    get_area_budget,
+    touch,
+)
+
+logger = logging.getLogger(__name__)
+
+
+ASSETS_ENDPOINT = "assets"
+# Served under /cache, since the UI serves its own static files from /assets
+ASSETS_ROUTE = f"/cache/{ASSETS_ENDPOINT}"
+ASSET_ID_LENGTH = 32
+ASSET_NAME_PATTERN = re.compile(
+    r"^[0-9a-f]{%d}(\.[A-Za-z0-9]{1,8})?$" % ASSET_ID_LENGTH
+)
+# Asset name -> blob file name; blobs are named by the SHA-256 of their content
+ASSET_INDEX_FILENAME = ".index.json"
+DEFAULT_ASSETS_MAX_BYTES = 5 * GIB
+
+_index: Optional[dict[str, str]] = None
+_index_lock = threading.Lock()
+
+
+def get_assets_folder() -> str:
+    assets_folder = os.path.join(get_cache_folder(), ASSETS_ENDPOINT)
+    os.makedirs(assets_folder, exist_ok=True)
+    return assets_folder
+
+
+def get_asset_name(url: str) -> str:
+    """Local file name of a remote result, stable across re-signed URLs"""
+    parsed = urlparse(url)
+    # Signed provider URLs differ only in the query; the object path identifies the file
+    digest = hashlib.sha256(f"{parsed.netloc}{parsed.path}".encode("utf-8")).hexdigest()
+    extension = os.path.splitext(PurePosixPath(unquote(parsed.path)).name)[1].lower()
+    return f"{digest[:ASSET_ID_LENGTH]}{extension}"
+
+
+def get_staging_path(asset_name: str) -> str:
+    """Where an asset is downloaded to before it is stored by content"""
+    return os.path.join(get_assets_folder(), asset_name)
+
+
+def _get_index_path() -> str:
+    return os.path.join(get_assets_folder(), ASSET_INDEX_FILENAME)
+
+
+def _get_index() -> dict[str, str]:
+    global _index
+    if _index is None:
+        try:
+            with open(_get_index_path(), "r", encoding="utf-8") as f:
+                _index = json.load(f)
+        except FileNotFoundError:
+            _index = {}
+        except Exception as e:
+            logger.warning(f"Discarding unreadable asset index: {e}")
+            _index = {}
+    return _index
+
+
+def _save_index() -> None:
+    index_path = _get_index_path()
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(_index, f)
+    os.replace(temp_path, index_path)
+
+
+def get_asset_path(asset_name: str) -> Optional[str]:
+    """Local path of a cached asset, or None if it is not stored"""
+    with _index_lock:
+        blob_name = _get_index().get(asset_name)
+    if blob_name is None:
+        return None
+
+    blob_path = os.path.join(get_assets_folder(), blob_name)
+    if not os.path.exists(blob_path):
+        with _index_lock:
+            if _get_index().get(asset_name) == blob_name:
+                del _index[asset_name]
+                _save_index()
+        return None
+    return blob_path
+
+
+def ingest_asset(asset_name: str, staging_path: str) -> str:
+    """Move a downloaded file into the content-addressed store, returning its path.
+
+    Identical files reached through different URLs are stored once.
+    """
+    extension = os.path.splitext(asset_name)[1]
+    blob_name = f"{hash_file(staging_path)}{extension}"
+    blob_path = os.path.join(get_assets_folder(), blob_name)
+
+    if os.path.exists(blob_path):
+        logger.info(f"Asset {asset_name} duplicates stored blob {blob_name}")
+        os.remove(staging_path)
+        touch(blob_path)
+    else:
+        os.replace(staging_path, blob_path)
+        cache_manager.record_write(ASSETS_ENDPOINT, os.path.getsize(blob_path))
+
+    with _index_lock:
+        _get_index()[asset_name] = blob_name
+        _save_index()
+    return blob_path
+
+
+def _forget_blobs(paths: list[str]) -> None:
+    """Drop index entries of evicted blobs"""
+    evicted = {os.path.basename(path) for path in paths}
+    with _index_lock:
+        index = _get_index()
+        stale = [name for name, blob_name in index.items() if blob_name in evicted]
+        for asset_name in stale:
+            del index[asset_name]
+        if stale:
+            _save_index()
+
+
+cache_manager.register(
+    CacheArea(
+        ASSETS_ENDPOINT,
+        get_assets_folder(),
+        get_area_budget(ASSETS_ENDPOINT, DEFAULT_ASSETS_MAX_BYTES),
+        on_evict=_forget_blobs,
+    )
+)
+
+
+def get_asset_url(url: str, base_url: Optional[str] = None) -> str:
+    return f"{base_url or ''}{ASSETS_ROUTE}/{get_asset_name(url)}"
+
+
+def is_asset_name(asset_name: str) -> bool:
+    return ASSET_NAME_PATTERN.match(asset_name) is not None
+
+
+def _log_failure(asset_name: str, future: Future) -> None:
+    if future.exception() is not None:
+        logger.warning(f"Asset download failed: {asset_name}: {future.exception()}")
+
+
+def fetch_asset(url: str) -> Future:
+    """Start caching a remote file unless it is cached or on its way; the future
+    resolves to the local path"""
+    asset_name = get_asset_name(url)
+    asset_path = get_asset_path(asset_name)
+    if asset_path is not None:
+        touch(asset_path)
+        future = Future()
+        future.set_result(asset_path)
+        return future
+
+    future = downloader.submit(
+        url,
+        get_staging_path(asset_name),
+        finalize=lambda staging_path: ingest_asset(asset_name, staging_path),
+    )
+    future.add_done_callback(lambda f: _log_failure(asset_name, f))
+    observe_download(future)
+    trace_future("download", future, asset=asset_name)
+    return future
+
+
+def cache_in_background(url: str) -> str:
+    """Cache a provider result without waiting for it, returning the URL unchanged"""
+    fetch_asset(url)
+    return url
+
+
+def wait_for_asset(asset_name: str, timeout: Optional[float] = None) -> Optional[str]:
+    """Local path of a cached asset, waiting for its download if one is running"""
+    future = downloader.pending(get_staging_path(asset_name))
+    if future is not None:
+        try:
+            return future.result(timeout)
+        except Exception:
+            return None
+
+    return get_asset_path(asset_name)
+
+
+def is_downloading(asset_name: str) -> bool:
+    return downloader.pending(get_staging_path(asset_name)) is not None
+
+
+def find_local_asset(url: str, timeout: Optional[float] = None) -> Optional[str]:
+    """Local copy of a remote URL or of one of our own asset URLs, if there is one"""
+    path = PurePosixPath(urlparse(url).path)
+    if str(path.parent) == ASSETS_ROUTE and is_asset_name(path.name):
+        asset_path = wait_for_asset(path.name, timeout)
+    else:
+        asset_path = wait_for_asset(get_asset_name(url), timeout)
+
+    if asset_path is None:
+        cache_manager.record_miss(ASSETS_ENDPOINT)
+        return None
+    cache_manager.record_hit(ASSETS_ENDPOINT)
+    touch(asset_path)
+    return asset_path
@@ -0,0 +1,270 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_GC_INTERVAL = 600
+# Eviction frees space down to this share of the budget, so GC does not run at the limit
+LOW_WATERMARK = 0.9
+# Leftovers of interrupted writes older than this are garbage
+STALE_PARTIAL_SECONDS = 24 * 3600
+PARTIAL_SUFFIXES = (".part", ".tmp")
+
+GIB = 1024**3
+
+
+def get_gc_interval() -> float:
+    return float(os.getenv("CACHE_GC_INTERVAL", str(DEFAULT_GC_INTERVAL)))
+
+
+def get_area_budget(name: str, default: int) -> int:
+    """Get the size budget of a cache area in bytes, e.g. CACHE_MAX_BYTES_FRAMES"""
+    return int(os.getenv(f"CACHE_MAX_BYTES_{name.upper()}", str(default)))
+
+
+class _Entry:
+    """Files of one cache entry: a file with its sidecars, or a directory"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.paths: list[str] = []
+        self.size = 0
+        self.last_used = 0.0
+        self.partial = False
+
+
+class CacheArea:
+    """A cache folder whose entries are evicted least recently used first once it
+    outgrows its budget. Files sharing a name up to the first dot form one entry,
+    as do directories; names starting with a dot are left alone."""
+
+    def __init__(
+        self,
+        name: str,
+        folder: str,
+        max_bytes: int,
+        include: Optional[Callable[[os.DirEntry], bool]] = None,
+        on_evict: Optional[Callable[[list[str]], None]] = None,
+    ):
+        self.name = name
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.include = include
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.written_bytes = 0
+
+    def scan(self) -> list[_Entry]:
+        entries: dict[str, _Entry] = {}
+        try:
+            items = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            return []
+
+        for item in items:
+            if item.name.startswith(".") or (self.include and not self.include(item)):
+                continue
+            try:
+                if item.is_dir(follow_symlinks=False):
+                    key = item.name
+                    size, last_used = _directory_usage(item.path)
+                else:
+                    key = item.name.split(".", 1)[0]
+                    stat = item.stat()
+                    size, last_used = stat.st_size, stat.st_mtime
+            except FileNotFoundError:
+                continue
+
+            entry = entries.setdefault(key, _Entry(key))
+            entry.paths.append(item.path)
+            entry.size += size
+            entry.last_used = max(entry.last_used, last_used)
+            entry.partial = entry.partial or item.name.endswith(PARTIAL_SUFFIXES)
+        return list(entries.values())
+
+
+def _directory_usage(path: str) -> tuple[int, float]:
+    size = 0
+    last_used = os.stat(path).st_mtime
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                stat = os.stat(os.path.join(root, file_name))
+            except FileNotFoundError:
+                continue
+            size += stat.st_size
+            last_used = max(last_used, stat.st_mtime)
+    return size, last_used
+
+
+def touch(path: str) -> None:
+    """Mark a cached file or directory as just used"""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+class CacheManager:
+    """Keep every cache area within its budget without removing files in use"""
+
+    def __init__(self):
+        self._areas: dict[str, CacheArea] = {}
+        self._pins: Counter = Counter()
+        self._lock = threading.Lock()
+        self._runner: Optional[asyncio.Task] = None
+        self.last_collection: Optional[dict] = None
+
+    def register(self, area: CacheArea) -> CacheArea:
+        self._areas[area.name] = area
+        return area
+
+    def record_hit(self, area: str) -> None:
+        self._areas[area].hits += 1
+
+    def record_miss(self, area: str) -> None:
+        self._areas[area].misses += 1
+
+    def record_write(self, area: str, size: int) -> None:
+        self._areas[area].written_bytes += size
+
+    def areas(self) -> list[CacheArea]:
+        return list(self._areas.values())
+
+    def pin(self, path: str) -> None:
+        with self._lock:
+            self._pins[os.path.abspath(path)] += 1
+
+    def unpin(self, path: str) -> None:
+        path = os.path.abspath(path)
+        with self._lock:
+            self._pins[path] -= 1
+            if self._pins[path] <= 0:
+                del self._pins[path]
+
+    @contextmanager
+    def pinned(self, *paths: str) -> Iterator[None]:
+        """Keep paths out of eviction while the block runs"""
+        for path in paths:
+            self.pin(path)
+        try:
+            yield
+        finally:
+            for path in paths:
+                self.unpin(path)
+
+    def collect(self) -> dict:
+        """Evict least recently used entries of every area over its budget"""
+        started = time.monotonic()
+        report = {}
+        for area in self._areas.values():
+            report[area.name] = self._collect_area(area)
+
+        self.last_collection = {
+            "finished_at": time.time(),
+            "seconds": time.monotonic() - started,
+            "areas": report,
+        }
+        return self.last_collection
+
+    def _collect_area(self, area: CacheArea) -> dict:
+        entries = sorted(area.scan(), key=lambda e: e.last_used)
+        total = sum(entry.size for entry in entries)
+        target = area.max_bytes * LOW_WATERMARK
+        stale_before = time.time() - STALE_PARTIAL_SECONDS
+
+        # Partial files belong to a running writer until they go stale
+        candidates = [e for e in entries if e.partial and e.last_used < stale_before]
+        candidates += [e for e in entries if not e.partial]
+
+        evicted = []
+        freed = 0
+        for entry in candidates:
+            if not entry.partial and total - freed <= target:
+                break
+            with self._lock:
+                if any(os.path.abspath(path) in self._pins for path in entry.paths):
+                    continue
+                for path in entry.paths:
+                    _remove(path)
+            evicted.append(entry)
+            freed += entry.size
+
+        if evicted:
+            area.evictions += len(evicted)
+            area.evicted_bytes += freed
+            logger.info(
+                f"Evicted {len(evicted)} entries ({freed} bytes) from cache area {area.name}"
+            )
+            if area.on_evict:
+                area.on_evict([path for entry in evicted for path in entry.paths])
+        return {"evicted": len(evicted), "freed_bytes": freed}
+
+    def stats(self) -> dict:
+        stats = {}
+        for area in self._areas.values():
+            entries = area.scan()
+            lookups = area.hits + area.misses
+            stats[area.name] = {
+                "folder": area.folder,
+                "entries": len(entries),
+                "bytes": sum(entry.size for entry in entries),
+                "max_bytes": area.max_bytes,
+                "hits": area.hits,
+                "misses": area.misses,
+                "hit_rate": area.hits / lookups if lookups else 0.0,
+                "evictions": area.evictions,
+                "evicted_bytes": area.evicted_bytes,
+                "written_bytes": area.written_bytes,
+            }
+        with self._lock:
+            pinned = len(self._pins)
+        return {
+            "areas": stats,
+            "pinned": pinned,
+            "last_collection": self.last_collection,
+        }
+
+    def start(self) -> None:
+        """Run garbage collection periodically on the event loop"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        interval = get_gc_interval()
+        while True:
+            try:
+                await asyncio.to_thread(self.collect)
+            except Exception as e:
+                logger.error(f"Cache garbage collection failed: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+    async def shutdown(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+
+def _remove(path: str) -> None:
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+cache_manager = CacheManager()
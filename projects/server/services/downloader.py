@@ -0,0 +1,195 @@
+import os
+import time
+import logging
+import threading
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Callable, Optional
+
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PARALLELISM = 4
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_RETRIES = 3
+RETRY_DELAY = 0.5
+CHUNK_SIZE = 256 * 1024
+PARTIAL_SUFFIX = ".part"
+
+
+def get_downloader_settings() -> dict:
+    """Get download parallelism, timeouts and retries from environment or use defaults"""
+    return {
+        "parallelism": int(os.getenv("DOWNLOAD_PARALLELISM", str(DEFAULT_PARALLELISM))),
+        "connect_timeout": float(
+            os.getenv("DOWNLOAD_CONNECT_TIMEOUT", str(DEFAULT_CONNECT_TIMEOUT))
+        ),
+        "read_timeout": float(
+            os.getenv("DOWNLOAD_READ_TIMEOUT", str(DEFAULT_READ_TIMEOUT))
+        ),
+        "retries": int(os.getenv("DOWNLOAD_RETRIES", str(DEFAULT_RETRIES))),
+    }
+
+
+class IncompleteDownloadError(IOError):
+    pass
+
+
+RETRYABLE_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    IncompleteDownloadError,
+)
+
+
+def get_partial_path(path: str) -> str:
+    return f"{path}{PARTIAL_SUFFIX}"
+
+
+class Downloader:
+    """Download files over pooled connections, one transfer per destination at a time
+
+    A transfer streams into <path>.part and is renamed into place once complete, so a
+    file at the destination is always whole. An interrupted transfer resumes from the
+    bytes already on disk, within the same call or the next one for that path.
+    """
+
+    def __init__(
+        self,
+        parallelism: int,
+        connect_timeout: float,
+        read_timeout: float,
+        retries: int,
+    ):
+        self.parallelism = parallelism
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=parallelism, pool_maxsize=parallelism)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._flight = SingleFlight()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.parallelism, thread_name_prefix="download"
+                )
+            return self._executor
+
+    def submit(
+        self, url: str, path: str, finalize: Optional[Callable[[str], str]] = None
+    ) -> Future:
+        """Download url to path unless it is there; joins a transfer already running
+        for path. The future resolves to path, or to what finalize returns when given:
+        it runs in the transfer once the file is complete and may move it elsewhere."""
+        if finalize is None and os.path.exists(path):
+            future = Future()
+            future.set_result(path)
+            return future
+
+        future, is_leader = self._flight.claim(path)
+        if is_leader:
+            self._get_executor().submit(self._run, url, path, finalize)
+        return future
+
+    def download(self, url: str, path: str) -> str:
+        return self.submit(url, path).result()
+
+    def pending(self, path: str) -> Optional[Future]:
+        return self._flight.pending(path)
+
+    def _run(
+        self, url: str, path: str, finalize: Optional[Callable[[str], str]]
+    ) -> None:
+        try:
+            self._download(url, path)
+            result = finalize(path) if finalize else path
+        except BaseException as e:
+            self._flight.resolve(path, error=e)
+            return
+        self._flight.resolve(path, result=result)
+
+    def _download(self, url: str, path: str) -> None:
+        if os.path.exists(path):
+            return
+
+        partial_path = get_partial_path(path)
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                self._fetch(url, partial_path)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(
+                    f"Download of {path} interrupted, resuming (attempt {attempt + 1}): {e}"
+                )
+                time.sleep(RETRY_DELAY * 2**attempt)
+
+        os.replace(partial_path, path)
+        logger.info(
+            f"Downloaded {os.path.getsize(path)} bytes to {path} in {time.monotonic() - started:.2f}s"
+        )
+
+    def _fetch(self, url: str, partial_path: str) -> None:
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self._session.get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            if response.status_code == 416:
+                # The partial file does not belong to what the server has now
+                logger.warning(f"Discarding unusable partial download {partial_path}")
+                os.remove(partial_path)
+                raise IncompleteDownloadError("Range not satisfiable")
+            response.raise_for_status()
+
+            if offset and response.status_code != 206:
+                logger.info(f"Server ignored the range request, restarting {url}")
+                offset = 0
+            elif offset:
+                logger.info(f"Resuming download at byte {offset}: {partial_path}")
+
+            with open(partial_path, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+
+            expected = self._expected_size(response, offset)
+            size = os.path.getsize(partial_path)
+            if expected is not None and size != expected:
+                if size > expected:
+                    # More than the whole file: the partial data cannot be trusted
+                    os.remove(partial_path)
+                raise IncompleteDownloadError(f"Got {size} of {expected} bytes")
+
+    @staticmethod
+    def _expected_size(response: requests.Response, offset: int) -> Optional[int]:
+        content_range = response.headers.get("Content-Range")
+        if content_range and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            return int(total) if total.isdigit() else None
+        # Decoded bodies do not match the transferred length
+        if response.headers.get("Content-Encoding"):
+            return None
+        content_length = response.headers.get("Content-Length")
+        return offset + int(content_length) if content_length else None
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+downloader = Downloader(**get_downloader_settings())
@@ -0,0 +1,10 @@
+import os
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+def get_env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in TRUE_VALUES
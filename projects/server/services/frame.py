@@ -1,19 +1,57 @@
-from pathlib import PurePosixPath
 import os
 import time
 import cv2
-import urllib.request
+import numpy as np
+import json
+import hashlib
+from itertools import chain
 import logging
 import zipfile
-import tempfile
-import shutil
 from fastapi import HTTPException
-from urllib.parse import unquote, urlparse
-from typing import Optional
+from typing import Callable, Iterator, Optional, Union
 
 from services.path import get_cache_folder
-from services.image_tools import remove_solid_background
-from defs import FrameSplitRequest
+from services.asset_cache import fetch_asset, find_local_asset
+from services.cache_manager import (
+    GIB,
+    CacheArea,
+    cache_manager,
+    get_area_budget,
+    touch,
+)
+from services.image_tools import (
+    chroma_key_frames,
+    detect_key_color,
+    frame_difference,
+    parse_key_color,
+    propagate_alpha,
+)
+from services.removebg_worker import get_removebg_batch_size, remove_background_batch
+from services.video_index import VideoIndex, get_or_build_video_index
+from services.single_flight import SingleFlight
+from services.frame_writer import FrameWriter, encode_frame, get_encoder_settings
+from services.job_store import job_store
+from services.tracing import span, traced
+from services.metrics import (
+    FRAME_DECODE_SECONDS,
+    FRAME_LOAD_SECONDS,
+    FRAME_REMOVEBG_SECONDS,
+    FRAME_ZIP_SECONDS,
+)
+from defs import (
+    FrameSplitEvent,
+    FrameSplitRequest,
+    JOB_KIND_SPLIT,
+    JOB_KIND_ZIP,
+    JobInfo,
+    REMOVEBG_MODE_ANIMATION,
+    REMOVEBG_MODE_CHROMA,
+    REMOVEBG_MODE_REMBG,
+    SPLIT_EVENT_DONE,
+    SPLIT_EVENT_ERROR,
+    SPLIT_EVENT_FRAME,
+    ZipFramesRequest,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -21,8 +59,35 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_BASE_URL = "http://localhost:8000"
 FRAMES_ENDPOINT = "frames"
-FRAME_FILENAME_TEMPLATE = "frame_{:04d}.png"
-FRAME_DIR_TEMPLATE = "{}_{}"
+FRAME_DIR_TEMPLATE = "split_{}"
+FRAME_MANIFEST_FILENAME = "manifest.json"
+SPLIT_KEY_LENGTH = 32
+ZIP_CHUNK_SIZE = 64 * 1024
+STORED_EXTENSIONS = (".png", ".webp", ".jpg", ".jpeg", ".gif")
+CHROMA_BATCH_SIZE = 32
+ANIMATION_BATCH_SIZE = 32
+REMOVEBG_MODES = (REMOVEBG_MODE_REMBG, REMOVEBG_MODE_CHROMA, REMOVEBG_MODE_ANIMATION)
+DEFAULT_GOP_SIZE = 250
+DEFAULT_FRAMES_MAX_BYTES = 2 * GIB
+
+EXTRACTION_MODE_AUTO = "auto"
+EXTRACTION_MODE_SEEK = "seek"
+EXTRACTION_MODE_SEQUENTIAL = "sequential"
+EXTRACTION_MODES = (
+    EXTRACTION_MODE_AUTO,
+    EXTRACTION_MODE_SEEK,
+    EXTRACTION_MODE_SEQUENTIAL,
+)
+
+_split_flight = SingleFlight()
+
+cache_manager.register(
+    CacheArea(
+        FRAMES_ENDPOINT,
+        os.path.join(get_cache_folder(), FRAMES_ENDPOINT),
+        get_area_budget(FRAMES_ENDPOINT, DEFAULT_FRAMES_MAX_BYTES),
+    )
+)
 
 
 def get_base_url() -> str:
@@ -30,26 +95,24 @@ def get_base_url() -> str:
     return os.getenv("BASE_URL", DEFAULT_BASE_URL)
 
 
-def get_cache_path(url: str) -> str:
-    cache_dir = get_cache_folder()
-    os.makedirs(cache_dir, exist_ok=True)
-    file_name = PurePosixPath(unquote(urlparse(url).path)).parts[-1]
-    logger.debug(f"Generated cache path: {os.path.join(cache_dir, file_name)}")
-    return os.path.join(cache_dir, file_name)
+def get_gop_size() -> int:
+    """Get the assumed keyframe interval of provider videos, in frames"""
+    return int(os.getenv("FRAME_SPLIT_GOP_SIZE", str(DEFAULT_GOP_SIZE)))
 
 
+@traced("get_or_download_file")
 def get_or_download_file(url: str) -> str:
-    cache_path = get_cache_path(url)
-
-    if os.path.exists(cache_path):
-        logger.info(f"File found in cache: {cache_path}")
-        return cache_path
+    # Our own /cache/assets URLs resolve locally, remote ones through the asset store
+    local_path = find_local_asset(url)
+    if local_path is not None:
+        logger.info(f"File found in asset cache: {local_path}")
+        return local_path
 
-    logger.info(f"Downloading file to cache: {cache_path}")
+    logger.info(f"Downloading file to asset cache: {url}")
     try:
-        urllib.request.urlretrieve(url, cache_path)
-        logger.info(f"File downloaded successfully: {cache_path}")
-        return cache_path
+        local_path = fetch_asset(url).result()
+        logger.info(f"File downloaded successfully: {local_path}")
+        return local_path
     except Exception as e:
         logger.error(f"Failed to download file from {url}: {str(e)}")
         raise HTTPException(
@@ -57,19 +120,65 @@ def get_or_download_file(url: str) -> str:
         )
 
 
-def create_frame_directory(task_id: str, cache_folder: str) -> tuple[str, str]:
-    timestamp = int(time.time())
-    frame_dir_name = FRAME_DIR_TEMPLATE.format(task_id, timestamp)
+def get_output_options() -> dict:
+    return get_encoder_settings()
+
+
+def get_split_cache_key(
+    video_digest: str, timestamps: list[float], to_time: Optional[float]
+) -> str:
+    payload = {
+        "video": video_digest,
+        "timestamps": [round(timestamp, 6) for timestamp in timestamps],
+        "to_time": None if to_time is None else round(to_time, 6),
+        "output": get_output_options(),
+    }
+    encoded = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def create_frame_directory(split_key: str, cache_folder: str) -> tuple[str, str]:
+    frame_dir_name = FRAME_DIR_TEMPLATE.format(split_key[:SPLIT_KEY_LENGTH])
     frames_dir = os.path.join(cache_folder, FRAMES_ENDPOINT)
     frame_dir_path = os.path.join(frames_dir, frame_dir_name)
     os.makedirs(frame_dir_path, exist_ok=True)
-    logger.info(f"Created frame directory: {frame_dir_path}")
+    logger.info(f"Using frame directory: {frame_dir_path}")
     return frame_dir_path, frame_dir_name
 
 
-def extract_frames_from_video(
+def load_frame_manifest(frame_dir_path: str) -> Optional[dict[int, str]]:
+    manifest_path = os.path.join(frame_dir_path, FRAME_MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            frame_filenames = {
+                int(i): filename for i, filename in json.load(f)["frames"].items()
+            }
+    except Exception as e:
+        logger.warning(f"Discarding unreadable frame manifest {manifest_path}: {e}")
+        return None
+
+    for filename in frame_filenames.values():
+        if not os.path.exists(os.path.join(frame_dir_path, filename)):
+            logger.warning(f"Cached frame missing, re-extracting: {filename}")
+            return None
+
+    return frame_filenames
+
+
+def save_frame_manifest(frame_dir_path: str, frame_filenames: dict[int, str]) -> None:
+    manifest_path = os.path.join(frame_dir_path, FRAME_MANIFEST_FILENAME)
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"frames": frame_filenames}, f)
+    os.replace(temp_path, manifest_path)
+
+
+def iter_frames_from_video(
     video_path: str, frame_interval: int, max_frames: int, frame_dir_path: str
-) -> list[str]:
+) -> Iterator[str]:
     logger.info(f"Starting frame extraction from video: {video_path}")
     logger.info(f"Frame interval: {frame_interval}, Max frames: {max_frames}")
 
@@ -79,86 +188,240 @@ def extract_frames_from_video(
         logger.error(f"Cannot open video file: {video_path}")
         raise HTTPException(status_code=500, detail="Cannot open video file")
 
-    frames = []
+    writer = FrameWriter(frame_dir_path)
     frame_index = 0
+    submitted_count = 0
+    # Only frames on disk count towards max_frames; a failed write is replaced
     extracted_count = 0
 
     try:
-        while extracted_count < max_frames:
-            ret, frame = cap.read()
+        while True:
+            if extracted_count + writer.pending >= max_frames:
+                if not writer.pending:
+                    break
+                for _, frame_filename in writer.iter_completed(wait=True):
+                    extracted_count += 1
+                    yield frame_filename
+                continue
+
+            with FRAME_DECODE_SECONDS.time():
+                ret, frame = cap.read()
             if not ret:
-                logger.info(f"End of video reached. Extracted {extracted_count} frames")
+                logger.info(f"End of video reached after {frame_index} frames")
                 break
 
             if frame_index % frame_interval == 0:
-                frame_filename = FRAME_FILENAME_TEMPLATE.format(extracted_count)
-                frame_filepath = os.path.join(frame_dir_path, frame_filename)
-
-                if not cv2.imwrite(frame_filepath, frame):
-                    logger.warning(
-                        f"Failed to save frame {extracted_count} to {frame_filepath}"
-                    )
-                    continue
+                writer.submit(submitted_count, frame)
+                submitted_count += 1
+                logger.debug(f"Extracting frame {submitted_count}/{max_frames}")
 
-                frames.append(frame_filename)
-                extracted_count += 1
-                logger.debug(f"Extracted frame {extracted_count}/{max_frames}")
+                for _, frame_filename in writer.iter_completed():
+                    extracted_count += 1
+                    yield frame_filename
 
             frame_index += 1
+
+        for _, frame_filename in writer.iter_completed(wait=True):
+            extracted_count += 1
+            yield frame_filename
     finally:
+        writer.close()
         cap.release()
+        cache_manager.record_write(FRAMES_ENDPOINT, writer.written_bytes)
         logger.info(f"Video capture released. Total frames processed: {frame_index}")
 
+
+def extract_frames_from_video(
+    video_path: str, frame_interval: int, max_frames: int, frame_dir_path: str
+) -> list[str]:
+    frames = sorted(
+        iter_frames_from_video(video_path, frame_interval, max_frames, frame_dir_path)
+    )
     logger.info(f"Frame extraction completed. Extracted {len(frames)} frames")
     return frames
 
 
-def extract_frames_at_timestamps(
-    video_path: str, timestamps: list[float], frame_dir_path: str
-) -> list[str]:
+def should_decode_sequentially(frame_numbers: list[int], gop_size: int) -> bool:
+    """Prefer one linear pass when seeking would re-decode most of the span anyway"""
+    unique_frames = sorted(set(frame_numbers))
+    if len(unique_frames) <= 1:
+        return False
+    span = unique_frames[-1] - unique_frames[0]
+    # Every seek decodes on average half a GOP from the previous keyframe
+    return span <= len(unique_frames) * gop_size / 2
+
+
+def _iter_frames_by_seeking(
+    cap: cv2.VideoCapture,
+    targets: dict[int, int],
+    timestamps: list[float],
+    writer: FrameWriter,
+) -> Iterator[tuple[int, str]]:
+    for i, frame_number in targets.items():
+        with FRAME_DECODE_SECONDS.time():
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            ret, frame = cap.read()
+
+        if not ret:
+            logger.warning(
+                f"Could not read frame at timestamp {timestamps[i]}s (frame {frame_number})"
+            )
+            continue
+
+        writer.submit(i, frame)
+        yield from writer.iter_completed()
+
+
+def _iter_frames_sequentially(
+    cap: cv2.VideoCapture,
+    targets: dict[int, int],
+    timestamps: list[float],
+    writer: FrameWriter,
+    video_index: Optional[VideoIndex] = None,
+) -> Iterator[tuple[int, str]]:
+    indices_by_frame: dict[int, list[int]] = {}
+    for i, frame_number in targets.items():
+        indices_by_frame.setdefault(frame_number, []).append(i)
+
+    position = 0
+
+    for frame_number in sorted(indices_by_frame):
+        indices = indices_by_frame[frame_number]
+        started = time.perf_counter()
+
+        # Jump ahead when the next target lies beyond a known keyframe
+        if video_index is not None:
+            seek_to = video_index.keyframe_before(frame_number)
+        else:
+            seek_to = frame_number if position == 0 else position
+        if seek_to > position:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, seek_to)
+            position = seek_to
+
+        while position < frame_number:
+            if not cap.grab():
+                break
+            position += 1
+
+        if position < frame_number or not cap.grab():
+            logger.warning(
+                f"End of video reached before frame {frame_number}, "
+                f"skipping {len(indices)} timestamps"
+            )
+            break
+        position += 1
+
+        ret, frame = cap.retrieve()
+        if not ret:
+            logger.warning(
+                f"Could not decode frame at timestamp {timestamps[indices[0]]}s (frame {frame_number})"
+            )
+            continue
+        FRAME_DECODE_SECONDS.observe(time.perf_counter() - started)
+
+        for i in indices:
+            writer.submit(i, frame)
+        yield from writer.iter_completed()
+
+    logger.info(f"Sequential pass stopped at frame {position}")
+
+
+def iter_frames_at_timestamps(
+    video_path: str,
+    timestamps: list[float],
+    frame_dir_path: str,
+    to_time: Optional[float] = None,
+    mode: str = EXTRACTION_MODE_AUTO,
+    video_index: Optional[VideoIndex] = None,
+) -> Iterator[tuple[int, str]]:
+    """Yield (timestamp index, frame filename) pairs as soon as each frame is on disk"""
     logger.info(f"Starting timestamp-based frame extraction from video: {video_path}")
     logger.info(f"Timestamps: {timestamps}")
 
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(
+            f"Unsupported extraction mode: {mode}. Supported: {', '.join(EXTRACTION_MODES)}"
+        )
+
     cap = cv2.VideoCapture(video_path)
 
     if not cap.isOpened():
         logger.error(f"Cannot open video file: {video_path}")
         raise HTTPException(status_code=500, detail="Cannot open video file")
 
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frames = []
-
-    try:
-        for i, timestamp in enumerate(timestamps):
-            frame_number = int(timestamp * fps)
+    if video_index is not None:
+        frame_at = video_index.frame_at
+        gop_size = video_index.gop_size
+    else:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_at = lambda timestamp: int(timestamp * fps)
+        gop_size = get_gop_size()
+
+    targets = {i: frame_at(timestamp) for i, timestamp in enumerate(timestamps)}
+
+    if to_time is not None:
+        stop_frame = frame_at(to_time)
+        skipped = [i for i, n in targets.items() if n > stop_frame]
+        if skipped:
+            logger.warning(f"Skipping {len(skipped)} timestamps beyond {to_time}s")
+        for i in skipped:
+            del targets[i]
+
+    if mode == EXTRACTION_MODE_AUTO:
+        mode = (
+            EXTRACTION_MODE_SEQUENTIAL
+            if should_decode_sequentially(list(targets.values()), gop_size)
+            else EXTRACTION_MODE_SEEK
+        )
+    logger.info(f"Extraction mode: {mode}")
 
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-            ret, frame = cap.read()
+    writer = FrameWriter(frame_dir_path)
+    extracted_count = 0
 
-            if not ret:
-                logger.warning(
-                    f"Could not read frame at timestamp {timestamp}s (frame {frame_number})"
+    try:
+        if targets:
+            if mode == EXTRACTION_MODE_SEQUENTIAL:
+                frame_iter = _iter_frames_sequentially(
+                    cap, targets, timestamps, writer, video_index
                 )
-                continue
-
-            frame_filename = FRAME_FILENAME_TEMPLATE.format(i)
-            frame_filepath = os.path.join(frame_dir_path, frame_filename)
-
-            if not cv2.imwrite(frame_filepath, frame):
-                logger.warning(f"Failed to save frame {i} to {frame_filepath}")
-                continue
-
-            frames.append(frame_filename)
-            logger.debug(f"Extracted frame {i+1}/{len(timestamps)} at {timestamp}s")
+            else:
+                frame_iter = _iter_frames_by_seeking(cap, targets, timestamps, writer)
+
+            with span("extract_frames_at_timestamps", mode=mode, frames=len(targets)):
+                for i, frame_filename in chain(
+                    frame_iter, writer.iter_completed(wait=True)
+                ):
+                    extracted_count += 1
+                    logger.debug(
+                        f"Extracted frame {i+1}/{len(timestamps)} at {timestamps[i]}s"
+                    )
+                    yield i, frame_filename
 
     finally:
+        writer.close()
         cap.release()
-        logger.info(f"Video capture released. Extracted {len(frames)} frames")
+        cache_manager.record_write(FRAMES_ENDPOINT, writer.written_bytes)
+        logger.info(f"Video capture released. Extracted {extracted_count} frames")
+
+
+def extract_frames_at_timestamps(
+    video_path: str,
+    timestamps: list[float],
+    frame_dir_path: str,
+    to_time: Optional[float] = None,
+    mode: str = EXTRACTION_MODE_AUTO,
+    video_index: Optional[VideoIndex] = None,
+) -> list[str]:
+    frames = dict(
+        iter_frames_at_timestamps(
+            video_path, timestamps, frame_dir_path, to_time, mode, video_index
+        )
+    )
 
     logger.info(
         f"Timestamp-based frame extraction completed. Extracted {len(frames)} frames"
     )
-    return frames
+    return [frames[i] for i in sorted(frames)]
 
 
 def generate_frame_urls(
@@ -178,136 +441,498 @@ def generate_frame_urls(
     return urls
 
 
-def zip_frames(frame_urls: list[str], name: str, removebg: bool = False) -> str:
-    logger.info(
-        f"Zipping {len(frame_urls)} frames with name: {name}, removebg: {removebg}"
-    )
+def get_frame_url(
+    frame_dir_name: str, frame_filename: str, base_url: Optional[str] = None
+) -> str:
+    return f"{base_url or ''}/{FRAMES_ENDPOINT}/{frame_dir_name}/{frame_filename}"
 
-    cache_folder = get_cache_folder()
-    frames_dir = os.path.join(cache_folder, FRAMES_ENDPOINT)
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        renamed_files = []
+class _ZipStreamBuffer:
+    """Write-only sink that hands finished zip bytes back to the response stream"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def resolve_zip_members(frame_urls: list[str], name: str) -> list[tuple[str, str]]:
+    frames_dir = os.path.join(get_cache_folder(), FRAMES_ENDPOINT)
+    members = []
+
+    for i, url in enumerate(frame_urls):
+        parts = url.strip("/").split("/")
+        if len(parts) < 3 or parts[0] != FRAMES_ENDPOINT:
+            logger.warning(f"Invalid frame URL: {url}")
+            continue
+        frame_dir_name = parts[1]
+        filename = parts[2]
 
-        for i, url in enumerate(frame_urls):
-            parts = url.strip("/").split("/")
-            if len(parts) < 3 or parts[0] != FRAMES_ENDPOINT:
-                logger.warning(f"Invalid frame URL: {url}")
+        original_path = os.path.join(frames_dir, frame_dir_name, filename)
+
+        if not os.path.exists(original_path):
+            logger.warning(f"Frame file not found: {original_path}")
+            continue
+
+        ext = os.path.splitext(filename)[1]
+        members.append((original_path, f"{name}_{i:04d}{ext}"))
+
+    if not members:
+        raise HTTPException(status_code=400, detail="No valid frame files found")
+
+    return members
+
+
+def _make_chroma_keyer(request: ZipFramesRequest) -> Callable[[np.ndarray], np.ndarray]:
+    key_color = parse_key_color(request.key_color) if request.key_color else None
+
+    def key_frames(frames: np.ndarray) -> np.ndarray:
+        nonlocal key_color
+        if key_color is None:
+            # Detect once so every batch of the zip is keyed against the same colour
+            key_color = detect_key_color(frames)
+            logger.info(f"Detected key colour (BGR): {key_color.tolist()}")
+
+        return chroma_key_frames(
+            frames,
+            key_color,
+            request.key_tolerance,
+            request.key_softness,
+            request.despill,
+        )
+
+    return key_frames
+
+
+def _make_animation_remover(
+    request: ZipFramesRequest,
+    segment: Callable[[np.ndarray], np.ndarray] = remove_background_batch,
+) -> Callable[[np.ndarray], np.ndarray]:
+    # Last segmented frame as (gray, alpha) and how many frames have reused its mask
+    reference: Optional[tuple[np.ndarray, np.ndarray]] = None
+    reference_age = 0
+
+    def remove_frames(frames: np.ndarray) -> np.ndarray:
+        nonlocal reference, reference_age
+        grays = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
+
+        # Segment a frame when the mask in hand is too old or the pose moved too far
+        reference_gray = reference[0] if reference is not None else None
+        if reference_gray is not None and reference_gray.shape != grays[0].shape:
+            reference_gray = None
+        keyframes = []
+        sources = []
+        for i, gray in enumerate(grays):
+            if (
+                reference_gray is None
+                or reference_age >= request.keyframe_interval
+                or frame_difference(gray, reference_gray) > request.keyframe_threshold
+            ):
+                keyframes.append(i)
+                reference_gray = gray
+                reference_age = 0
+            sources.append(keyframes[-1] if keyframes else None)
+            reference_age += 1
+
+        output = np.empty(frames.shape[:-1] + (4,), dtype=np.uint8)
+        if keyframes:
+            output[keyframes] = segment(frames[keyframes])
+
+        for i, source in enumerate(sources):
+            if source == i:
                 continue
-            frame_dir_name = parts[1]
-            filename = parts[2]
+            if source is None:
+                source_gray, source_alpha = reference
+            else:
+                source_gray, source_alpha = grays[source], output[source, ..., 3]
+            alpha = propagate_alpha(source_gray, source_alpha, grays[i])
+            output[i, ..., :3] = np.where(alpha[..., np.newaxis] > 0, frames[i], 0)
+            output[i, ..., 3] = alpha
+
+        if keyframes:
+            last = keyframes[-1]
+            reference = (grays[last], output[last, ..., 3].copy())
+        logger.debug(
+            f"Segmented {len(keyframes)}/{len(frames)} frames, propagated the rest"
+        )
+        return output
+
+    return remove_frames
+
 
-            original_path = os.path.join(frames_dir, frame_dir_name, filename)
+def _load_frame(path: str) -> Optional[np.ndarray]:
+    with FRAME_LOAD_SECONDS.time():
+        return cv2.imread(path)
 
-            if not os.path.exists(original_path):
-                logger.warning(f"Frame file not found: {original_path}")
+
+def _iter_background_removed_payloads(
+    members: list[tuple[str, str]],
+    batch_size: int,
+    remove_background: Callable[[np.ndarray], np.ndarray],
+) -> Iterator[tuple[str, Union[str, bytes]]]:
+    for start in range(0, len(members), batch_size):
+        batch = members[start : start + batch_size]
+        images = [_load_frame(original_path) for original_path, _ in batch]
+
+        indices_by_shape: dict[tuple, list[int]] = {}
+        for j, image in enumerate(images):
+            if image is None:
+                logger.warning(f"Could not load frame: {batch[j][0]}")
+                continue
+            indices_by_shape.setdefault(image.shape, []).append(j)
+
+        processed = {}
+        for indices in indices_by_shape.values():
+            stack = np.stack([images[j] for j in indices])
+            try:
+                with FRAME_REMOVEBG_SECONDS.time():
+                    output_stack = remove_background(stack)
+            except Exception as e:
+                logger.warning(
+                    f"Failed to remove background for {len(indices)} frames: {e}"
+                )
                 continue
 
-            if removebg:
-                try:
-                    processed_filename = f"processed_{filename}"
-                    processed_path = remove_solid_background(
-                        original_path, processed_filename
-                    )
-                    source_path = processed_path
-                    logger.debug(f"Background removed for frame {i+1}")
-                except Exception as e:
-                    logger.warning(f"Failed to remove background for {filename}: {e}")
-                    source_path = original_path
+            for j, output_frame in zip(indices, output_stack):
+                processed[j] = encode_frame(output_frame)
+
+        for j, (original_path, arcname) in enumerate(batch):
+            if j in processed:
+                frame_format, data = processed[j]
+                yield f"{os.path.splitext(arcname)[0]}.{frame_format}", data
             else:
-                source_path = original_path
+                yield arcname, original_path
+
+        logger.debug(f"Background removed for {len(processed)}/{len(batch)} frames")
 
-            ext = os.path.splitext(filename)[1]
-            new_filename = f"{name}_{i:04d}{ext}"
-            new_path = os.path.join(temp_dir, new_filename)
 
-            shutil.copy2(source_path, new_path)
-            renamed_files.append(new_path)
+def _iter_zip_payloads(
+    members: list[tuple[str, str]], request: ZipFramesRequest
+) -> Iterator[tuple[str, Union[str, bytes]]]:
+    """Yield (archive name, source path or encoded bytes) for every member"""
+    if not request.removebg:
+        for original_path, arcname in members:
+            yield arcname, original_path
+        return
 
-        if not renamed_files:
-            raise HTTPException(status_code=400, detail="No valid frame files found")
+    if request.removebg_mode == REMOVEBG_MODE_CHROMA:
+        yield from _iter_background_removed_payloads(
+            members, CHROMA_BATCH_SIZE, _make_chroma_keyer(request)
+        )
+    elif request.removebg_mode == REMOVEBG_MODE_ANIMATION:
+        yield from _iter_background_removed_payloads(
+            members, ANIMATION_BATCH_SIZE, _make_animation_remover(request)
+        )
+    else:
+        yield from _iter_background_removed_payloads(
+            members, get_removebg_batch_size(), remove_background_batch
+        )
 
-        zip_filename = f"{name}_frames.zip"
-        zip_path = os.path.join(cache_folder, zip_filename)
 
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in renamed_files:
-                arcname = os.path.basename(file_path)
-                zipf.write(file_path, arcname)
+def _iter_zip_members(
+    payloads: Iterator[tuple[str, Union[str, bytes]]],
+) -> Iterator[bytes]:
+    buffer = _ZipStreamBuffer()
+    count = 0
 
-        logger.info(f"Zip file created: {zip_path}")
-        return zip_path
+    with zipfile.ZipFile(buffer, "w") as zipf:
+        for arcname, source in payloads:
+            count += 1
 
+            if isinstance(source, bytes):
+                zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+                zinfo.compress_type = zipfile.ZIP_STORED
+                with span("zip_write", member=arcname), FRAME_ZIP_SECONDS.time():
+                    zipf.writestr(zinfo, source)
+                yield buffer.drain()
+                continue
 
-def process_split_frames(request: FrameSplitRequest) -> dict:
-    logger.info(f"Processing frame split request for task: {request.task_id}")
+            zinfo = zipfile.ZipInfo.from_file(source, arcname)
+            ext = os.path.splitext(source)[1].lower()
+            # Images are already compressed; deflating them again only costs CPU
+            zinfo.compress_type = (
+                zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            )
+
+            # Time spent compressing, not waiting for the client to take the bytes
+            zip_seconds = 0.0
+            with span("zip_write", member=arcname):
+                with open(source, "rb") as src, zipf.open(zinfo, "w") as dst:
+                    for chunk in iter(lambda: src.read(ZIP_CHUNK_SIZE), b""):
+                        started = time.perf_counter()
+                        dst.write(chunk)
+                        zip_seconds += time.perf_counter() - started
+                        data = buffer.drain()
+                        if data:
+                            yield data
+            FRAME_ZIP_SECONDS.observe(zip_seconds)
+
+            data = buffer.drain()
+            if data:
+                yield data
+
+    yield buffer.drain()
+    logger.info(f"Zip stream completed with {count} frames")
+
+
+def zip_frames(request: ZipFramesRequest) -> Iterator[bytes]:
+    """Validate the frames up front and return a generator streaming the zip archive"""
     logger.info(
-        f"Video URL: {request.video_url}, From: {request.from_time}s, To: {request.to_time}s, Count: {request.count}"
+        f"Zipping {len(request.frame_urls)} frames with name: {request.name}, "
+        f"removebg: {request.removebg}, mode: {request.removebg_mode}"
+    )
+
+    if request.removebg_mode not in REMOVEBG_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported removebg mode: {request.removebg_mode}. Supported: {', '.join(REMOVEBG_MODES)}",
+        )
+    if request.key_color:
+        try:
+            parse_key_color(request.key_color)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if request.keyframe_interval < 1:
+        raise HTTPException(
+            status_code=400, detail="keyframe_interval must be at least 1"
+        )
+
+    members = resolve_zip_members(request.frame_urls, request.name)
+    record = job_store.record_started(JOB_KIND_ZIP, request.name, request.model_dump())
+    return _iter_zip_stream(
+        record,
+        {os.path.dirname(path) for path, _ in members},
+        _iter_zip_members(_iter_zip_payloads(members, request)),
     )
 
+
+def _iter_zip_stream(
+    record: JobInfo, frame_dirs: set[str], chunks: Iterator[bytes]
+) -> Iterator[bytes]:
+    """Keep the frames of an archive out of eviction until it is fully streamed"""
     try:
-        video_path = get_or_download_file(request.video_url)
+        with cache_manager.pinned(*frame_dirs):
+            yield from chunks
+    except GeneratorExit:
+        job_store.record_finished(record, error_info="Zip streaming cancelled")
+        raise
+    except Exception as e:
+        job_store.record_finished(record, error_info=str(e))
+        raise
+    job_store.record_finished(record)
+
+
+def iter_split_frames(
+    video_path: str,
+    timestamps: list[float],
+    split_key: str,
+    frame_dir_path: str,
+    to_time: Optional[float] = None,
+    video_index: Optional[VideoIndex] = None,
+) -> Iterator[tuple[int, str]]:
+    """Yield (timestamp index, frame filename) pairs, reusing cached or in-flight splits"""
+    while True:
+        future, is_leader = _split_flight.claim(split_key)
+        if is_leader:
+            break
+        frames = future.result()
+        # None means the leader's client went away; one of the waiters takes over
+        if frames is not None:
+            yield from sorted(frames.items())
+            return
+
+    frames = {}
+    try:
+        with cache_manager.pinned(video_path, frame_dir_path):
+            cached_frames = load_frame_manifest(frame_dir_path)
+            if cached_frames is not None:
+                logger.info(f"Split cache hit: {frame_dir_path}")
+                cache_manager.record_hit(FRAMES_ENDPOINT)
+                touch(frame_dir_path)
+                frames = cached_frames
+                yield from sorted(cached_frames.items())
+            else:
+                cache_manager.record_miss(FRAMES_ENDPOINT)
+                for i, frame_filename in iter_frames_at_timestamps(
+                    video_path,
+                    timestamps,
+                    frame_dir_path,
+                    to_time=to_time,
+                    video_index=video_index,
+                ):
+                    frames[i] = frame_filename
+                    yield i, frame_filename
+
+                if frames:
+                    save_frame_manifest(frame_dir_path, frames)
+    except GeneratorExit:
+        _split_flight.release(split_key)
+        raise
+    except BaseException as e:
+        _split_flight.resolve(split_key, error=e)
+        raise
 
-        logger.info("Validating video file and extracting properties")
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            logger.error("Cannot open video file for processing")
-            raise HTTPException(status_code=500, detail="Cannot open video file")
+    _split_flight.resolve(split_key, result=frames)
 
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps
 
-        cap.release()
-        logger.info(
-            f"Video FPS: {fps}, Duration: {duration}s, Total frames: {total_frames}"
+def prepare_split_frames(
+    request: FrameSplitRequest,
+) -> tuple[str, VideoIndex, list[float], str]:
+    logger.info(f"Processing frame split request for task: {request.task_id}")
+    logger.info(
+        f"Video URL: {request.video_url}, From: {request.from_time}s, To: {request.to_time}s, Count: {request.count}"
+    )
+
+    video_path = get_or_download_file(request.video_url)
+
+    logger.info("Loading seek index for video properties")
+    try:
+        video_index = get_or_build_video_index(video_path)
+    except ValueError as e:
+        logger.error(f"Cannot index video file for processing: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    fps = video_index.fps
+    total_frames = video_index.frame_count
+    duration = video_index.duration
+    logger.info(
+        f"Video FPS: {fps}, Duration: {duration}s, Total frames: {total_frames}"
+    )
+
+    if (
+        request.from_time < 0
+        or request.to_time > duration
+        or request.from_time >= request.to_time
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid time range. Video duration: {duration}s, requested: {request.from_time}s - {request.to_time}s",
         )
 
-        if fps <= 0:
-            logger.error(f"Invalid video FPS: {fps}")
-            raise HTTPException(status_code=400, detail="Invalid video FPS")
+    time_range = request.to_time - request.from_time
+    if request.count <= 1:
+        timestamps = [request.from_time]
+    else:
+        interval = time_range / (request.count - 1)
+        timestamps = [request.from_time + i * interval for i in range(request.count)]
 
-        if (
-            request.from_time < 0
-            or request.to_time > duration
-            or request.from_time >= request.to_time
-        ):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid time range. Video duration: {duration}s, requested: {request.from_time}s - {request.to_time}s",
-            )
+    logger.info(f"Calculated timestamps: {timestamps}")
 
-        time_range = request.to_time - request.from_time
-        if request.count <= 1:
-            timestamps = [request.from_time]
-        else:
-            interval = time_range / (request.count - 1)
-            timestamps = [
-                request.from_time + i * interval for i in range(request.count)
-            ]
+    split_key = get_split_cache_key(
+        video_index.source_sha256, timestamps, request.to_time
+    )
+    return video_path, video_index, timestamps, split_key
 
-        logger.info(f"Calculated timestamps: {timestamps}")
 
-        cache_folder = get_cache_folder()
+def process_split_frames(request: FrameSplitRequest) -> dict:
+    record = job_store.record_started(
+        JOB_KIND_SPLIT, request.task_id, request.model_dump()
+    )
+    try:
+        video_path, video_index, timestamps, split_key = prepare_split_frames(request)
+
         frame_dir_path, frame_dir_name = create_frame_directory(
-            request.task_id, cache_folder
+            split_key, get_cache_folder()
         )
-
-        frame_filenames = extract_frames_at_timestamps(
-            video_path, timestamps, frame_dir_path
+        frames = dict(
+            iter_split_frames(
+                video_path,
+                timestamps,
+                split_key,
+                frame_dir_path,
+                to_time=request.to_time,
+                video_index=video_index,
+            )
         )
 
-        frame_urls = generate_frame_urls(frame_dir_name, frame_filenames)
+        frame_urls = generate_frame_urls(
+            frame_dir_name, [frames[i] for i in sorted(frames)]
+        )
 
         logger.info(
             f"Frame processing completed successfully. Generated {len(frame_urls)} frame URLs"
         )
+        job_store.record_finished(record, asset_urls=frame_urls)
         return {"frames": frame_urls}
 
-    except HTTPException:
+    except HTTPException as e:
+        job_store.record_finished(record, error_info=str(e.detail))
         raise
     except Exception as e:
         logger.error(f"Frame processing failed: {str(e)}", exc_info=True)
+        job_store.record_finished(record, error_info=str(e))
         raise HTTPException(
             status_code=500, detail=f"Frame processing failed: {str(e)}"
         )
+
+
+def stream_split_frames(
+    request: FrameSplitRequest,
+    video_path: str,
+    video_index: VideoIndex,
+    timestamps: list[float],
+    split_key: str,
+) -> Iterator[str]:
+    """Yield NDJSON split events, one line per frame as soon as it is on disk"""
+    frame_dir_path, frame_dir_name = create_frame_directory(
+        split_key, get_cache_folder()
+    )
+    record = job_store.record_started(
+        JOB_KIND_SPLIT, request.task_id, request.model_dump()
+    )
+
+    frame_urls = {}
+    count = 0
+    try:
+        for i, frame_filename in iter_split_frames(
+            video_path,
+            timestamps,
+            split_key,
+            frame_dir_path,
+            to_time=request.to_time,
+            video_index=video_index,
+        ):
+            count += 1
+            frame_urls[i] = get_frame_url(frame_dir_name, frame_filename)
+            event = FrameSplitEvent(
+                event=SPLIT_EVENT_FRAME,
+                task_id=request.task_id,
+                index=i,
+                timestamp=timestamps[i],
+                url=frame_urls[i],
+            )
+            yield event.model_dump_json(exclude_none=True) + "\n"
+
+        event = FrameSplitEvent(
+            event=SPLIT_EVENT_DONE, task_id=request.task_id, count=count
+        )
+        logger.info(f"Frame streaming completed. Streamed {count} frames")
+    except GeneratorExit:
+        job_store.record_finished(record, error_info="Frame streaming cancelled")
+        raise
+    except Exception as e:
+        logger.error(f"Frame streaming failed: {str(e)}", exc_info=True)
+        event = FrameSplitEvent(
+            event=SPLIT_EVENT_ERROR,
+            task_id=request.task_id,
+            count=count,
+            error_info=f"Frame processing failed: {str(e)}",
+        )
+
+    job_store.record_finished(
+        record,
+        error_info=event.error_info,
+        asset_urls=[frame_urls[i] for i in sorted(frame_urls)],
+    )
+
+    yield event.model_dump_json(exclude_none=True) + "\n"
@@ -0,0 +1,152 @@
+import os
+import logging
+import threading
+import contextvars
+import cv2
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Iterator, Optional
+
+from services.metrics import FRAME_ENCODE_SECONDS
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+FRAME_FORMAT_PNG = "png"
+FRAME_FORMAT_WEBP = "webp"
+FRAME_FORMATS = (FRAME_FORMAT_PNG, FRAME_FORMAT_WEBP)
+FRAME_FILENAME_TEMPLATE = "frame_{:04d}.{}"
+
+DEFAULT_FRAME_FORMAT = FRAME_FORMAT_PNG
+DEFAULT_PNG_COMPRESSION = 1
+WEBP_LOSSLESS_QUALITY = 101
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_encoder_settings() -> dict:
+    """Get the frame encoder settings from environment or use defaults"""
+    frame_format = os.getenv("FRAME_FORMAT", DEFAULT_FRAME_FORMAT).lower()
+    if frame_format not in FRAME_FORMATS:
+        raise ValueError(
+            f"Unsupported frame format: {frame_format}. Supported: {', '.join(FRAME_FORMATS)}"
+        )
+
+    settings = {"format": frame_format}
+    if frame_format == FRAME_FORMAT_PNG:
+        settings["png_compression"] = int(
+            os.getenv("FRAME_PNG_COMPRESSION", str(DEFAULT_PNG_COMPRESSION))
+        )
+    return settings
+
+
+def get_encode_params(settings: dict) -> list[int]:
+    if settings["format"] == FRAME_FORMAT_WEBP:
+        # Quality above 100 selects lossless WebP
+        return [cv2.IMWRITE_WEBP_QUALITY, WEBP_LOSSLESS_QUALITY]
+    return [cv2.IMWRITE_PNG_COMPRESSION, settings["png_compression"]]
+
+
+def get_frame_filename(index: int, frame_format: str) -> str:
+    return FRAME_FILENAME_TEMPLATE.format(index, frame_format)
+
+
+def get_encode_workers() -> int:
+    return int(os.getenv("FRAME_ENCODE_WORKERS", str(os.cpu_count() or 1)))
+
+
+def get_max_pending_frames() -> int:
+    return int(os.getenv("FRAME_ENCODE_QUEUE", str(get_encode_workers() * 2)))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = get_encode_workers()
+            logger.info(f"Starting frame encoder pool with {workers} workers")
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="frame-encode"
+            )
+        return _executor
+
+
+class FrameWriter:
+    """Encode decoded frames on a shared thread pool behind a bounded queue"""
+
+    def __init__(self, frame_dir_path: str, max_pending: Optional[int] = None):
+        self.frame_dir_path = frame_dir_path
+        self.settings = get_encoder_settings()
+        self._params = get_encode_params(self.settings)
+        self._slots = threading.BoundedSemaphore(
+            max_pending or get_max_pending_frames()
+        )
+        self._pending: dict[Future, int] = {}
+        self._written_lock = threading.Lock()
+        self.written_bytes = 0
+
+    def submit(self, index: int, frame) -> None:
+        """Queue a frame for encoding, blocking while the queue is full"""
+        self._slots.acquire()
+        try:
+            # Run in the caller's context so the write joins its trace
+            future = _get_executor().submit(
+                contextvars.copy_context().run, self._encode, index, frame
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        self._pending[future] = index
+
+    def _encode(self, index: int, frame) -> Optional[str]:
+        try:
+            frame_filename = get_frame_filename(index, self.settings["format"])
+            frame_filepath = os.path.join(self.frame_dir_path, frame_filename)
+
+            with span("cv2.imwrite", frame=index), FRAME_ENCODE_SECONDS.time():
+                written = cv2.imwrite(frame_filepath, frame, self._params)
+            if not written:
+                logger.warning(f"Failed to save frame {index} to {frame_filepath}")
+                return None
+
+            with self._written_lock:
+                self.written_bytes += os.path.getsize(frame_filepath)
+            return frame_filename
+        finally:
+            self._slots.release()
+
+    @property
+    def pending(self) -> int:
+        """Frames submitted and not yet collected with iter_completed"""
+        return len(self._pending)
+
+    def iter_completed(self, wait: bool = False) -> Iterator[tuple[int, str]]:
+        """Yield (index, filename) of encoded frames; with wait, drain the whole queue"""
+        if wait:
+            futures = as_completed(list(self._pending))
+        else:
+            futures = [future for future in self._pending if future.done()]
+
+        for future in futures:
+            index = self._pending.pop(future)
+            frame_filename = future.result()
+            if frame_filename is not None:
+                yield index, frame_filename
+
+    def close(self) -> None:
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+
+def encode_frame(frame) -> tuple[str, bytes]:
+    """Encode a frame in memory with the configured settings, returning (format, bytes)"""
+    settings = get_encoder_settings()
+    with FRAME_ENCODE_SECONDS.time():
+        ok, data = cv2.imencode(
+            f".{settings['format']}", frame, get_encode_params(settings)
+        )
+    if not ok:
+        raise ValueError("Failed to encode frame")
+    return settings["format"], data.tobytes()
@@ -0,0 +1,144 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_SIZE = 32
+DEFAULT_IDLE_SECONDS = 300
+
+
+def get_pool_settings() -> dict:
+    """Get the client pool size and idle timeout from environment or use defaults"""
+    return {
+        "max_size": int(os.getenv("PROVIDER_CLIENT_POOL_SIZE", str(DEFAULT_POOL_SIZE))),
+        "idle_seconds": float(
+            os.getenv("PROVIDER_CLIENT_IDLE_SECONDS", str(DEFAULT_IDLE_SECONDS))
+        ),
+    }
+
+
+class _PooledClient:
+    def __init__(self, provider: str, client: Any):
+        self.provider = provider
+        self.client = client
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self.evicted = False
+
+    def close(self) -> None:
+        try:
+            self.client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close {self.provider} client: {e}")
+
+
+class ClientPool:
+    """Bounded LRU pool of provider clients keyed by (provider, API key, base URL)
+
+    Clients keep their HTTP connections alive between requests. A client evicted
+    while a request still holds it is closed once that request releases it.
+    """
+
+    def __init__(self, max_size: int, idle_seconds: float):
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self._clients: OrderedDict[tuple, _PooledClient] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def lease(
+        self, provider: str, api_key: str, base_url: str, factory: Callable[[], Any]
+    ) -> Iterator[Any]:
+        entry = self._acquire((provider, api_key, base_url), factory)
+        try:
+            yield entry.client
+        finally:
+            self._release(entry)
+
+    def _acquire(self, key: tuple, factory: Callable[[], Any]) -> _PooledClient:
+        with self._lock:
+            self._evict_idle()
+
+            entry = self._clients.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._clients.move_to_end(key)
+            else:
+                self.misses += 1
+                entry = _PooledClient(key[0], factory())
+                self._clients[key] = entry
+                logger.debug(f"Created {key[0]} client, pool size: {len(self)}")
+                while len(self._clients) > self.max_size:
+                    _, oldest = self._clients.popitem(last=False)
+                    self._evict(oldest)
+
+            entry.leases += 1
+            return entry
+
+    def _release(self, entry: _PooledClient) -> None:
+        with self._lock:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+            close = entry.evicted and entry.leases == 0
+        if close:
+            entry.close()
+
+    def _evict(self, entry: _PooledClient) -> None:
+        self.evictions += 1
+        entry.evicted = True
+        if entry.leases == 0:
+            entry.close()
+
+    def _evict_idle(self) -> None:
+        expiry = time.monotonic() - self.idle_seconds
+        idle = [
+            key
+            for key, entry in self._clients.items()
+            if entry.leases == 0 and entry.last_used < expiry
+        ]
+        for key in idle:
+            self._evict(self._clients.pop(key))
+        if idle:
+            logger.debug(f"Evicted {len(idle)} idle provider clients")
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict_idle()
+            lookups = self.hits + self.misses
+            by_provider: dict[str, int] = {}
+            for entry in self._clients.values():
+                by_provider[entry.provider] = by_provider.get(entry.provider, 0) + 1
+
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "idle_seconds": self.idle_seconds,
+                "in_use": sum(1 for e in self._clients.values() if e.leases),
+                "by_provider": by_provider,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+            for entry in entries:
+                self._evict(entry)
+
+
+client_pool = ClientPool(**get_pool_settings())
@@ -4,8 +4,9 @@ from volcenginesdkarkruntime import Ark
 import logging
 
 from defs import DEFAULT_DOUBAO_IMAGE_MODEL, ImageEditRequest, ImageGenerationRequest
-from services.gen_models.utils import download_from_url
+from services.gen_models.utils import download_from_url, get_local_input
 from services.gen_models.base_image_service import BaseImageService
+from services.gen_models.client_pool import client_pool
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,11 @@ class DoubaoImageService(BaseImageService):
             api_key=api_key,
         )
 
+    def _client(self, api_key: str):
+        return client_pool.lease(
+            "doubao", api_key, self.base_url, lambda: self._create_client(api_key)
+        )
+
     def _build_generation_params(
         self, request: ImageGenerationRequest
     ) -> Dict[str, Any]:
@@ -41,7 +47,7 @@ class DoubaoImageService(BaseImageService):
         params = {
             "model": DEFAULT_DOUBAO_IMAGE_MODEL,
             "prompt": request.prompt,
-            "image": request.image_url,
+            "image": get_local_input(request.image_url, inline=True),
             "size": request.size.replace("*", "x"),
             "watermark": False,
         }
@@ -72,9 +78,9 @@ class DoubaoImageService(BaseImageService):
     ) -> str:
         self._validate_request(request)
         assert request.api_key is not None
-        client = self._create_client(request.api_key)
         params = self._build_generation_params(request)
-        return self._execute_request(client, params, operation)
+        with self._client(request.api_key) as client:
+            return self._execute_request(client, params, operation)
 
     def _process_edit_request(self, request: ImageEditRequest, operation: str) -> str:
         self._validate_request(request)
@@ -82,9 +88,9 @@ class DoubaoImageService(BaseImageService):
             raise ValueError("Image URL is required for editing")
 
         assert request.api_key is not None
-        client = self._create_client(request.api_key)
         params = self._build_edit_params(request)
-        return self._execute_request(client, params, operation)
+        with self._client(request.api_key) as client:
+            return self._execute_request(client, params, operation)
 
 
 _service = DoubaoImageService()
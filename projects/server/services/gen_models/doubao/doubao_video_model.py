@@ -1,14 +1,18 @@
-from typing import Any
+from typing import Any, Optional, Union
 import time
 from volcenginesdkarkruntime import Ark
 import logging
-from services.gen_models.utils import download_from_url
+from services.gen_models.utils import download_from_url, get_local_input
 from services.gen_models.base_video_service import BaseVideoService
+from services.gen_models.client_pool import client_pool
 from defs import DEFAULT_DOUBAO_VIDEO_MODEL, VideoGenerationRequest
 
 
 logger = logging.getLogger(__name__)
 
+FINISHED_TASK_STATUSES = ["succeeded", "failed", "cancelled"]
+MAX_TASKS_PER_LIST = 50
+
 
 class DoubaoVideoService(BaseVideoService):
 
@@ -20,12 +24,19 @@ class DoubaoVideoService(BaseVideoService):
     def _create_client(self, api_key: str) -> Ark:
         return Ark(base_url=self.base_url, api_key=api_key)
 
+    def _client(self, api_key: str):
+        return client_pool.lease(
+            "doubao", api_key, self.base_url, lambda: self._create_client(api_key)
+        )
+
+    def _get_task(self, task_id: str, api_key: str) -> Any:
+        with self._client(api_key) as client:
+            return client.content_generation.tasks.get(task_id=task_id)
+
     def _create_task(self, request: VideoGenerationRequest) -> str:
         self._validate_request(request)
         assert request.api_key is not None
 
-        client = self._create_client(request.api_key)
-
         try:
             content = [
                 {
@@ -33,14 +44,17 @@ class DoubaoVideoService(BaseVideoService):
                     "type": "text",
                 },
                 {
-                    "image_url": {"url": request.base_image_url},
+                    "image_url": {
+                        "url": get_local_input(request.base_image_url, inline=True)
+                    },
                     "type": "image_url",
                 },
             ]
 
-            task = client.content_generation.tasks.create(
-                model=self.model, content=content
-            )
+            with self._client(request.api_key) as client:
+                task = client.content_generation.tasks.create(
+                    model=self.model, content=content
+                )
 
             return task.id
 
@@ -49,24 +63,66 @@ class DoubaoVideoService(BaseVideoService):
             raise
 
     def _wait_for_completion(self, task_id: str, api_key: str) -> str:
-        client = self._create_client(api_key)
-
         try:
-            response = client.content_generation.tasks.get(task_id=task_id)
+            response = self._get_task(task_id, api_key)
 
-            while response.status not in ["succeeded", "failed"]:
+            while response.status not in FINISHED_TASK_STATUSES:
                 time.sleep(5)
-                response = client.content_generation.tasks.get(task_id=task_id)
+                response = self._get_task(task_id, api_key)
+
+            return self._download_result(response)
+
+        except Exception as e:
+            self.logger.error(f"Failed to complete video task: {str(e)}")
+            raise
 
-            if hasattr(response.content, "video_url") and response.content.video_url:
-                return download_from_url(response.content.video_url)
-            else:
-                raise Exception("No video URL found in completed task")
+    def _fetch_result(self, task_id: str, api_key: str) -> Optional[str]:
+        try:
+            response = self._get_task(task_id, api_key)
+            if response.status not in FINISHED_TASK_STATUSES:
+                return None
+            return self._download_result(response)
 
         except Exception as e:
             self.logger.error(f"Failed to complete video task: {str(e)}")
             raise
 
+    def _fetch_results(
+        self, task_ids: list[str], api_key: str
+    ) -> dict[str, Union[Optional[str], Exception]]:
+        with self._client(api_key) as client:
+            response = client.content_generation.tasks.list(
+                task_ids=task_ids, page_size=len(task_ids)
+            )
+        tasks = {task.id: task for task in response.items}
+
+        results = {}
+        for task_id in task_ids:
+            try:
+                task = tasks.get(task_id)
+                if task is None:
+                    # Not listed yet, e.g. just created; ask for it on its own
+                    task = self._get_task(task_id, api_key)
+                if task.status not in FINISHED_TASK_STATUSES:
+                    results[task_id] = None
+                else:
+                    results[task_id] = self._download_result(task)
+            except Exception as e:
+                self.logger.error(f"Failed to complete video task {task_id}: {str(e)}")
+                results[task_id] = e
+        return results
+
+    def _download_result(self, response: Any) -> str:
+        if response.status != "succeeded":
+            raise Exception(
+                f"Video task {response.status}: {getattr(response, 'error', None)}"
+            )
+
+        if hasattr(response.content, "video_url") and response.content.video_url:
+            return download_from_url(response.content.video_url)
+        else:
+            raise Exception("No video URL found in completed task")
+
 
 _service = DoubaoVideoService()
 
@@ -79,3 +135,16 @@ def doubao_gen_animation_task(request: VideoGenerationRequest) -> Any:
 def doubao_wait_animation_task(task: Any, api_key: str) -> str:
     _service.logger.info("Waiting for video task completion")
     return _service._wait_for_completion(task, api_key)
+
+
+def doubao_fetch_animation_task(task: Any, api_key: str) -> Optional[str]:
+    """Check a video task once, returning the result URL or None while it runs"""
+    return _service._fetch_result(task, api_key)
+
+
+def doubao_fetch_animation_tasks(
+    task_ids: list[str], api_key: str
+) -> dict[str, Union[Optional[str], Exception]]:
+    """Check several video tasks with one list call, mapping each id to its result
+    URL, None while it runs, or the error that failed it"""
+    return _service._fetch_results(task_ids, api_key)
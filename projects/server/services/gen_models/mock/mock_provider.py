@@ -0,0 +1,261 @@
+import os
+import math
+import time
+import uuid
+import random
+import logging
+import threading
+from typing import Optional
+
+from services.env import get_env_flag
+from services.gen_models.utils import download_from_url
+from services.gen_models.mock.mock_result_server import MockResultServer
+from defs import JOB_KIND_EDIT, JOB_KIND_VIDEO
+
+logger = logging.getLogger(__name__)
+
+
+MOCK_MODEL_TYPE = "mock"
+MAX_IMAGES_PER_TASK = 4
+
+LATENCY_FIXED = "fixed"
+LATENCY_UNIFORM = "uniform"
+LATENCY_EXPONENTIAL = "exponential"
+LATENCY_LOGNORMAL = "lognormal"
+LATENCY_DISTRIBUTIONS = (
+    LATENCY_FIXED,
+    LATENCY_UNIFORM,
+    LATENCY_EXPONENTIAL,
+    LATENCY_LOGNORMAL,
+)
+
+DEFAULT_LATENCY_DISTRIBUTION = LATENCY_LOGNORMAL
+DEFAULT_LATENCY_SPREAD = 0.5
+DEFAULT_SUBMIT_LATENCY = 0.1
+DEFAULT_IMAGE_LATENCY = 5.0
+DEFAULT_VIDEO_LATENCY = 30.0
+# Share of a task's latency spent queued before the provider starts running it
+DEFAULT_QUEUED_SHARE = 0.2
+DEFAULT_RESULT_HOST = "127.0.0.1"
+# Finished tasks are forgotten after this, like provider task records
+TASK_RETENTION_SECONDS = 3600
+
+TASK_STATUS_PENDING = "PENDING"
+TASK_STATUS_RUNNING = "RUNNING"
+TASK_STATUS_SUCCEEDED = "SUCCEEDED"
+TASK_STATUS_FAILED = "FAILED"
+
+
+def is_mock_provider_enabled() -> bool:
+    """The mock provider is only offered when MOCK_PROVIDER is set, for load tests"""
+    return get_env_flag("MOCK_PROVIDER")
+
+
+def get_mock_settings() -> dict:
+    distribution = os.getenv("MOCK_LATENCY_DISTRIBUTION", DEFAULT_LATENCY_DISTRIBUTION)
+    if distribution not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(
+            f"Unsupported mock latency distribution: {distribution}. Supported: {', '.join(LATENCY_DISTRIBUTIONS)}"
+        )
+    return {
+        "distribution": distribution,
+        # Standard deviation of the log for lognormal, relative half-width for uniform
+        "spread": float(os.getenv("MOCK_LATENCY_SPREAD", str(DEFAULT_LATENCY_SPREAD))),
+        "submit_latency": float(
+            os.getenv("MOCK_SUBMIT_LATENCY", str(DEFAULT_SUBMIT_LATENCY))
+        ),
+        "image_latency": float(
+            os.getenv("MOCK_IMAGE_LATENCY", str(DEFAULT_IMAGE_LATENCY))
+        ),
+        "video_latency": float(
+            os.getenv("MOCK_VIDEO_LATENCY", str(DEFAULT_VIDEO_LATENCY))
+        ),
+        "queued_share": float(
+            os.getenv("MOCK_QUEUED_SHARE", str(DEFAULT_QUEUED_SHARE))
+        ),
+        "submit_failure_rate": float(os.getenv("MOCK_SUBMIT_FAILURE_RATE", "0")),
+        "failure_rate": float(os.getenv("MOCK_FAILURE_RATE", "0")),
+        # Where results are served; empty starts a local stand-in server
+        "result_base_url": os.getenv("MOCK_RESULT_BASE_URL", "").rstrip("/"),
+        "result_port": int(os.getenv("MOCK_RESULT_PORT", "0")),
+        "seed": os.getenv("MOCK_SEED"),
+    }
+
+
+class MockTask:
+    def __init__(
+        self,
+        task_id: str,
+        kind: str,
+        urls: list[str],
+        running_at: float,
+        finished_at: float,
+        fails: bool,
+    ):
+        self.task_id = task_id
+        self.kind = kind
+        self.urls = urls
+        self.running_at = running_at
+        self.finished_at = finished_at
+        self.fails = fails
+
+    def status(self, now: float) -> str:
+        if now < self.running_at:
+            return TASK_STATUS_PENDING
+        if now < self.finished_at:
+            return TASK_STATUS_RUNNING
+        return TASK_STATUS_FAILED if self.fails else TASK_STATUS_SUCCEEDED
+
+
+class MockProviderService:
+    """An in-process provider with task ids, queued and running states, sampled
+    latencies and failures, whose results are real files served over HTTP"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._settings: Optional[dict] = None
+        self._tasks: dict[str, MockTask] = {}
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._result_server: Optional[MockResultServer] = None
+
+    @property
+    def settings(self) -> dict:
+        if self._settings is None:
+            self._settings = get_mock_settings()
+            if self._settings["seed"] is not None:
+                self._random.seed(self._settings["seed"])
+        return self._settings
+
+    def _sample_latency(self, mean: float) -> float:
+        distribution = self.settings["distribution"]
+        spread = self.settings["spread"]
+        if mean <= 0 or distribution == LATENCY_FIXED:
+            return max(0.0, mean)
+        if distribution == LATENCY_UNIFORM:
+            return self._random.uniform(
+                max(0.0, mean * (1 - spread)), mean * (1 + spread)
+            )
+        if distribution == LATENCY_EXPONENTIAL:
+            return self._random.expovariate(1 / mean)
+        # Lognormal with the configured mean: a long tail like real providers
+        return self._random.lognormvariate(math.log(mean) - spread**2 / 2, spread)
+
+    def _get_result_base_url(self) -> str:
+        if self.settings["result_base_url"]:
+            return self.settings["result_base_url"]
+        with self._lock:
+            if self._result_server is None:
+                server = MockResultServer(
+                    DEFAULT_RESULT_HOST, self.settings["result_port"]
+                )
+                server.start()
+                self._result_server = server
+            return self._result_server.base_url
+
+    def _result_urls(self, task_id: str, kind: str, request) -> list[str]:
+        base_url = self._get_result_base_url()
+        # Expiring signatures in the query, as provider result links have
+        expires = int(time.time()) + 86400
+        if kind == JOB_KIND_VIDEO:
+            return [f"{base_url}/{task_id}.mp4?Expires={expires}"]
+        return [
+            f"{base_url}/{task_id}_{i}.png?size={request.size}&Expires={expires}"
+            for i in range(request.n)
+        ]
+
+    def _forget_old_tasks(self, now: float) -> None:
+        expiry = now - TASK_RETENTION_SECONDS
+        for task_id in [
+            t for t, task in self._tasks.items() if task.finished_at < expiry
+        ]:
+            del self._tasks[task_id]
+
+    def create_task(self, kind: str, request) -> str:
+        if not request.api_key:
+            raise ValueError(f"API key is required for {self.__class__.__name__}")
+        if kind == JOB_KIND_EDIT and not request.image_url:
+            raise ValueError("Image URL is required for editing")
+        if kind != JOB_KIND_VIDEO and not 1 <= request.n <= MAX_IMAGES_PER_TASK:
+            raise ValueError(f"n must be between 1 and {MAX_IMAGES_PER_TASK}")
+
+        settings = self.settings
+        time.sleep(self._sample_latency(settings["submit_latency"]))
+        if self._random.random() < settings["submit_failure_rate"]:
+            raise Exception(
+                f"{kind} task creation failed - Status: 503, Message: mock failure"
+            )
+
+        task_id = uuid.uuid4().hex
+        mean = (
+            settings["video_latency"]
+            if kind == JOB_KIND_VIDEO
+            else settings["image_latency"]
+        )
+        latency = self._sample_latency(mean)
+        now = time.monotonic()
+        task = MockTask(
+            task_id,
+            kind,
+            self._result_urls(task_id, kind, request),
+            running_at=now + latency * settings["queued_share"],
+            finished_at=now + latency,
+            fails=self._random.random() < settings["failure_rate"],
+        )
+        with self._lock:
+            self._forget_old_tasks(now)
+            self._tasks[task_id] = task
+        self.logger.info(f"Mock {kind} task created: {task_id}, {latency:.2f}s")
+        return task_id
+
+    def fetch_task(self, task_id: str) -> Optional[list[str]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if task is None:
+            raise Exception(f"Mock task not found: {task_id}")
+
+        status = task.status(time.monotonic())
+        if status in (TASK_STATUS_PENDING, TASK_STATUS_RUNNING):
+            return None
+        if status == TASK_STATUS_FAILED:
+            raise Exception(
+                f"{task.kind} failed - Task status: {status}, Message: mock failure"
+            )
+        return [download_from_url(url) for url in task.urls]
+
+    def wait_task(self, task_id: str) -> list[str]:
+        while True:
+            with self._lock:
+                task = self._tasks.get(task_id)
+            if task is not None:
+                time.sleep(max(0.0, task.finished_at - time.monotonic()))
+            urls = self.fetch_task(task_id)
+            if urls is not None:
+                return urls
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._result_server is not None:
+                self._result_server.shutdown()
+                self._result_server = None
+
+
+_service = MockProviderService()
+
+
+def mock_create_task(kind: str, request) -> str:
+    _service.logger.info(f"Creating mock {kind} task with prompt: {request.prompt}")
+    return _service.create_task(kind, request)
+
+
+def mock_fetch_task(task_id: str) -> Optional[list[str]]:
+    """Check a mock task once, returning its result URLs or None while it runs"""
+    return _service.fetch_task(task_id)
+
+
+def mock_wait_task(task_id: str) -> list[str]:
+    return _service.wait_task(task_id)
+
+
+def shutdown_mock_provider() -> None:
+    _service.shutdown()
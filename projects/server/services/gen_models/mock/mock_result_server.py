@@ -0,0 +1,128 @@
+import os
+import cv2
+import logging
+import tempfile
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_IMAGE_SIZE = (1024, 1024)
+VIDEO_SIZE = (480, 480)
+VIDEO_FPS = 24
+VIDEO_SECONDS = 2
+BACKGROUND_COLOR = (0, 255, 0)
+
+
+def parse_size(size: Optional[str]) -> tuple[int, int]:
+    """Parse a provider size such as 1024*1024 into (width, height)"""
+    try:
+        width, height = (int(part) for part in size.split("*"))
+        return max(1, width), max(1, height)
+    except (AttributeError, ValueError):
+        return DEFAULT_IMAGE_SIZE
+
+
+def render_image(width: int, height: int) -> bytes:
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = BACKGROUND_COLOR
+    radius = max(1, min(width, height) // 4)
+    cv2.circle(image, (width // 2, height // 2), radius, (40, 40, 200), -1)
+    ok, data = cv2.imencode(".png", image)
+    if not ok:
+        raise RuntimeError("Failed to encode mock image")
+    return data.tobytes()
+
+
+def render_video() -> bytes:
+    width, height = VIDEO_SIZE
+    fd, path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(
+            path, cv2.VideoWriter_fourcc(*"mp4v"), VIDEO_FPS, VIDEO_SIZE
+        )
+        for i in range(VIDEO_FPS * VIDEO_SECONDS):
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[:] = BACKGROUND_COLOR
+            x = i * width // (VIDEO_FPS * VIDEO_SECONDS)
+            cv2.circle(frame, (x, height // 2), height // 8, (40, 40, 200), -1)
+            writer.write(frame)
+        writer.release()
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+class MockResultServer:
+    """Serve mock results over HTTP, standing in for a provider's result storage.
+
+    Any path ending in .png is an image, sized by the size query parameter; any
+    path ending in .mp4 is the same short clip.
+    """
+
+    def __init__(self, host: str, port: int):
+        self._images: dict[tuple[int, int], bytes] = {}
+        self._video: Optional[bytes] = None
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-results", daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        self._thread.start()
+        logger.info(f"Mock result server listening on {self.base_url}")
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def get_content(
+        self, path: str, size: Optional[str]
+    ) -> Optional[tuple[str, bytes]]:
+        with self._lock:
+            if path.endswith(".png"):
+                dimensions = parse_size(size)
+                if dimensions not in self._images:
+                    self._images[dimensions] = render_image(*dimensions)
+                return "image/png", self._images[dimensions]
+            if path.endswith(".mp4"):
+                if self._video is None:
+                    self._video = render_video()
+                return "video/mp4", self._video
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                size = parse_qs(parsed.query).get("size", [None])[0]
+                content = server.get_content(parsed.path, size)
+                if content is None:
+                    self.send_error(404)
+                    return
+                content_type, data = content
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Mock result server: {format % args}")
+
+        return Handler
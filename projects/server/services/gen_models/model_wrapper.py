@@ -1,14 +1,25 @@
 import logging
-from defs import ImageGenerationRequest, VideoGenerationRequest, ImageEditRequest
+from typing import Any, Optional, Union
+from defs import (
+    ImageGenerationRequest,
+    VideoGenerationRequest,
+    ImageEditRequest,
+    JOB_KIND_EDIT,
+    JOB_KIND_IMAGE,
+    JOB_KIND_VIDEO,
+)
 
 from services.gen_models.tongyi.tongyi_image_model import (
     tongyi_gen_single_image_task,
     tongyi_wait_single_image_task,
     tongyi_edit_single_image_task,
+    tongyi_fetch_single_image_task,
+    MAX_IMAGES_PER_TASK as TONGYI_MAX_IMAGES_PER_TASK,
 )
 from services.gen_models.tongyi.tongyi_video_model import (
     tongyi_gen_animation_task,
     tongyi_wait_animation_task,
+    tongyi_fetch_animation_task,
 )
 
 from services.gen_models.doubao.doubao_image_model import (
@@ -18,15 +29,54 @@ from services.gen_models.doubao.doubao_image_model import (
 from services.gen_models.doubao.doubao_video_model import (
     doubao_gen_animation_task,
     doubao_wait_animation_task,
+    doubao_fetch_animation_task,
+    doubao_fetch_animation_tasks,
+    MAX_TASKS_PER_LIST,
+)
+
+from services.gen_models.mock.mock_provider import (
+    MOCK_MODEL_TYPE,
+    MAX_IMAGES_PER_TASK as MOCK_MAX_IMAGES_PER_TASK,
+    is_mock_provider_enabled,
+    mock_create_task,
+    mock_fetch_task,
+    mock_wait_task,
 )
 
+from services.metrics import provider_operation
+from services.tracing import span, traced
+
 logger = logging.getLogger(__name__)
 
+SUPPORTED_MODEL_TYPES = ("tongyi", "doubao")
+if is_mock_provider_enabled():
+    SUPPORTED_MODEL_TYPES += (MOCK_MODEL_TYPE,)
+
+
+class SubmittedTask:
+    """A provider task started by ModelRouter.submit, checked with ModelRouter.fetch"""
+
+    def __init__(
+        self,
+        model_type: str,
+        kind: str,
+        api_key: str,
+        handle: Any = None,
+        result: Optional[list[str]] = None,
+    ):
+        self.model_type = model_type
+        self.kind = kind
+        self.api_key = api_key
+        self.handle = handle
+        # Set when the provider answers synchronously and there is nothing to poll
+        self.result = result
+
 
 class ModelRouter:
     """Router class to handle different AI model providers"""
 
     @staticmethod
+    @traced("model_router.generate_image")
     def generate_image(request: ImageGenerationRequest) -> str:
         """Route image generation request to appropriate model"""
         model_type = request.model_type.lower()
@@ -37,12 +87,16 @@ class ModelRouter:
         elif model_type == "doubao":
             logger.info("Routing image generation to Doubao model")
             return ModelRouter._generate_image_doubao(request)
+        elif model_type == MOCK_MODEL_TYPE:
+            logger.info("Routing image generation to mock provider")
+            return ModelRouter._run_mock(JOB_KIND_IMAGE, request)
         else:
             raise ValueError(
-                f"Unsupported model type: {model_type}. Supported: tongyi, doubao"
+                f"Unsupported model type: {model_type}. Supported: {', '.join(SUPPORTED_MODEL_TYPES)}"
             )
 
     @staticmethod
+    @traced("model_router.edit_image")
     def edit_image(request: ImageEditRequest) -> str:
         """Route image editing request to appropriate model"""
         model_type = request.model_type.lower()
@@ -53,12 +107,16 @@ class ModelRouter:
         elif model_type == "doubao":
             logger.info("Routing image editing to Doubao model")
             return ModelRouter._edit_image_doubao(request)
+        elif model_type == MOCK_MODEL_TYPE:
+            logger.info("Routing image editing to mock provider")
+            return ModelRouter._run_mock(JOB_KIND_EDIT, request)
         else:
             raise ValueError(
-                f"Unsupported model type: {model_type}. Supported: tongyi, doubao"
+                f"Unsupported model type: {model_type}. Supported: {', '.join(SUPPORTED_MODEL_TYPES)}"
             )
 
     @staticmethod
+    @traced("model_router.generate_video")
     def generate_video(request: VideoGenerationRequest) -> str:
         """Route video generation request to appropriate model"""
         model_type = request.model_type.lower()
@@ -69,10 +127,161 @@ class ModelRouter:
         elif model_type == "doubao":
             logger.info("Routing video generation to Doubao model")
             return ModelRouter._generate_video_doubao(request)
+        elif model_type == MOCK_MODEL_TYPE:
+            logger.info("Routing video generation to mock provider")
+            return ModelRouter._run_mock(JOB_KIND_VIDEO, request)
         else:
             raise ValueError(
-                f"Unsupported model type: {model_type}. Supported: tongyi, doubao"
+                f"Unsupported model type: {model_type}. Supported: {', '.join(SUPPORTED_MODEL_TYPES)}"
+            )
+
+    @staticmethod
+    def check_model_type(model_type: str) -> str:
+        model_type = model_type.lower()
+        if model_type not in SUPPORTED_MODEL_TYPES:
+            raise ValueError(
+                f"Unsupported model type: {model_type}. Supported: {', '.join(SUPPORTED_MODEL_TYPES)}"
             )
+        return model_type
+
+    @staticmethod
+    def max_images_per_task(model_type: str) -> int:
+        """How many variants one image task can produce through the API's own n"""
+        model_type = model_type.lower()
+        if model_type == "tongyi":
+            return TONGYI_MAX_IMAGES_PER_TASK
+        if model_type == MOCK_MODEL_TYPE:
+            return MOCK_MAX_IMAGES_PER_TASK
+        return 1
+
+    @staticmethod
+    def submit(kind: str, request) -> SubmittedTask:
+        """Start a generation task without waiting for the result"""
+        model_type = ModelRouter.check_model_type(request.model_type)
+        if not request.api_key:
+            raise ValueError(f"API key is required for {model_type} model")
+        logger.info(f"Submitting {kind} task to {model_type} model")
+
+        with provider_operation(model_type, kind), span(
+            "model_router.submit", provider=model_type, kind=kind
+        ):
+            if model_type == MOCK_MODEL_TYPE:
+                handle = mock_create_task(kind, request)
+            elif kind == JOB_KIND_IMAGE:
+                if model_type == "tongyi":
+                    handle = tongyi_gen_single_image_task(request)
+                else:
+                    result = [doubao_gen_single_image(request)]
+                    return SubmittedTask(
+                        model_type, kind, request.api_key, result=result
+                    )
+            elif kind == JOB_KIND_EDIT:
+                if model_type == "tongyi":
+                    handle = tongyi_edit_single_image_task(request)
+                else:
+                    result = [doubao_edit_single_image(request)]
+                    return SubmittedTask(
+                        model_type, kind, request.api_key, result=result
+                    )
+            elif kind == JOB_KIND_VIDEO:
+                if model_type == "tongyi":
+                    handle = tongyi_gen_animation_task(request)
+                else:
+                    handle = doubao_gen_animation_task(request)
+            else:
+                raise ValueError(f"Unsupported job kind: {kind}")
+
+        return SubmittedTask(model_type, kind, request.api_key, handle=handle)
+
+    @staticmethod
+    def get_task_id(task: SubmittedTask) -> Optional[str]:
+        """Provider id of a task that is polled, enough to check it again after a restart"""
+        if task.handle is None or isinstance(task.handle, str):
+            return task.handle
+        return task.handle.output.task_id
+
+    @staticmethod
+    def resume(model_type: str, kind: str, api_key: str, task_id: str) -> SubmittedTask:
+        """Rebuild a task from the id get_task_id returned, for checking with fetch"""
+        # Both providers look tasks up by id as well as by the handle submit returned
+        return SubmittedTask(model_type, kind, api_key, handle=task_id)
+
+    @staticmethod
+    def fetch(task: SubmittedTask) -> Optional[list[str]]:
+        """Check a submitted task once, returning its result URLs or None while it runs"""
+        if task.result is not None:
+            return task.result
+
+        with provider_operation(task.model_type, task.kind), span(
+            "model_router.fetch", provider=task.model_type, kind=task.kind
+        ):
+            if task.model_type == MOCK_MODEL_TYPE:
+                return mock_fetch_task(task.handle)
+
+            if task.kind == JOB_KIND_VIDEO:
+                if task.model_type == "tongyi":
+                    url = tongyi_fetch_animation_task(task.handle, task.api_key)
+                else:
+                    url = doubao_fetch_animation_task(task.handle, task.api_key)
+                return [url] if url is not None else None
+
+            return tongyi_fetch_single_image_task(task.handle, task.api_key)
+
+    @staticmethod
+    def _is_batchable(task: SubmittedTask) -> bool:
+        # Only the Ark task API can look up several tasks in one request
+        return task.model_type == "doubao" and task.kind == JOB_KIND_VIDEO
+
+    @staticmethod
+    def group_for_fetch(tasks: list[SubmittedTask]) -> list[list[SubmittedTask]]:
+        """Group tasks that one status request can check together"""
+        groups = []
+        doubao_videos: dict[str, list[SubmittedTask]] = {}
+        for task in tasks:
+            if ModelRouter._is_batchable(task):
+                doubao_videos.setdefault(task.api_key, []).append(task)
+            else:
+                groups.append([task])
+
+        for same_key in doubao_videos.values():
+            for start in range(0, len(same_key), MAX_TASKS_PER_LIST):
+                groups.append(same_key[start : start + MAX_TASKS_PER_LIST])
+        return groups
+
+    @staticmethod
+    def fetch_many(
+        tasks: list[SubmittedTask],
+    ) -> list[Union[Optional[list[str]], Exception]]:
+        """Check a group from group_for_fetch, returning per task the result URLs,
+        None while it runs, or the error that failed it"""
+        if ModelRouter._is_batchable(tasks[0]):
+            try:
+                with provider_operation(tasks[0].model_type, tasks[0].kind):
+                    results = doubao_fetch_animation_tasks(
+                        [task.handle for task in tasks], tasks[0].api_key
+                    )
+                return [
+                    [result] if isinstance(result, str) else result
+                    for result in (results[task.handle] for task in tasks)
+                ]
+            except Exception as e:
+                logger.warning(
+                    f"Batch status check failed, checking {len(tasks)} tasks one by one: {e}"
+                )
+
+        results = []
+        for task in tasks:
+            try:
+                results.append(ModelRouter.fetch(task))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    @staticmethod
+    def _run_mock(kind: str, request) -> str:
+        """Handle mock provider generation (async task-based)"""
+        ModelRouter.check_model_type(request.model_type)
+        return mock_wait_task(mock_create_task(kind, request))[0]
 
     @staticmethod
     def _generate_image_tongyi(request: ImageGenerationRequest) -> str:
@@ -6,7 +6,12 @@ import urllib.request
 import logging
 from dashscope import ImageSynthesis
 
-from services.gen_models.utils import download_from_url, handle_api_response
+from services.gen_models.utils import (
+    download_from_url,
+    get_local_input,
+    handle_api_response,
+    is_task_finished,
+)
 from services.gen_models.base_image_service import BaseImageService
 from defs import (
     DEFAULT_TONGYI_EDIT_FUNCTION,
@@ -18,6 +23,8 @@ from defs import (
 
 logger = logging.getLogger(__name__)
 
+MAX_IMAGES_PER_TASK = 4
+
 
 class TongyiImageService(BaseImageService):
     def __init__(self):
@@ -34,7 +41,7 @@ class TongyiImageService(BaseImageService):
             "model": self.generation_model,
             "prompt": request.prompt,
             "negative_prompt": request.negative_prompt or "",
-            "n": 1,
+            "n": request.n,
             "size": request.size,
             "prompt_extend": False,
         }
@@ -49,10 +56,10 @@ class TongyiImageService(BaseImageService):
             "api_key": request.api_key,
             "model": self.edit_model,
             "function": self.edit_function,
-            "base_image_url": request.image_url,
+            "base_image_url": get_local_input(request.image_url),
             "prompt": request.prompt,
             "negative_prompt": request.negative_prompt or "",
-            "n": 1,
+            "n": request.n,
             "size": request.size,
             "prompt_extend": False,
         }
@@ -75,17 +82,33 @@ class TongyiImageService(BaseImageService):
         try:
             response = ImageSynthesis.wait(task, api_key=api_key)
             handle_api_response(response, f"{operation} task completion")
+            return self._download_results(response)[0]
 
-            if not response.output.results:
-                raise Exception("No results found in completed task")
+        except Exception as e:
+            self.logger.error(f"Failed to complete {operation.lower()} task: {str(e)}")
+            raise
 
-            result_url = response.output.results[0].url
-            return download_from_url(result_url)
+    def _fetch_result(
+        self, task: Any, api_key: str, operation: str
+    ) -> Optional[list[str]]:
+        try:
+            response = ImageSynthesis.fetch(task, api_key=api_key)
+            if not is_task_finished(response, f"{operation} task"):
+                return None
+            return self._download_results(response)
 
         except Exception as e:
             self.logger.error(f"Failed to complete {operation.lower()} task: {str(e)}")
             raise
 
+    def _download_results(self, response: Any) -> list[str]:
+        # With n > 1 a task can partially succeed; failed variants carry no URL
+        result_urls = [result.url for result in response.output.results if result.url]
+        if not result_urls:
+            raise Exception("No results found in completed task")
+
+        return [download_from_url(result_url) for result_url in result_urls]
+
 
 _service = TongyiImageService()
 
@@ -112,3 +135,8 @@ def tongyi_edit_single_image_task(request: ImageEditRequest) -> Any:
 def tongyi_wait_single_image_task(task: Any, api_key: str) -> str:
     _service.logger.info("Waiting for image task completion")
     return _service._wait_for_completion(task, api_key, "Image")
+
+
+def tongyi_fetch_single_image_task(task: Any, api_key: str) -> Optional[list[str]]:
+    """Check an image task once, returning its result URLs or None while it runs"""
+    return _service._fetch_result(task, api_key, "Image")
@@ -1,7 +1,12 @@
-from typing import Any
+from typing import Any, Optional
 from dashscope import VideoSynthesis
 import logging
-from services.gen_models.utils import download_from_url, handle_api_response
+from services.gen_models.utils import (
+    download_from_url,
+    get_local_input,
+    handle_api_response,
+    is_task_finished,
+)
 from services.gen_models.base_video_service import BaseVideoService
 from defs import DEFAULT_TONGYI_VIDEO_MODEL, VideoGenerationRequest
 
@@ -25,7 +30,7 @@ class TongyiVideoService(BaseVideoService):
                 model=self.model,
                 prompt=request.prompt,
                 negative_prompt=request.negative_prompt or "",
-                img_url=request.base_image_url,
+                img_url=get_local_input(request.base_image_url),
                 resolution=request.resolution,
                 prompt_extend=False,
             )
@@ -41,16 +46,29 @@ class TongyiVideoService(BaseVideoService):
         try:
             response = VideoSynthesis.wait(task, api_key=api_key)
             handle_api_response(response, "Video task completion")
+            return self._download_result(response)
 
-            if hasattr(response.output, "video_url") and response.output.video_url:
-                return download_from_url(response.output.video_url)
-            else:
-                raise Exception("No video URL found in completed task")
+        except Exception as e:
+            self.logger.error(f"Failed to complete video task: {str(e)}")
+            raise
+
+    def _fetch_result(self, task: Any, api_key: str) -> Optional[str]:
+        try:
+            response = VideoSynthesis.fetch(task, api_key=api_key)
+            if not is_task_finished(response, "Video task"):
+                return None
+            return self._download_result(response)
 
         except Exception as e:
             self.logger.error(f"Failed to complete video task: {str(e)}")
             raise
 
+    def _download_result(self, response: Any) -> str:
+        if hasattr(response.output, "video_url") and response.output.video_url:
+            return download_from_url(response.output.video_url)
+        else:
+            raise Exception("No video URL found in completed task")
+
 
 _service = TongyiVideoService()
 
@@ -63,3 +81,8 @@ def tongyi_gen_animation_task(request: VideoGenerationRequest) -> Any:
 def tongyi_wait_animation_task(task: Any, api_key: str) -> str:
     _service.logger.info("Waiting for video task completion")
     return _service._wait_for_completion(task, api_key)
+
+
+def tongyi_fetch_animation_task(task: Any, api_key: str) -> Optional[str]:
+    """Check a video task once, returning the result URL or None while it runs"""
+    return _service._fetch_result(task, api_key)
@@ -1,20 +1,38 @@
 from http import HTTPStatus
-from urllib.parse import urlparse, unquote
-from pathlib import PurePosixPath
-import urllib.request
 import logging
-from services.path import get_cache_file_path
+from services.asset_cache import cache_in_background, find_local_asset
+from services.path import encode_file
+from services.tracing import traced
 
 logger = logging.getLogger(__name__)
 
+TASK_STATUS_SUCCEEDED = "SUCCEEDED"
+PENDING_TASK_STATUSES = ("PENDING", "RUNNING")
+RETRYABLE_STATUS_CODES = (
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+)
 
+
+@traced("download_from_url")
 def download_from_url(url: str) -> str:
-    file_name = PurePosixPath(unquote(urlparse(url).path)).parts[-1]
-    cache_path = get_cache_file_path(file_name)
-    urllib.request.urlretrieve(url, cache_path)
+    """Start caching a provider result locally and return its URL without waiting"""
+    return cache_in_background(url)
+
+
+def get_local_input(url: str, inline: bool = False) -> str:
+    """Send a provider our local copy of an input image when there is one, so results
+    whose remote URL has expired can still be edited or animated.
 
-    logger.info(f"downloaded to: {cache_path}")
-    return url
+    Tongyi uploads file:// paths itself; Ark takes the image inline as a data URL.
+    """
+    local_path = find_local_asset(url)
+    if local_path is None:
+        return url
+    return encode_file(local_path) if inline else f"file://{local_path}"
 
 
 def handle_api_response(task_or_response, operation: str) -> None:
@@ -24,3 +42,26 @@ def handle_api_response(task_or_response, operation: str) -> None:
         error_msg = f"{operation} failed - Status: {task_or_response.status_code}, Code: {task_or_response.code}, Message: {task_or_response.message}"
         logger.error(error_msg)
         raise Exception(error_msg)
+
+
+def is_task_finished(response, operation: str) -> bool:
+    """Check one task status response, returning False while the task is still running"""
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        logger.warning(
+            f"{operation} status check failed temporarily - Status: {response.status_code}, Message: {response.message}"
+        )
+        return False
+
+    if response.status_code != HTTPStatus.OK:
+        handle_api_response(response, operation)
+
+    task_status = response.output.task_status
+    if task_status in PENDING_TASK_STATUSES:
+        return False
+
+    if task_status != TASK_STATUS_SUCCEEDED:
+        error_msg = f"{operation} failed - Task status: {task_status}, Code: {response.output.get('code')}, Message: {response.output.get('message')}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+
+    return True
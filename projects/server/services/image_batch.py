@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from fastapi import HTTPException
+from typing import AsyncIterator
+
+from services.gen_models.model_wrapper import ModelRouter
+from services.jobs import job_manager
+from defs import (
+    BATCH_EVENT_DONE,
+    BATCH_EVENT_ERROR,
+    BATCH_EVENT_IMAGE,
+    BatchImageEvent,
+    BatchImageGenerationRequest,
+    ImageGenerationRequest,
+    JOB_KIND_IMAGE,
+    JOB_STATUS_SUCCEEDED,
+    JobInfo,
+    MAX_BATCH_IMAGES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BatchChunk:
+    """Variants of one prompt that are generated by a single provider task"""
+
+    def __init__(self, prompt_index: int, first_variant: int, request):
+        self.prompt_index = prompt_index
+        self.first_variant = first_variant
+        self.request = request
+
+
+def get_default_batch_task_id(request: BatchImageGenerationRequest) -> str:
+    return f"batch_{request.prompts[0][:20].replace(' ', '_')}_{request.model_type}"
+
+
+def plan_image_batch(request: BatchImageGenerationRequest) -> list[BatchChunk]:
+    """Split a batch into provider tasks, using the provider's native n where it exists"""
+    if not request.prompts:
+        raise HTTPException(status_code=400, detail="At least one prompt is required.")
+    if request.n < 1:
+        raise HTTPException(status_code=400, detail="n must be at least 1.")
+    total = len(request.prompts) * request.n
+    if total > MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch of {total} images exceeds the limit of {MAX_BATCH_IMAGES}.",
+        )
+
+    per_task = ModelRouter.max_images_per_task(request.model_type)
+    chunks = []
+    for prompt_index, prompt in enumerate(request.prompts):
+        for first_variant in range(0, request.n, per_task):
+            # Consecutive seeds keep a seeded batch reproducible without repeating images
+            seed = request.seed + first_variant if request.seed > 0 else request.seed
+            chunk_request = ImageGenerationRequest(
+                api_key=request.api_key,
+                prompt=prompt,
+                negative_prompt=request.negative_prompt,
+                seed=seed,
+                size=request.size,
+                task_id=f"{request.task_id}_{prompt_index}_{first_variant}",
+                model_type=request.model_type,
+                priority=request.priority,
+                use_cache=request.use_cache,
+                routing=request.routing,
+                fallback_api_key=request.fallback_api_key,
+                n=min(per_task, request.n - first_variant),
+            )
+            chunks.append(BatchChunk(prompt_index, first_variant, chunk_request))
+    return chunks
+
+
+def submit_image_batch(chunks: list[BatchChunk]) -> list[JobInfo]:
+    """Submit every chunk at once; a full provider queue rejects the whole batch"""
+    jobs = []
+    try:
+        for chunk in chunks:
+            jobs.append(job_manager.submit(JOB_KIND_IMAGE, chunk.request))
+    except HTTPException:
+        for info in jobs:
+            job_manager.cancel(info.job_id)
+        raise
+    return jobs
+
+
+async def stream_image_batch(
+    request: BatchImageGenerationRequest,
+    chunks: list[BatchChunk],
+    jobs: list[JobInfo],
+) -> AsyncIterator[str]:
+    """Yield NDJSON batch events, one line per image as soon as its job finishes"""
+    waiters = {
+        asyncio.create_task(job_manager.wait(info.job_id)): chunk
+        for chunk, info in zip(chunks, jobs)
+    }
+    count = 0
+    failed = 0
+    try:
+        pending = set(waiters)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for waiter in done:
+                chunk = waiters[waiter]
+                try:
+                    info = waiter.result()
+                except Exception as e:
+                    info = None
+                    error_info = str(e)
+                else:
+                    error_info = info.error_info
+
+                if info is None or info.status != JOB_STATUS_SUCCEEDED:
+                    failed += 1
+                    event = BatchImageEvent(
+                        event=BATCH_EVENT_ERROR,
+                        task_id=request.task_id,
+                        prompt_index=chunk.prompt_index,
+                        variant_index=chunk.first_variant,
+                        job_id=info.job_id if info else None,
+                        error_info=error_info,
+                    )
+                    yield event.model_dump_json(exclude_none=True) + "\n"
+                    continue
+
+                for offset, url in enumerate(info.urls):
+                    count += 1
+                    event = BatchImageEvent(
+                        event=BATCH_EVENT_IMAGE,
+                        task_id=request.task_id,
+                        prompt_index=chunk.prompt_index,
+                        variant_index=chunk.first_variant + offset,
+                        url=url,
+                        job_id=info.job_id,
+                    )
+                    yield event.model_dump_json(exclude_none=True) + "\n"
+    finally:
+        # Jobs of a batch nobody listens to anymore are not worth finishing
+        for waiter, info in zip(waiters, jobs):
+            if not waiter.done():
+                waiter.cancel()
+                job_manager.cancel(info.job_id)
+
+    logger.info(
+        f"Batch {request.task_id} completed: {count} images, {failed} failed tasks"
+    )
+    event = BatchImageEvent(
+        event=BATCH_EVENT_DONE, task_id=request.task_id, count=count
+    )
+    yield event.model_dump_json(exclude_none=True) + "\n"
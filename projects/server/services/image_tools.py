@@ -1,28 +1,191 @@
 import os
+import logging
+import threading
 import numpy as np
 from rembg import remove, new_session
 import cv2
 
+from services.env import get_env_flag
 from services.path import get_cache_folder
+from services.cache_manager import GIB, CacheArea, cache_manager, get_area_budget
+from services.tracing import span, traced
 
-cache_dir = os.path.join(get_cache_folder(), "transparent_images")
+logger = logging.getLogger(__name__)
+
+TRANSPARENT_IMAGES_AREA = "transparent_images"
+DEFAULT_TRANSPARENT_IMAGES_MAX_BYTES = 1 * GIB
+
+cache_dir = os.path.join(get_cache_folder(), TRANSPARENT_IMAGES_AREA)
 os.makedirs(cache_dir, exist_ok=True)
+cache_manager.register(
+    CacheArea(
+        TRANSPARENT_IMAGES_AREA,
+        cache_dir,
+        get_area_budget(TRANSPARENT_IMAGES_AREA, DEFAULT_TRANSPARENT_IMAGES_MAX_BYTES),
+    )
+)
+
+DEFAULT_REMBG_MODEL = "isnet-anime"
+DEFAULT_FOREGROUND_THRESHOLD = 240
+DEFAULT_BACKGROUND_THRESHOLD = 10
+DEFAULT_ERODE_SIZE = 10
+FLOW_MAX_SIDE = 256
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_rembg_settings() -> dict:
+    """Get the background removal model and alpha matting settings from environment"""
+    return {
+        "model": os.getenv("REMBG_MODEL", DEFAULT_REMBG_MODEL),
+        "alpha_matting": get_env_flag("REMBG_ALPHA_MATTING", True),
+        "alpha_matting_foreground_threshold": int(
+            os.getenv(
+                "REMBG_ALPHA_MATTING_FOREGROUND_THRESHOLD",
+                str(DEFAULT_FOREGROUND_THRESHOLD),
+            )
+        ),
+        "alpha_matting_background_threshold": int(
+            os.getenv(
+                "REMBG_ALPHA_MATTING_BACKGROUND_THRESHOLD",
+                str(DEFAULT_BACKGROUND_THRESHOLD),
+            )
+        ),
+        "alpha_matting_erode_size": int(
+            os.getenv("REMBG_ALPHA_MATTING_ERODE_SIZE", str(DEFAULT_ERODE_SIZE))
+        ),
+    }
+
 
+def get_rembg_session(model_name: str):
+    """Get the process-wide rembg session for a model, loading it on first use"""
+    with _sessions_lock:
+        session = _sessions.get(model_name)
+        if session is None:
+            logger.info(f"Loading rembg session: {model_name}")
+            session = new_session(model_name)
+            _sessions[model_name] = session
+        return session
 
+
+@traced("remove_solid_background")
 def remove_solid_background(image_path: str, file_name: str) -> str:
     input = cv2.imread(image_path)
-    session = new_session("isnet-anime")
     if input is None:
         raise ValueError(f"Could not load image from path: {image_path}")
 
+    settings = get_rembg_settings()
+    session = get_rembg_session(settings.pop("model"))
+
     output_path = os.path.join(cache_dir, file_name)
-    output = remove(input, session=session, alpha_matting=True)
+    output = remove(input, session=session, **settings)
 
     if isinstance(output, np.ndarray):
         output_array = output
     else:
         output_array = np.array(output)
 
-    cv2.imwrite(output_path, output_array)
+    with span("cv2.imwrite"):
+        cv2.imwrite(output_path, output_array)
+    cache_manager.record_write(TRANSPARENT_IMAGES_AREA, os.path.getsize(output_path))
 
     return output_path
+
+
+def parse_key_color(key_color: str) -> np.ndarray:
+    """Parse an RGB hex colour such as #00b140 into a BGR pixel"""
+    value = key_color.strip().lstrip("#")
+    if len(value) != 6:
+        raise ValueError(f"Invalid key colour: {key_color}")
+    r, g, b = (int(value[i : i + 2], 16) for i in (0, 2, 4))
+    return np.array([b, g, r], dtype=np.uint8)
+
+
+def detect_key_color(frames: np.ndarray, border: int = 4) -> np.ndarray:
+    """Estimate the solid background colour as the median of the frame borders"""
+    edges = np.concatenate(
+        [
+            frames[:, :border].reshape(-1, 3),
+            frames[:, -border:].reshape(-1, 3),
+            frames[:, :, :border].reshape(-1, 3),
+            frames[:, :, -border:].reshape(-1, 3),
+        ]
+    )
+    return np.median(edges, axis=0).astype(np.uint8)
+
+
+def _to_chroma(pixels: np.ndarray) -> np.ndarray:
+    # Cr/Cb planes of YCrCb, so shading on the backdrop does not change the match
+    weights = np.array(
+        [[-0.0813, 0.5], [-0.4187, -0.3313], [0.5, -0.1687]], dtype=np.float32
+    )
+    return pixels.astype(np.float32) @ weights
+
+
+def chroma_key_frames(
+    frames: np.ndarray,
+    key_color: np.ndarray,
+    tolerance: float,
+    softness: float,
+    despill: bool = True,
+) -> np.ndarray:
+    """Key a (N, H, W, 3) BGR batch against a solid colour, returning (N, H, W, 4) BGRA"""
+    distance = np.linalg.norm(_to_chroma(frames) - _to_chroma(key_color), axis=-1)
+    alpha = np.clip((distance - tolerance) / max(softness, 1e-3), 0.0, 1.0)
+
+    output = frames.copy()
+    if despill:
+        # Clamp the key's dominant channel to the other two to remove colour spill
+        channel = int(np.argmax(key_color))
+        others = [c for c in range(3) if c != channel]
+        np.minimum(
+            output[..., channel],
+            np.maximum(output[..., others[0]], output[..., others[1]]),
+            out=output[..., channel],
+        )
+
+    alpha_channel = (alpha * 255).astype(np.uint8)[..., np.newaxis]
+    return np.concatenate([output, alpha_channel], axis=-1)
+
+
+def frame_difference(gray: np.ndarray, reference_gray: np.ndarray) -> float:
+    """Mean absolute difference between two grayscale frames, on a 0-255 scale"""
+    return float(cv2.absdiff(gray, reference_gray).mean())
+
+
+def propagate_alpha(
+    reference_gray: np.ndarray,
+    reference_alpha: np.ndarray,
+    gray: np.ndarray,
+    max_side: int = FLOW_MAX_SIDE,
+) -> np.ndarray:
+    """Warp the alpha mask of a segmented frame onto a nearby frame with dense optical flow"""
+    height, width = gray.shape
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        small_gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        small_reference = cv2.resize(reference_gray, size, interpolation=cv2.INTER_AREA)
+    else:
+        small_gray, small_reference = gray, reference_gray
+
+    # Flow from the new frame back to the reference, so every pixel samples its source.
+    # DIS copes with the flat, outlined shapes of sprite art better than Farneback.
+    flow = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_FAST).calc(
+        small_gray, small_reference, None
+    )
+    if scale < 1.0:
+        flow = cv2.resize(flow, (width, height), interpolation=cv2.INTER_LINEAR)
+        flow /= scale
+
+    grid_x, grid_y = np.meshgrid(
+        np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32)
+    )
+    return cv2.remap(
+        reference_alpha,
+        grid_x + flow[..., 0],
+        grid_y + flow[..., 1],
+        cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_REPLICATE,
+    )
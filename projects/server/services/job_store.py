@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import uuid
+import base64
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+from services.path import get_data_folder
+from defs import (
+    DEFAULT_HISTORY_LIMIT,
+    HistoryPage,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_RUNNING,
+    JOB_STATUS_SUCCEEDED,
+    JobInfo,
+    JobRecord,
+    MAX_HISTORY_LIMIT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_JOB_STORE_FILENAME = "jobs.sqlite3"
+# Credentials are never stored; a job interrupted by a restart resumes only once its
+# client supplies them again
+SECRET_FIELDS = {"api_key", "fallback_api_key"}
+JOB_STORE_FILE_MODE = 0o600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    model_type TEXT,
+    status TEXT NOT NULL,
+    task_id TEXT,
+    provider TEXT,
+    provider_task_id TEXT,
+    url TEXT,
+    urls TEXT NOT NULL DEFAULT '[]',
+    asset_urls TEXT NOT NULL DEFAULT '[]',
+    error_info TEXT,
+    cached INTEGER NOT NULL DEFAULT 0,
+    params TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at, job_id);
+CREATE INDEX IF NOT EXISTS jobs_kind_created ON jobs (kind, created_at, job_id);
+CREATE INDEX IF NOT EXISTS jobs_task_created ON jobs (task_id, created_at, job_id);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at, job_id);
+"""
+
+# Fields of JobInfo that change over the life of a job
+MUTABLE_FIELDS = (
+    "status",
+    "provider",
+    "provider_task_id",
+    "url",
+    "urls",
+    "asset_urls",
+    "error_info",
+    "cached",
+    "updated_at",
+    "started_at",
+    "finished_at",
+)
+LIST_FIELDS = ("urls", "asset_urls")
+
+
+def get_job_store_path() -> str:
+    return os.getenv(
+        "JOB_STORE_PATH", os.path.join(get_data_folder(), DEFAULT_JOB_STORE_FILENAME)
+    )
+
+
+def split_secrets(params: dict) -> tuple[dict, dict]:
+    """Separate the credentials of a request from its other parameters"""
+    public = {k: v for k, v in params.items() if k not in SECRET_FIELDS}
+    secrets = {k: v for k, v in params.items() if k in SECRET_FIELDS and v}
+    return public, secrets
+
+
+def _encode_cursor(created_at: float, job_id: str) -> str:
+    return base64.urlsafe_b64encode(
+        json.dumps([created_at, job_id]).encode("utf-8")
+    ).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[float, str]:
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return float(created_at), str(job_id)
+    except Exception:
+        raise ValueError(f"Invalid history cursor: {cursor}")
+
+
+class JobStore:
+    """Every generation, edit, split and zip the server ran, kept in SQLite.
+
+    Writes are single-row statements on one writer connection, cheap enough to run
+    inline wherever a job changes. Reads use a connection per thread, so a slow
+    history query never holds up a write. Writes log failures instead of raising
+    them: losing a history entry must not fail the job it describes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._local = threading.local()
+        self._readers: list[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # Overwrite deleted content instead of leaving it in free pages
+        conn.execute("PRAGMA secure_delete=ON")
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Private to the server; SQLite gives its WAL and shared memory files the
+            # same mode
+            os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, JOB_STORE_FILE_MODE))
+            os.chmod(self.path, JOB_STORE_FILE_MODE)
+            conn = self._open()
+            # Readers do not block the writer, and commits skip the fsync
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            logger.info(f"Job store opened: {self.path}")
+        return self._conn
+
+    def _execute(self, sql: str, args=()) -> list[sqlite3.Row]:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                return conn.execute(sql, args).fetchall()
+
+    def _query(self, sql: str, args=()) -> list[sqlite3.Row]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # The writer creates the schema before the first reader opens
+            with self._lock:
+                self._connect()
+            conn = self._open()
+            with self._readers_lock:
+                self._readers.append(conn)
+            self._local.conn = conn
+        return conn.execute(sql, args).fetchall()
+
+    def create(self, info: JobInfo, params: dict) -> None:
+        row = info.model_dump()
+        for field in LIST_FIELDS:
+            row[field] = json.dumps(row[field])
+        row["params"] = json.dumps(params, default=str)
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{column}" for column in row)
+        self._write(
+            f"INSERT OR REPLACE INTO jobs ({columns}) VALUES ({placeholders})", row
+        )
+
+    def update(self, info: JobInfo) -> None:
+        row = {field: getattr(info, field) for field in MUTABLE_FIELDS}
+        for field in LIST_FIELDS:
+            row[field] = json.dumps(row[field])
+        row["job_id"] = info.job_id
+        assignments = ", ".join(f"{field} = :{field}" for field in MUTABLE_FIELDS)
+        self._write(f"UPDATE jobs SET {assignments} WHERE job_id = :job_id", row)
+
+    def _write(self, sql: str, row: dict) -> None:
+        try:
+            self._execute(sql, row)
+        except Exception as e:
+            logger.error(f"Failed to record job {row['job_id']}: {e}", exc_info=True)
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        rows = self._query("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        return self._to_record(rows[0]) if rows else None
+
+    def list_unfinished(self) -> list[JobRecord]:
+        """Jobs that were queued or running when the server stopped"""
+        rows = self._query(
+            "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+            (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING),
+        )
+        return [self._to_record(row) for row in rows]
+
+    def history(
+        self,
+        kind: Optional[str] = None,
+        status: Optional[str] = None,
+        task_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_HISTORY_LIMIT,
+    ) -> HistoryPage:
+        """Newest jobs first, a page at a time; pass next_cursor to get the next page.
+
+        Raises ValueError for a cursor that was not returned by this method.
+        """
+        limit = max(1, min(limit, MAX_HISTORY_LIMIT))
+        conditions = []
+        args: list = []
+        if kind:
+            conditions.append("kind = ?")
+            args.append(kind)
+        if status:
+            conditions.append("status = ?")
+            args.append(status)
+        if task_id:
+            conditions.append("task_id = ?")
+            args.append(task_id)
+        if cursor:
+            # Keyset pagination stays on the index however deep the page is
+            conditions.append("(created_at, job_id) < (?, ?)")
+            args.extend(_decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._query(
+            f"SELECT * FROM jobs {where} ORDER BY created_at DESC, job_id DESC LIMIT ?",
+            (*args, limit + 1),
+        )
+        items = [self._to_record(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _encode_cursor(items[-1].created_at, items[-1].job_id)
+        return HistoryPage(items=items, next_cursor=next_cursor)
+
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> JobRecord:
+        data = dict(row)
+        for field in LIST_FIELDS:
+            data[field] = json.loads(data[field])
+        data["params"] = json.loads(data["params"])
+        data["cached"] = bool(data["cached"])
+        return JobRecord(**data)
+
+    def record_started(
+        self, kind: str, task_id: Optional[str], params: dict
+    ) -> JobInfo:
+        """Record a job the server runs itself, such as a split or a zip"""
+        now = time.time()
+        info = JobInfo(
+            job_id=uuid.uuid4().hex,
+            kind=kind,
+            status=JOB_STATUS_RUNNING,
+            task_id=task_id,
+            created_at=now,
+            updated_at=now,
+            started_at=now,
+        )
+        self.create(info, split_secrets(params)[0])
+        return info
+
+    def record_finished(
+        self,
+        info: JobInfo,
+        error_info: Optional[str] = None,
+        asset_urls: Optional[list[str]] = None,
+    ) -> JobInfo:
+        now = time.time()
+        info = info.model_copy(
+            update={
+                "status": JOB_STATUS_FAILED if error_info else JOB_STATUS_SUCCEEDED,
+                "error_info": error_info,
+                "asset_urls": asset_urls or [],
+                "updated_at": now,
+                "finished_at": now,
+            }
+        )
+        self.update(info)
+        return info
+
+    def close(self) -> None:
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+            self._local = threading.local()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+job_store = JobStore(get_job_store_path())
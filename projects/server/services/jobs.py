@@ -0,0 +1,571 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from fastapi import HTTPException
+from typing import AsyncIterator, Optional, Union
+
+from services.gen_models.model_wrapper import ModelRouter, SubmittedTask
+from services.task_poller import task_poller
+from services.provider_queue import Ticket, provider_queue
+from services.routing_policy import routing_policy
+from services.asset_cache import get_asset_url
+from services.job_store import job_store, split_secrets
+from services.metrics import (
+    PROVIDER_QUEUE_WAIT_SECONDS,
+    PROVIDER_SUBMIT_SECONDS,
+    PROVIDER_WAIT_SECONDS,
+)
+from services.result_cache import (
+    get_result_cache_key,
+    load_cached_result,
+    save_cached_result,
+)
+from defs import (
+    ImageEditRequest,
+    ImageGenerationRequest,
+    JOB_FINISHED_STATUSES,
+    JOB_KIND_EDIT,
+    JOB_KIND_IMAGE,
+    JOB_KIND_VIDEO,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_INTERRUPTED,
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_RUNNING,
+    JOB_STATUS_SUCCEEDED,
+    JobInfo,
+    ROUTING_HEDGED,
+    VideoGenerationRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+
+GenerationRequest = Union[
+    ImageGenerationRequest, ImageEditRequest, VideoGenerationRequest
+]
+
+REQUEST_TYPES = {
+    JOB_KIND_IMAGE: ImageGenerationRequest,
+    JOB_KIND_EDIT: ImageEditRequest,
+    JOB_KIND_VIDEO: VideoGenerationRequest,
+}
+
+TASK_ID_PREFIXES = {
+    JOB_KIND_IMAGE: "img",
+    JOB_KIND_EDIT: "edit",
+    JOB_KIND_VIDEO: "vid",
+}
+
+DEFAULT_JOB_RETENTION = 3600
+INTERRUPTED_ERROR = "Interrupted by a server restart"
+
+
+def get_job_retention() -> float:
+    return float(os.getenv("JOB_RETENTION_SECONDS", str(DEFAULT_JOB_RETENTION)))
+
+
+def get_default_task_id(kind: str, request: GenerationRequest) -> str:
+    return f"{TASK_ID_PREFIXES[kind]}_{request.prompt[:20].replace(' ', '_')}_{request.model_type}"
+
+
+def get_provider_api_key(request: GenerationRequest, provider: str) -> str:
+    if provider == request.model_type.lower():
+        return request.api_key
+    return request.fallback_api_key
+
+
+class Job:
+    def __init__(
+        self,
+        kind: str,
+        request: GenerationRequest,
+        ticket: Optional[Ticket],
+        cache_key: Optional[str],
+        providers: list[str],
+        info: Optional[JobInfo] = None,
+    ):
+        now = time.time()
+        self.request = request
+        self.ticket = ticket
+        self.cache_key = cache_key
+        # Providers the job may run on, the one holding the ticket first
+        self.providers = providers
+        self.info = info or JobInfo(
+            job_id=uuid.uuid4().hex,
+            kind=kind,
+            model_type=request.model_type.lower(),
+            task_id=request.task_id or get_default_task_id(kind, request),
+            created_at=now,
+            updated_at=now,
+        )
+        self.runner: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.info.status in JOB_FINISHED_STATUSES
+
+    async def update(self, **changes) -> None:
+        now = time.time()
+        status = changes.get("status")
+        if status == JOB_STATUS_RUNNING and self.info.started_at is None:
+            changes["started_at"] = now
+        elif status in JOB_FINISHED_STATUSES:
+            changes["finished_at"] = now
+
+        async with self._changed:
+            self.info = self.info.model_copy(update={**changes, "updated_at": now})
+            job_store.update(self.info)
+            self._changed.notify_all()
+
+    async def wait_for_change(self, seen: JobInfo) -> JobInfo:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.info is not seen)
+            return self.info
+
+
+class JobManager:
+    """Run generation jobs as event-loop tasks, so waiting on a provider holds no thread"""
+
+    def __init__(self):
+        self._jobs: dict[str, Job] = {}
+        # Running jobs by result cache key, so identical requests share one provider call
+        self._by_cache_key: dict[str, Job] = {}
+        # Set while shutting down, when cancelled jobs stay unfinished to be resumed
+        self._closing = False
+
+    def submit(self, kind: str, request: GenerationRequest) -> JobInfo:
+        """Register a job and start it in the background, returning immediately.
+
+        Raises a 429 HTTPException when the provider queue is full, or a 400 one
+        for an unsupported model type or a routing policy the request cannot use.
+        """
+        self._prune()
+        # Before the queue, which keeps state for every provider name it sees
+        try:
+            ModelRouter.check_model_type(request.model_type)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        providers = routing_policy.plan(kind, request)
+
+        cache_key = get_result_cache_key(kind, request)
+        leader = self._by_cache_key.get(cache_key) if cache_key else None
+        cached_url = load_cached_result(cache_key) if cache_key and not leader else None
+
+        ticket = None
+        if leader is None and cached_url is None:
+            ticket = provider_queue.reserve(
+                providers[0],
+                get_provider_api_key(request, providers[0]),
+                request.priority,
+            )
+
+        job = Job(kind, request, ticket, cache_key, providers)
+        job_id = job.info.job_id
+        self._jobs[job_id] = job
+
+        if cached_url is not None:
+            job.request = None
+            job.info = job.info.model_copy(
+                update={
+                    "status": JOB_STATUS_SUCCEEDED,
+                    "url": cached_url,
+                    "urls": [cached_url],
+                    "asset_urls": [get_asset_url(cached_url)],
+                    "cached": True,
+                    "finished_at": job.info.created_at,
+                }
+            )
+            logger.info(f"Job {job_id} served from result cache: {cached_url}")
+        elif leader is not None:
+            job.request = None
+            job.runner = asyncio.create_task(self._follow(job, leader))
+            job.runner.add_done_callback(lambda _: self._on_runner_done(job))
+            logger.info(f"Job {job_id} joined identical job {leader.info.job_id}")
+        else:
+            if cache_key:
+                self._by_cache_key[cache_key] = job
+            job.runner = asyncio.create_task(self._run(job))
+            job.runner.add_done_callback(lambda _: self._on_runner_done(job))
+            logger.info(
+                f"Job {job_id} queued: {kind} on {job.info.model_type}, task: {job.info.task_id}"
+            )
+
+        job_store.create(job.info, split_secrets(request.model_dump())[0])
+        return job.info
+
+    def get(self, job_id: str) -> Optional[JobInfo]:
+        """A job of this run, or of an earlier one from the job store"""
+        job = self._jobs.get(job_id)
+        return job.info if job else job_store.get(job_id)
+
+    async def wait(self, job_id: str) -> JobInfo:
+        """Wait until the job succeeds or fails, or return it interrupted"""
+        async for info in self.watch(job_id):
+            if info.status in (*JOB_FINISHED_STATUSES, JOB_STATUS_INTERRUPTED):
+                return info
+        raise KeyError(job_id)
+
+    async def watch(self, job_id: str) -> AsyncIterator[JobInfo]:
+        """Yield the job state now and after every change, until it finishes"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            # Not running in this process: finished, or interrupted until resumed
+            record = job_store.get(job_id)
+            if record is not None and record.status in (
+                *JOB_FINISHED_STATUSES,
+                JOB_STATUS_INTERRUPTED,
+            ):
+                yield JobInfo(**record.model_dump(exclude={"params"}))
+            return
+
+        info = job.info
+        yield info
+        while info.status not in JOB_FINISHED_STATUSES:
+            info = await job.wait_for_change(info)
+            yield info
+
+    async def _run(self, job: Job, resumed: Optional[SubmittedTask] = None) -> None:
+        job_id = job.info.job_id
+        try:
+            if resumed is None:
+                provider, urls = await self._execute(job)
+            else:
+                provider, urls = resumed.model_type, await task_poller.track(resumed)
+
+            # A result from a fallback provider does not answer the cached request
+            if job.cache_key and provider == job.info.model_type:
+                try:
+                    await asyncio.to_thread(save_cached_result, job.cache_key, urls[0])
+                except Exception as e:
+                    logger.warning(f"Failed to cache result of job {job_id}: {e}")
+
+            await job.update(
+                status=JOB_STATUS_SUCCEEDED,
+                url=urls[0],
+                urls=urls,
+                asset_urls=[get_asset_url(url) for url in urls],
+                provider=provider,
+            )
+            logger.info(f"Job {job_id} succeeded on {provider}: {', '.join(urls)}")
+        except asyncio.CancelledError:
+            if not self._closing:
+                await job.update(status=JOB_STATUS_FAILED, error_info="Job cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            await job.update(status=JOB_STATUS_FAILED, error_info=str(e))
+        finally:
+            # The API key is only needed while talking to the provider
+            job.request = None
+
+    async def _execute(self, job: Job) -> tuple[str, list[str]]:
+        """Run the job on its first provider, failing over to the next one on errors
+        and, for hedged routing, also starting it once the first one runs slow.
+
+        Returns the provider whose result came first and its URLs.
+        """
+        job_id = job.info.job_id
+        kind = job.info.kind
+        candidates = list(job.providers)
+        hedged = job.request.routing == ROUTING_HEDGED
+        attempts: dict[asyncio.Task, tuple[str, Ticket]] = {}
+        ticket = job.ticket
+        error: Optional[Exception] = None
+
+        def start_next() -> bool:
+            nonlocal ticket
+            while candidates:
+                provider = candidates.pop(0)
+                if ticket is None:
+                    if not routing_policy.allow(provider):
+                        logger.info(
+                            f"Job {job_id} skips {provider}, its circuit is open"
+                        )
+                        continue
+                    try:
+                        ticket = provider_queue.reserve(
+                            provider,
+                            get_provider_api_key(job.request, provider),
+                            job.request.priority,
+                        )
+                    except HTTPException as e:
+                        logger.warning(
+                            f"Job {job_id} cannot queue on {provider}: {e.detail}"
+                        )
+                        continue
+                attempt = asyncio.create_task(self._attempt(job, provider, ticket))
+                attempts[attempt] = (provider, ticket)
+                ticket = None
+                return True
+            return False
+
+        start_next()
+        started = time.monotonic()
+        try:
+            while attempts:
+                timeout = None
+                if hedged and candidates and len(attempts) == 1:
+                    provider = next(iter(attempts.values()))[0]
+                    delay = routing_policy.hedge_delay(provider, kind)
+                    if delay is not None:
+                        timeout = max(0.0, started + delay - time.monotonic())
+
+                done, _ = await asyncio.wait(
+                    attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = False
+                    if start_next():
+                        logger.info(
+                            f"Job {job_id} hedged on {list(attempts.values())[-1][0]} after {timeout:.1f}s"
+                        )
+                    continue
+
+                for attempt in done:
+                    provider, _ = attempts.pop(attempt)
+                    try:
+                        return provider, attempt.result()
+                    except Exception as e:
+                        error = e
+                        logger.warning(f"Job {job_id} failed on {provider}: {str(e)}")
+
+                if not attempts and start_next():
+                    logger.info(
+                        f"Job {job_id} failing over to {list(attempts.values())[0][0]}"
+                    )
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+            # An attempt cancelled before its first step never releases its own ticket
+            for _, attempt_ticket in attempts.values():
+                attempt_ticket.release()
+            if ticket is not None:
+                ticket.release()
+
+    async def _attempt(self, job: Job, provider: str, ticket: Ticket) -> list[str]:
+        job_id = job.info.job_id
+        kind = job.info.kind
+        started = time.monotonic()
+        try:
+            waited = await ticket.wait()
+            PROVIDER_QUEUE_WAIT_SECONDS.labels(provider).observe(waited)
+            if waited > 0:
+                logger.info(f"Job {job_id} waited {waited:.1f}s for a {provider} slot")
+
+            request = job.request.model_copy(
+                update={
+                    "model_type": provider,
+                    "api_key": get_provider_api_key(job.request, provider),
+                }
+            )
+            # Provider calls are short blocking requests; only they borrow a thread
+            submitted = time.monotonic()
+            task = await asyncio.to_thread(ModelRouter.submit, kind, request)
+            PROVIDER_SUBMIT_SECONDS.labels(provider, kind).observe(
+                time.monotonic() - submitted
+            )
+            # The latest task of a job is the one resumed after a restart
+            await job.update(
+                status=JOB_STATUS_RUNNING,
+                provider=provider,
+                provider_task_id=ModelRouter.get_task_id(task),
+            )
+            logger.info(f"Job {job_id} submitted to {provider}")
+
+            urls = task.result
+            if urls is None:
+                submitted = time.monotonic()
+                urls = await task_poller.track(task)
+                PROVIDER_WAIT_SECONDS.labels(provider, kind).observe(
+                    time.monotonic() - submitted
+                )
+        except asyncio.CancelledError:
+            routing_policy.record_abandoned(provider, kind, time.monotonic() - started)
+            raise
+        except Exception:
+            routing_policy.record_failure(provider, kind, time.monotonic() - started)
+            raise
+        finally:
+            ticket.release()
+
+        routing_policy.record_success(provider, kind, time.monotonic() - started)
+        return urls
+
+    async def _follow(self, job: Job, leader: Job) -> None:
+        info = leader.info
+        while info.status not in JOB_FINISHED_STATUSES:
+            info = await leader.wait_for_change(info)
+
+        await job.update(
+            status=info.status,
+            url=info.url,
+            urls=info.urls,
+            asset_urls=info.asset_urls,
+            provider=info.provider,
+            error_info=info.error_info,
+            cached=info.status == JOB_STATUS_SUCCEEDED,
+        )
+
+    def in_flight(self) -> dict[str, int]:
+        """Number of unfinished jobs by kind"""
+        counts = {kind: 0 for kind in TASK_ID_PREFIXES}
+        for job in self._jobs.values():
+            if not job.finished:
+                counts[job.info.kind] += 1
+        return counts
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel an unfinished job, returning False if there is nothing to cancel"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished or job.runner is None:
+            return False
+        job.runner.cancel()
+        return True
+
+    def _on_runner_done(self, job: Job) -> None:
+        # A runner cancelled before its first step never reaches its own cleanup
+        if job.ticket is not None:
+            job.ticket.release()
+        if self._by_cache_key.get(job.cache_key) is job:
+            del self._by_cache_key[job.cache_key]
+        job.request = None
+        if not job.finished and not self._closing:
+            asyncio.create_task(
+                job.update(status=JOB_STATUS_FAILED, error_info="Job cancelled")
+            )
+
+    def _prune(self) -> None:
+        expiry = time.time() - get_job_retention()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and job.info.updated_at < expiry
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def interrupt_unfinished(self) -> None:
+        """Mark the jobs that were unfinished when the server last stopped as interrupted.
+
+        API keys are never stored, so such a job only runs again once its client
+        resumes it with resume_job.
+        """
+        unfinished = await asyncio.to_thread(job_store.list_unfinished)
+        now = time.time()
+        for record in unfinished:
+            info = JobInfo(**record.model_dump(exclude={"params"}))
+            job_store.update(
+                info.model_copy(
+                    update={
+                        "status": JOB_STATUS_INTERRUPTED,
+                        "error_info": INTERRUPTED_ERROR,
+                        "updated_at": now,
+                    }
+                )
+            )
+
+        if unfinished:
+            logger.info(
+                f"Marked {len(unfinished)} jobs unfinished at the last shutdown as interrupted"
+            )
+
+    def resume_job(
+        self, job_id: str, api_key: str, fallback_api_key: Optional[str] = None
+    ) -> JobInfo:
+        """Resume a job interrupted by a restart with the API keys of its client.
+
+        A job whose provider task had started is polled again; one that was still
+        queued is submitted anew. Raises a 404 HTTPException for an unknown job, a
+        409 one for a job that cannot be resumed and a 400 one for a missing key.
+        """
+        record = job_store.get(job_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+        if record.status != JOB_STATUS_INTERRUPTED:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Job {job_id} was not interrupted by a server restart",
+            )
+
+        if record.provider_task_id and record.provider:
+            status = JOB_STATUS_RUNNING
+        elif record.started_at is None:
+            status = JOB_STATUS_QUEUED
+        else:
+            # Submitted but without a task to poll: running it again could pay twice
+            raise HTTPException(
+                status_code=409,
+                detail=f"Job {job_id} has no provider task to resume and may already have been billed",
+            )
+
+        info = JobInfo(**record.model_dump(exclude={"params"})).model_copy(
+            update={
+                "status": status,
+                "error_info": None,
+                "updated_at": time.time(),
+            }
+        )
+        secrets = {"api_key": api_key, "fallback_api_key": fallback_api_key}
+        try:
+            job = self._resume(info, record.params, secrets)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=400, detail=f"Cannot resume job {job_id}: {e}"
+            )
+        job_store.update(info)
+        self._jobs[job_id] = job
+        job.runner.add_done_callback(lambda _: self._on_runner_done(job))
+        return info
+
+    def _resume(self, info: JobInfo, params: dict, secrets: dict) -> Job:
+        if info.provider_task_id and info.provider:
+            api_key = (
+                secrets["api_key"]
+                if info.provider == info.model_type
+                else secrets["fallback_api_key"]
+            )
+            if not api_key:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"The fallback API key is required to resume a job on {info.provider}.",
+                )
+            task = ModelRouter.resume(
+                info.provider, info.kind, api_key, info.provider_task_id
+            )
+            # The provider is already running the task, so it takes no queue slot
+            job = Job(info.kind, None, None, None, [info.provider], info=info)
+            job.runner = asyncio.create_task(self._run(job, resumed=task))
+            logger.info(f"Job {info.job_id} resumed polling {info.provider} task")
+            return job
+
+        request = REQUEST_TYPES[info.kind](**params, **secrets)
+        providers = routing_policy.plan(info.kind, request)
+        ticket = provider_queue.reserve(
+            providers[0],
+            get_provider_api_key(request, providers[0]),
+            request.priority,
+        )
+        job = Job(info.kind, request, ticket, None, providers, info=info)
+        job.runner = asyncio.create_task(self._run(job))
+        logger.info(f"Job {info.job_id} resubmitted after restart")
+        return job
+
+    async def shutdown(self) -> None:
+        self._closing = True
+        runners = [job.runner for job in self._jobs.values() if not job.finished]
+        for runner in runners:
+            runner.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+        if runners:
+            logger.info(f"Cancelled {len(runners)} unfinished jobs")
+        await task_poller.shutdown()
+
+
+job_manager = JobManager()
@@ -0,0 +1,90 @@
+import time
+import logging
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import Histogram
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Provider calls range from a synchronous image to a video rendering for minutes
+PROVIDER_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+FRAME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+STAGE_DECODE = "decode"
+STAGE_ENCODE = "encode"
+STAGE_LOAD = "load"
+STAGE_REMOVEBG = "removebg"
+STAGE_ZIP = "zip"
+
+PROVIDER_SUBMIT_SECONDS = Histogram(
+    "pixelda_provider_submit_seconds",
+    "Time to submit a task to a provider, including synchronous generations",
+    ["provider", "operation"],
+    buckets=PROVIDER_BUCKETS,
+)
+PROVIDER_WAIT_SECONDS = Histogram(
+    "pixelda_provider_wait_seconds",
+    "Time from submitting a task until the provider reports its result",
+    ["provider", "operation"],
+    buckets=PROVIDER_BUCKETS,
+)
+PROVIDER_DOWNLOAD_SECONDS = Histogram(
+    "pixelda_provider_download_seconds",
+    "Time to download a provider result into the asset store",
+    ["provider", "operation"],
+    buckets=PROVIDER_BUCKETS,
+)
+PROVIDER_QUEUE_WAIT_SECONDS = Histogram(
+    "pixelda_provider_queue_wait_seconds",
+    "Time a job waited in the provider queue for a slot",
+    ["provider"],
+    buckets=PROVIDER_BUCKETS,
+)
+FRAME_STAGE_SECONDS = Histogram(
+    "pixelda_frame_stage_seconds",
+    "Time per frame spent decoding, encoding, loading or zipping, and per batch "
+    "spent removing backgrounds",
+    ["stage"],
+    buckets=FRAME_BUCKETS,
+)
+
+FRAME_DECODE_SECONDS = FRAME_STAGE_SECONDS.labels(STAGE_DECODE)
+FRAME_ENCODE_SECONDS = FRAME_STAGE_SECONDS.labels(STAGE_ENCODE)
+FRAME_LOAD_SECONDS = FRAME_STAGE_SECONDS.labels(STAGE_LOAD)
+FRAME_REMOVEBG_SECONDS = FRAME_STAGE_SECONDS.labels(STAGE_REMOVEBG)
+FRAME_ZIP_SECONDS = FRAME_STAGE_SECONDS.labels(STAGE_ZIP)
+
+# Provider and operation of the model call running in this context
+_provider_operation: ContextVar[Optional[tuple[str, str]]] = ContextVar(
+    "provider_operation", default=None
+)
+
+
+@contextmanager
+def provider_operation(provider: str, operation: str) -> Iterator[None]:
+    """Attribute result downloads started in the block to a provider call"""
+    token = _provider_operation.set((provider, operation))
+    try:
+        yield
+    finally:
+        _provider_operation.reset(token)
+
+
+def observe_download(future: Future) -> None:
+    """Time a download from now until its future resolves, if a provider call
+    started it"""
+    labels = _provider_operation.get()
+    if labels is None or future.done():
+        return
+
+    started = time.monotonic()
+    histogram = PROVIDER_DOWNLOAD_SECONDS.labels(*labels)
+
+    def on_done(f: Future) -> None:
+        if f.exception() is None:
+            histogram.observe(time.monotonic() - started)
+
+    future.add_done_callback(on_done)
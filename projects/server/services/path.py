@@ -1,20 +1,31 @@
 import os
-from datetime import datetime
 import base64
+import hashlib
 import mimetypes
 
+HASH_CHUNK_SIZE = 1024 * 1024
+
 
 def get_project_root() -> str:
     return os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
 
 
 def get_cache_folder() -> str:
-    output_folder = os.path.join(get_project_root(), "cache")
+    output_folder = os.getenv("CACHE_FOLDER") or os.path.join(
+        get_project_root(), "cache"
+    )
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     return output_folder
 
 
+def get_data_folder() -> str:
+    data_folder = os.path.join(get_project_root(), "data")
+    if not os.path.exists(data_folder):
+        os.makedirs(data_folder)
+    return data_folder
+
+
 def get_log_folder() -> str:
     log_folder = os.path.join(get_project_root(), "logs")
     if not os.path.exists(log_folder):
@@ -22,9 +33,12 @@ def get_log_folder() -> str:
     return log_folder
 
 
-def get_cache_file_path(file_name: str) -> str:
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return os.path.join(get_cache_folder(), f"{timestamp}_{file_name}")
+def hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
 def encode_file(file_path: str) -> str:
@@ -0,0 +1,266 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import itertools
+from collections import Counter, deque
+from fastapi import HTTPException
+from typing import Optional
+
+from defs import PRIORITIES, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_KEY_MAX_CONCURRENCY = 4
+DEFAULT_RATE_LIMIT = 2.0
+DEFAULT_KEY_RATE_LIMIT = 1.0
+DEFAULT_BURST = 4
+DEFAULT_QUEUE_SIZE = 100
+WAIT_TIME_SAMPLES = 100
+
+
+def get_limit_settings(provider: str) -> dict:
+    """Get the limits of one provider from environment, e.g. TONGYI_MAX_CONCURRENCY"""
+    prefix = provider.upper()
+    burst = int(os.getenv(f"{prefix}_BURST", str(DEFAULT_BURST)))
+    rate = float(os.getenv(f"{prefix}_RATE_LIMIT", str(DEFAULT_RATE_LIMIT)))
+    key_rate = float(os.getenv(f"{prefix}_KEY_RATE_LIMIT", str(DEFAULT_KEY_RATE_LIMIT)))
+    # A bucket that never refills would hold every request forever
+    for name, value in (("RATE_LIMIT", rate), ("KEY_RATE_LIMIT", key_rate)):
+        if value <= 0:
+            raise ValueError(f"{prefix}_{name} must be positive, got {value}")
+    return {
+        "max_concurrency": int(
+            os.getenv(f"{prefix}_MAX_CONCURRENCY", str(DEFAULT_MAX_CONCURRENCY))
+        ),
+        "key_max_concurrency": int(
+            os.getenv(f"{prefix}_KEY_MAX_CONCURRENCY", str(DEFAULT_KEY_MAX_CONCURRENCY))
+        ),
+        "rate": rate,
+        "key_rate": key_rate,
+        "burst": burst,
+        "key_burst": max(1, burst // 2),
+        "queue_size": int(os.getenv("PROVIDER_QUEUE_SIZE", str(DEFAULT_QUEUE_SIZE))),
+    }
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is available now"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class Ticket:
+    """A place in a provider queue, holding a concurrency slot once granted"""
+
+    def __init__(
+        self,
+        queue: "ProviderQueue",
+        state: "_ProviderState",
+        api_key: str,
+        priority: str,
+    ):
+        self._queue = queue
+        self._state = state
+        self.api_key = api_key
+        self.priority = priority
+        self.order = (PRIORITIES.index(priority), next(state.sequence))
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.released = False
+        self._future = asyncio.get_running_loop().create_future()
+
+    async def wait(self) -> float:
+        """Wait for a slot, returning the seconds spent in the queue"""
+        await asyncio.shield(self._future)
+        return self._future.result()
+
+    def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        self._queue._release(self)
+
+
+class _ProviderState:
+    def __init__(self, provider: str, settings: dict):
+        self.provider = provider
+        self.settings = settings
+        self.bucket = TokenBucket(settings["rate"], settings["burst"])
+        self.key_buckets: dict[str, TokenBucket] = {}
+        self.waiting: list[Ticket] = []
+        self.active = 0
+        self.active_by_key: Counter = Counter()
+        self.sequence = itertools.count()
+        self.wait_times: deque = deque(maxlen=WAIT_TIME_SAMPLES)
+        self.granted = 0
+        self.rejected = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def key_bucket(self, api_key: str) -> TokenBucket:
+        bucket = self.key_buckets.get(api_key)
+        if bucket is None:
+            bucket = TokenBucket(self.settings["key_rate"], self.settings["key_burst"])
+            self.key_buckets[api_key] = bucket
+        return bucket
+
+    def average_wait(self) -> float:
+        return sum(self.wait_times) / len(self.wait_times) if self.wait_times else 0.0
+
+
+class ProviderQueue:
+    """Admit provider tasks under per-provider and per-API-key rate and concurrency
+    limits, interactive requests first, refusing new ones once the queue is full"""
+
+    def __init__(self):
+        self._providers: dict[str, _ProviderState] = {}
+
+    def _state(self, provider: str) -> _ProviderState:
+        state = self._providers.get(provider)
+        if state is None:
+            state = _ProviderState(provider, get_limit_settings(provider))
+            self._providers[provider] = state
+        return state
+
+    def reserve(self, provider: str, api_key: str, priority: str) -> Ticket:
+        """Join the queue of a provider; raises a 429 HTTPException when it is full"""
+        if priority not in PRIORITIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported priority: {priority}. Supported: {', '.join(PRIORITIES)}",
+            )
+
+        state = self._state(provider)
+        if len(state.waiting) >= state.settings["queue_size"]:
+            state.rejected += 1
+            retry_after = self._estimate_retry_after(state)
+            logger.warning(
+                f"{provider} queue full with {len(state.waiting)} waiting, retry after {retry_after}s"
+            )
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many queued {provider} requests, try again later",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+        ticket = Ticket(self, state, api_key, priority)
+        state.waiting.append(ticket)
+        self._dispatch(state)
+        return ticket
+
+    def _estimate_retry_after(self, state: _ProviderState) -> int:
+        drain_time = len(state.waiting) / state.settings["rate"]
+        return max(1, math.ceil(min(drain_time, state.average_wait() or drain_time)))
+
+    def _dispatch(self, state: _ProviderState) -> None:
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+
+        now = time.monotonic()
+        retry_in = None
+        admitted = []
+        for ticket in sorted(state.waiting, key=lambda t: t.order):
+            if state.active >= state.settings["max_concurrency"]:
+                break
+            # A key at its own cap must not hold back requests of other keys
+            if (
+                state.active_by_key[ticket.api_key]
+                >= state.settings["key_max_concurrency"]
+            ):
+                continue
+
+            provider_wait = state.bucket.wait_time(now)
+            if provider_wait > 0:
+                retry_in = min(retry_in or provider_wait, provider_wait)
+                break
+            key_wait = state.key_bucket(ticket.api_key).wait_time(now)
+            if key_wait > 0:
+                retry_in = min(retry_in or key_wait, key_wait)
+                continue
+
+            state.bucket.take()
+            state.key_bucket(ticket.api_key).take()
+            state.active += 1
+            state.active_by_key[ticket.api_key] += 1
+            state.granted += 1
+            ticket.granted = True
+            waited = now - ticket.enqueued_at
+            state.wait_times.append(waited)
+            ticket._future.set_result(waited)
+            admitted.append(ticket)
+
+        if admitted:
+            state.waiting = [t for t in state.waiting if not t.granted]
+        if retry_in is not None and state.waiting:
+            state.timer = asyncio.get_running_loop().call_later(
+                retry_in, self._dispatch, state
+            )
+
+    def _release(self, ticket: Ticket) -> None:
+        state = ticket._state
+        if ticket.granted:
+            state.active -= 1
+            state.active_by_key[ticket.api_key] -= 1
+            if not state.active_by_key[ticket.api_key]:
+                del state.active_by_key[ticket.api_key]
+        else:
+            state.waiting.remove(ticket)
+            ticket._future.cancel()
+
+        now = time.monotonic()
+        for api_key in [
+            k
+            for k, bucket in state.key_buckets.items()
+            if k not in state.active_by_key and bucket.is_full(now)
+        ]:
+            del state.key_buckets[api_key]
+
+        self._dispatch(state)
+
+    def stats(self) -> dict:
+        stats = {}
+        for provider, state in self._providers.items():
+            waiting = Counter(t.priority for t in state.waiting)
+            oldest = min((t.enqueued_at for t in state.waiting), default=None)
+            stats[provider] = {
+                "active": state.active,
+                "max_concurrency": state.settings["max_concurrency"],
+                "waiting": {
+                    p: waiting.get(p, 0) for p in (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+                },
+                "queue_size": state.settings["queue_size"],
+                "active_keys": len(state.active_by_key),
+                "granted": state.granted,
+                "rejected": state.rejected,
+                "average_wait": state.average_wait(),
+                "max_wait": max(state.wait_times, default=0.0),
+                "oldest_waiting": time.monotonic() - oldest if oldest else 0.0,
+            }
+        return stats
+
+
+provider_queue = ProviderQueue()
@@ -0,0 +1,154 @@
+import os
+import math
+import logging
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+from rembg import remove
+
+from services.image_tools import get_rembg_session, get_rembg_settings
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_WORKERS = 4
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_removebg_workers() -> int:
+    cpu_count = os.cpu_count() or 1
+    default_workers = min(DEFAULT_MAX_WORKERS, cpu_count)
+    return max(1, int(os.getenv("REMBG_WORKERS", str(default_workers))))
+
+
+def get_removebg_batch_size() -> int:
+    return int(os.getenv("REMBG_BATCH_SIZE", str(get_removebg_workers() * 2)))
+
+
+def _init_worker(threads: int, settings: dict) -> None:
+    # rembg sizes its onnxruntime thread pools from OMP_NUM_THREADS
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    get_rembg_session(settings["model"])
+
+
+def _attach_shared_memory(name: str) -> SharedMemory:
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the segment again, which is harmless
+        # here since spawned workers share the resource tracker of the server process
+        return SharedMemory(name=name)
+
+
+def _remove_background_slice(
+    input_name: str,
+    output_name: str,
+    shape: tuple,
+    start: int,
+    stop: int,
+    settings: dict,
+) -> None:
+    input_memory = _attach_shared_memory(input_name)
+    output_memory = _attach_shared_memory(output_name)
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=input_memory.buf)
+        output = np.ndarray(shape[:-1] + (4,), dtype=np.uint8, buffer=output_memory.buf)
+
+        options = dict(settings)
+        session = get_rembg_session(options.pop("model"))
+        for i in range(start, stop):
+            output[i] = np.asarray(remove(frames[i], session=session, **options))
+
+        del frames, output
+    finally:
+        input_memory.close()
+        output_memory.close()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = get_removebg_workers()
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            logger.info(
+                f"Starting background removal pool: {workers} workers x {threads} threads"
+            )
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(threads, get_rembg_settings()),
+            )
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def remove_background_batch(frames: np.ndarray) -> np.ndarray:
+    """Remove the background of an (N, H, W, 3) batch in the worker pool, returning (N, H, W, 4)"""
+    count = frames.shape[0]
+    output_shape = frames.shape[:-1] + (4,)
+
+    input_memory = SharedMemory(create=True, size=frames.nbytes)
+    output_memory = SharedMemory(create=True, size=int(np.prod(output_shape)))
+    try:
+        np.ndarray(frames.shape, dtype=np.uint8, buffer=input_memory.buf)[:] = frames
+
+        executor = _get_executor()
+        settings = get_rembg_settings()
+        slice_size = math.ceil(count / get_removebg_workers())
+        futures = [
+            executor.submit(
+                _remove_background_slice,
+                input_memory.name,
+                output_memory.name,
+                frames.shape,
+                start,
+                min(start + slice_size, count),
+                settings,
+            )
+            for start in range(0, count, slice_size)
+        ]
+
+        wait(futures)
+        for future in futures:
+            future.result()
+
+        output = np.ndarray(output_shape, dtype=np.uint8, buffer=output_memory.buf)
+        result = output.copy()
+        del output
+        logger.debug(f"Background removed for {count} frames")
+        return result
+    except BrokenProcessPool:
+        logger.error("Background removal pool crashed, restarting on next use")
+        _reset_executor()
+        raise
+    finally:
+        input_memory.close()
+        input_memory.unlink()
+        output_memory.close()
+        output_memory.unlink()
+
+
+def warm_up_removebg_workers() -> None:
+    """Start the worker pool and load the model in every worker"""
+    workers = get_removebg_workers()
+    remove_background_batch(np.zeros((workers, 64, 64, 3), dtype=np.uint8))
+    logger.info(f"Background removal pool warmed up with {workers} workers")
+
+
+def shutdown_removebg_workers() -> None:
+    _reset_executor()
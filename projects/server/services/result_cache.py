@@ -0,0 +1,177 @@
+import os
+import glob
+import json
+import time
+import fnmatch
+import hashlib
+import logging
+from typing import Optional
+
+from services.path import get_cache_folder
+from services.cache_manager import GIB, CacheArea, cache_manager, get_area_budget
+from services.asset_cache import get_asset_name, get_asset_path, is_downloading
+from defs import (
+    DEFAULT_DOUBAO_IMAGE_MODEL,
+    DEFAULT_TONGYI_EDIT_FUNCTION,
+    DEFAULT_TONGYI_EDIT_IMAGE_MODEL,
+    DEFAULT_TONGYI_IMAGE_MODEL,
+    JOB_KIND_EDIT,
+    JOB_KIND_IMAGE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+RESULT_FILE_TEMPLATE = "result_{}.json"
+# Provider result links expire after about a day, so entries must not outlive them
+DEFAULT_RESULT_TTL = 20 * 3600
+DEFAULT_MAX_RESULTS = 1000
+DOWNLOADS_AREA = "downloads"
+DEFAULT_DOWNLOADS_MAX_BYTES = 1 * GIB
+
+# Models behind each (model type, job kind); a request is only cacheable if listed
+CACHEABLE_MODELS = {
+    ("tongyi", JOB_KIND_IMAGE): DEFAULT_TONGYI_IMAGE_MODEL,
+    (
+        "tongyi",
+        JOB_KIND_EDIT,
+    ): f"{DEFAULT_TONGYI_EDIT_IMAGE_MODEL}/{DEFAULT_TONGYI_EDIT_FUNCTION}",
+    ("doubao", JOB_KIND_IMAGE): DEFAULT_DOUBAO_IMAGE_MODEL,
+    ("doubao", JOB_KIND_EDIT): DEFAULT_DOUBAO_IMAGE_MODEL,
+}
+
+
+def get_result_cache_settings() -> dict:
+    return {
+        "ttl": float(os.getenv("RESULT_CACHE_TTL", str(DEFAULT_RESULT_TTL))),
+        "max_entries": int(
+            os.getenv("RESULT_CACHE_MAX_ENTRIES", str(DEFAULT_MAX_RESULTS))
+        ),
+    }
+
+
+def get_result_cache_key(kind: str, request) -> Optional[str]:
+    """Key of an opted-in, seeded single-image request, or None if it must not be cached"""
+    if (
+        not getattr(request, "use_cache", False)
+        or not request.seed
+        or request.seed <= 0
+        or request.n != 1
+    ):
+        return None
+
+    model_type = request.model_type.lower()
+    model = CACHEABLE_MODELS.get((model_type, kind))
+    if model is None:
+        return None
+
+    normalized = {
+        "kind": kind,
+        "model_type": model_type,
+        "model": model,
+        "prompt": request.prompt.strip(),
+        "negative_prompt": (request.negative_prompt or "").strip(),
+        "size": request.size,
+        "seed": request.seed,
+        "image_url": getattr(request, "image_url", None),
+    }
+    return hashlib.sha256(
+        json.dumps(normalized, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def _is_loose_download(item: os.DirEntry) -> bool:
+    # Results are evicted below; other loose files were downloaded by older versions
+    return item.is_file() and not fnmatch.fnmatch(
+        item.name, RESULT_FILE_TEMPLATE.format("*")
+    )
+
+
+cache_manager.register(
+    CacheArea(
+        DOWNLOADS_AREA,
+        get_cache_folder(),
+        get_area_budget(DOWNLOADS_AREA, DEFAULT_DOWNLOADS_MAX_BYTES),
+        include=_is_loose_download,
+    )
+)
+
+
+def get_result_path(cache_key: str) -> str:
+    return os.path.join(get_cache_folder(), RESULT_FILE_TEMPLATE.format(cache_key))
+
+
+def load_cached_result(cache_key: str) -> Optional[str]:
+    """Get the cached result URL, or None if missing, expired or its asset is gone"""
+    result_path = get_result_path(cache_key)
+    try:
+        with open(result_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Discarding unreadable cached result {result_path}: {e}")
+        _remove(result_path)
+        return None
+
+    expired = time.time() - entry["created_at"] > get_result_cache_settings()["ttl"]
+    asset_name = get_asset_name(entry["url"])
+    # A result whose local copy is gone for good cannot be served from the cache
+    missing = get_asset_path(asset_name) is None and not is_downloading(asset_name)
+    if expired or missing:
+        logger.info(f"Cached result is stale: {result_path}")
+        _remove(result_path)
+        return None
+
+    # Access time drives least-recently-used eviction
+    os.utime(result_path)
+    return entry["url"]
+
+
+def save_cached_result(cache_key: str, url: str) -> None:
+    result_path = get_result_path(cache_key)
+    entry = {"url": url, "created_at": time.time()}
+
+    temp_path = f"{result_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(temp_path, result_path)
+    logger.debug(f"Result cached: {result_path}")
+
+    evict_cached_results()
+
+
+def evict_cached_results() -> int:
+    """Drop expired entries, then the least recently used beyond the size limit"""
+    settings = get_result_cache_settings()
+    pattern = os.path.join(
+        glob.escape(get_cache_folder()), RESULT_FILE_TEMPLATE.format("*")
+    )
+
+    entries = []
+    for result_path in glob.glob(pattern):
+        try:
+            entries.append((os.path.getmtime(result_path), result_path))
+        except FileNotFoundError:
+            continue
+    entries.sort(reverse=True)
+
+    # An entry untouched for the whole TTL has certainly expired
+    expiry = time.time() - settings["ttl"]
+    evicted = [path for mtime, path in entries[settings["max_entries"] :]]
+    evicted += [
+        path for mtime, path in entries[: settings["max_entries"]] if mtime < expiry
+    ]
+    for result_path in evicted:
+        _remove(result_path)
+
+    if evicted:
+        logger.info(f"Evicted {len(evicted)} cached results")
+    return len(evicted)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
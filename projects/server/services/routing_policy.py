@@ -0,0 +1,270 @@
+import os
+import time
+import math
+import logging
+from collections import deque
+from fastapi import HTTPException
+from typing import Optional
+
+from services.gen_models.model_wrapper import SUPPORTED_MODEL_TYPES, ModelRouter
+from defs import ROUTING_FIXED, ROUTING_POLICIES
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_WINDOW = 100
+DEFAULT_WINDOW_SECONDS = 900
+DEFAULT_MIN_SAMPLES = 10
+DEFAULT_HEDGE_PERCENTILE = 90.0
+DEFAULT_BREAKER_ERROR_RATE = 0.5
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+def get_routing_settings() -> dict:
+    """Get the statistics window, hedging and circuit breaker settings from environment"""
+    return {
+        "window": int(os.getenv("ROUTING_WINDOW", str(DEFAULT_WINDOW))),
+        "window_seconds": float(
+            os.getenv("ROUTING_WINDOW_SECONDS", str(DEFAULT_WINDOW_SECONDS))
+        ),
+        "min_samples": int(os.getenv("ROUTING_MIN_SAMPLES", str(DEFAULT_MIN_SAMPLES))),
+        "hedge_percentile": float(
+            os.getenv("ROUTING_HEDGE_PERCENTILE", str(DEFAULT_HEDGE_PERCENTILE))
+        ),
+        "breaker_error_rate": float(
+            os.getenv("ROUTING_BREAKER_ERROR_RATE", str(DEFAULT_BREAKER_ERROR_RATE))
+        ),
+        "breaker_failures": int(
+            os.getenv("ROUTING_BREAKER_FAILURES", str(DEFAULT_BREAKER_FAILURES))
+        ),
+        "breaker_cooldown": float(
+            os.getenv("ROUTING_BREAKER_COOLDOWN", str(DEFAULT_BREAKER_COOLDOWN))
+        ),
+    }
+
+
+class RollingStats:
+    """Latency and outcome of the most recent tasks of one provider and operation"""
+
+    def __init__(self, window: int, window_seconds: float):
+        self.window_seconds = window_seconds
+        # (finished at, seconds, succeeded); succeeded is None for an attempt that
+        # was abandoned, whose latency is only known to be at least that long
+        self.samples: deque = deque(maxlen=window)
+
+    def add(self, latency: float, succeeded: Optional[bool]) -> None:
+        self.samples.append((time.monotonic(), latency, succeeded))
+
+    def _recent(self) -> list[tuple]:
+        expiry = time.monotonic() - self.window_seconds
+        while self.samples and self.samples[0][0] < expiry:
+            self.samples.popleft()
+        return list(self.samples)
+
+    def latency_percentile(
+        self, percentile: float, min_samples: int
+    ) -> Optional[float]:
+        latencies = sorted(s[1] for s in self._recent() if s[2] is not False)
+        if len(latencies) < min_samples:
+            return None
+        rank = max(0, math.ceil(percentile / 100 * len(latencies)) - 1)
+        return latencies[rank]
+
+    def summary(self) -> dict:
+        recent = self._recent()
+        outcomes = [s[2] for s in recent if s[2] is not None]
+        latencies = sorted(s[1] for s in recent if s[2] is not False)
+        return {
+            "samples": len(recent),
+            "error_rate": outcomes.count(False) / len(outcomes) if outcomes else 0.0,
+            "p50": latencies[len(latencies) // 2] if latencies else None,
+            "p90": (
+                latencies[math.ceil(0.9 * len(latencies)) - 1] if latencies else None
+            ),
+        }
+
+
+class CircuitBreaker:
+    """Stop routing optional traffic to a provider after repeated failures, letting one
+    probe through per cooldown until it succeeds again"""
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self.state = BREAKER_CLOSED
+        self.outcomes: deque = deque(maxlen=settings["window"])
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_at: Optional[float] = None
+        self.trips = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == BREAKER_CLOSED:
+            return True
+        if self.state == BREAKER_OPEN:
+            if now - self.opened_at < self.settings["breaker_cooldown"]:
+                return False
+            self.state = BREAKER_HALF_OPEN
+        # Half open: a single probe at a time, retried if its outcome never arrives
+        if (
+            self.probe_at is not None
+            and now - self.probe_at < self.settings["breaker_cooldown"]
+        ):
+            return False
+        self.probe_at = now
+        return True
+
+    def record(self, succeeded: bool) -> Optional[str]:
+        """Count an outcome, returning the new state if it changed"""
+        if succeeded:
+            self.consecutive_failures = 0
+            if self.state == BREAKER_CLOSED:
+                self.outcomes.append(True)
+                return None
+            self._close()
+            return self.state
+
+        self.consecutive_failures += 1
+        self.outcomes.append(False)
+        if self.state == BREAKER_HALF_OPEN:
+            self._open()
+            return self.state
+        if self.state == BREAKER_CLOSED and self._should_trip():
+            self._open()
+            return self.state
+        return None
+
+    def _should_trip(self) -> bool:
+        if self.consecutive_failures >= self.settings["breaker_failures"]:
+            return True
+        if len(self.outcomes) < self.settings["min_samples"]:
+            return False
+        error_rate = self.outcomes.count(False) / len(self.outcomes)
+        return error_rate >= self.settings["breaker_error_rate"]
+
+    def _open(self) -> None:
+        self.state = BREAKER_OPEN
+        self.opened_at = time.monotonic()
+        self.probe_at = None
+        self.trips += 1
+
+    def _close(self) -> None:
+        self.state = BREAKER_CLOSED
+        self.outcomes.clear()
+        self.probe_at = None
+
+
+class RoutingPolicy:
+    """Choose the providers a job may run on from rolling latency and error stats"""
+
+    def __init__(self):
+        self.settings = get_routing_settings()
+        self._stats: dict[tuple[str, str], RollingStats] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def _stats_for(self, provider: str, kind: str) -> RollingStats:
+        stats = self._stats.get((provider, kind))
+        if stats is None:
+            stats = RollingStats(
+                self.settings["window"], self.settings["window_seconds"]
+            )
+            self._stats[(provider, kind)] = stats
+        return stats
+
+    def _breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(self.settings)
+            self._breakers[provider] = breaker
+        return breaker
+
+    def plan(self, kind: str, request) -> list[str]:
+        """Providers to try for a request in order; the first is submitted right away.
+
+        Raises a 400 HTTPException for an unknown policy or a missing fallback key.
+        """
+        routing = request.routing
+        if routing not in ROUTING_POLICIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported routing: {routing}. Supported: {', '.join(ROUTING_POLICIES)}",
+            )
+
+        primary = request.model_type.lower()
+        if routing == ROUTING_FIXED:
+            return [primary]
+        if not request.fallback_api_key:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A fallback API key is required for {routing} routing.",
+            )
+
+        n = getattr(request, "n", 1)
+        alternates = [
+            provider
+            for provider in SUPPORTED_MODEL_TYPES
+            if provider != primary and n <= ModelRouter.max_images_per_task(provider)
+        ]
+        # With the primary tripped, start on an alternate that is still healthy
+        if not self.allow(primary):
+            for provider in alternates:
+                if self.allow(provider):
+                    logger.info(
+                        f"{primary} circuit is open, routing {kind} to {provider}"
+                    )
+                    alternates.remove(provider)
+                    return [provider, primary, *alternates]
+        return [primary, *alternates]
+
+    def allow(self, provider: str) -> bool:
+        return self._breaker(provider).allow()
+
+    def hedge_delay(self, provider: str, kind: str) -> Optional[float]:
+        """Seconds after which a still running task should be hedged, None until
+        enough tasks have finished to know what slow means"""
+        return self._stats_for(provider, kind).latency_percentile(
+            self.settings["hedge_percentile"], self.settings["min_samples"]
+        )
+
+    def record_success(self, provider: str, kind: str, latency: float) -> None:
+        self._stats_for(provider, kind).add(latency, True)
+        self._record_outcome(provider, True)
+
+    def record_failure(self, provider: str, kind: str, latency: float) -> None:
+        self._stats_for(provider, kind).add(latency, False)
+        self._record_outcome(provider, False)
+
+    def record_abandoned(self, provider: str, kind: str, latency: float) -> None:
+        # Dropping slow losers would make the provider look faster than it is
+        self._stats_for(provider, kind).add(latency, None)
+
+    def _record_outcome(self, provider: str, succeeded: bool) -> None:
+        state = self._breaker(provider).record(succeeded)
+        if state == BREAKER_OPEN:
+            logger.warning(f"{provider} circuit opened after repeated failures")
+        elif state == BREAKER_CLOSED:
+            logger.info(f"{provider} circuit closed, provider recovered")
+
+    def stats(self) -> dict:
+        stats = {}
+        for provider in SUPPORTED_MODEL_TYPES:
+            breaker = self._breaker(provider)
+            stats[provider] = {
+                "circuit": breaker.state,
+                "trips": breaker.trips,
+                "consecutive_failures": breaker.consecutive_failures,
+                "operations": {
+                    kind: rolling.summary()
+                    for (p, kind), rolling in self._stats.items()
+                    if p == provider
+                },
+            }
+        return stats
+
+
+routing_policy = RoutingPolicy()
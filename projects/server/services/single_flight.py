@@ -0,0 +1,61 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls sharing a key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future] = {}
+
+    def claim(self, key: str) -> tuple[Future, bool]:
+        """Return the shared future for key and whether the caller must resolve it"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                logger.info(f"Waiting for in-flight call: {key}")
+                return future, False
+
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def pending(self, key: str) -> Optional[Future]:
+        """The future of an in-flight call for key, or None if there is none"""
+        with self._lock:
+            return self._calls.get(key)
+
+    def resolve(
+        self, key: str, result: Any = None, error: Optional[BaseException] = None
+    ) -> None:
+        with self._lock:
+            future = self._calls.pop(key)
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def release(self, key: str) -> None:
+        """Drop the in-flight call for key without a result; waiters get None and
+        should claim the key again"""
+        self.resolve(key, result=None)
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        future, is_leader = self.claim(key)
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.resolve(key, error=e)
+            raise
+
+        self.resolve(key, result=result)
+        return result
@@ -0,0 +1,157 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import contextvars
+from typing import Optional
+
+from services.gen_models.model_wrapper import ModelRouter, SubmittedTask
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_POLL_INTERVAL = 10.0
+DEFAULT_POLL_BACKOFF = 1.5
+DEFAULT_POLL_JITTER = 0.2
+# Tasks due within this window are checked in the same round so they can share requests
+POLL_BATCH_WINDOW = 0.5
+
+
+def get_poll_settings() -> dict:
+    """Get the adaptive poll schedule from environment or use defaults"""
+    interval = float(os.getenv("JOB_POLL_INTERVAL", str(DEFAULT_POLL_INTERVAL)))
+    max_interval = float(
+        os.getenv("JOB_MAX_POLL_INTERVAL", str(DEFAULT_MAX_POLL_INTERVAL))
+    )
+    return {
+        "interval": interval,
+        "max_interval": max(interval, max_interval),
+        "backoff": float(os.getenv("JOB_POLL_BACKOFF", str(DEFAULT_POLL_BACKOFF))),
+        "jitter": float(os.getenv("JOB_POLL_JITTER", str(DEFAULT_POLL_JITTER))),
+    }
+
+
+class _PollEntry:
+    def __init__(self, task: SubmittedTask, future: asyncio.Future, interval: float):
+        self.task = task
+        self.future = future
+        self.interval = interval
+        # None while a status check for the task is in flight
+        self.due_at: Optional[float] = 0.0
+        self.polls = 0
+        # Context of the job that tracks the task, so its checks join the job's trace
+        self.context = contextvars.copy_context()
+
+
+class TaskPoller:
+    """Track every outstanding provider task and poll them all from one loop"""
+
+    def __init__(self):
+        self._entries: list[_PollEntry] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._polls: set[asyncio.Task] = set()
+        self._settings = get_poll_settings()
+
+    def track(self, task: SubmittedTask) -> asyncio.Future:
+        """Start polling a task; the future resolves to its result URLs or error"""
+        if self._runner is None or self._runner.done():
+            self._settings = get_poll_settings()
+            self._wakeup = asyncio.Event()
+            # Shared by every job, so it must not inherit the context of the first one
+            self._runner = asyncio.create_task(
+                self._run(), context=contextvars.Context()
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        entry = _PollEntry(task, future, self._settings["interval"])
+        self._schedule(entry)
+        self._entries.append(entry)
+        self._wakeup.set()
+        return future
+
+    def _schedule(self, entry: _PollEntry) -> None:
+        jitter = self._settings["jitter"]
+        delay = entry.interval * random.uniform(1 - jitter, 1 + jitter)
+        entry.due_at = time.monotonic() + delay
+        entry.interval = min(
+            entry.interval * self._settings["backoff"], self._settings["max_interval"]
+        )
+
+    async def _run(self) -> None:
+        while True:
+            # Jobs that were cancelled while waiting no longer need polling
+            self._entries = [e for e in self._entries if not e.future.done()]
+
+            idle = [e for e in self._entries if e.due_at is not None]
+            if not idle:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = min(e.due_at for e in idle) - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            horizon = time.monotonic() + POLL_BATCH_WINDOW
+            due = [e for e in idle if e.due_at <= horizon]
+            by_task = {id(e.task): e for e in due}
+            for group in ModelRouter.group_for_fetch([e.task for e in due]):
+                entries = [by_task[id(task)] for task in group]
+                for entry in entries:
+                    entry.due_at = None
+                # A check shared by several jobs belongs to none of their traces
+                context = (
+                    entries[0].context.copy()
+                    if len(entries) == 1
+                    else contextvars.Context()
+                )
+                poll = asyncio.create_task(self._poll(entries), context=context)
+                self._polls.add(poll)
+                poll.add_done_callback(self._polls.discard)
+
+    async def _poll(self, entries: list[_PollEntry]) -> None:
+        try:
+            results = await asyncio.to_thread(
+                ModelRouter.fetch_many, [e.task for e in entries]
+            )
+        except Exception as e:
+            results = [e] * len(entries)
+
+        for entry, result in zip(entries, results):
+            entry.polls += 1
+            if entry.future.done():
+                continue
+            if isinstance(result, Exception):
+                entry.future.set_exception(result)
+            elif result is not None:
+                logger.debug(f"Task finished after {entry.polls} status checks")
+                entry.future.set_result(result)
+            else:
+                self._schedule(entry)
+
+        self._wakeup.set()
+
+    async def shutdown(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        # A check already in its thread still finishes, but nothing is rescheduled
+        polls = list(self._polls)
+        for poll in polls:
+            poll.cancel()
+        await asyncio.gather(*polls, return_exceptions=True)
+        for entry in self._entries:
+            entry.future.cancel()
+        self._entries = []
+
+
+task_poller = TaskPoller()
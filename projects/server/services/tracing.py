@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import functools
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from services.env import get_env_flag, TRUE_VALUES
+from services.path import get_log_folder
+
+logger = logging.getLogger(__name__)
+
+
+# "1" traces a request, "profile" also samples the stacks of the threads serving it
+TRACE_HEADER = "X-Pixelda-Trace"
+TRACE_ID_HEADER = "X-Pixelda-Trace-Id"
+TRACE_MODE_PROFILE = "profile"
+
+DEFAULT_SAMPLE_RATE = 0.0
+DEFAULT_PROFILE_INTERVAL = 0.005
+DEFAULT_MAX_TRACES = 100
+DEFAULT_MAX_SPANS = 5000
+PROFILES_FOLDER = "profiles"
+MAX_STACK_DEPTH = 64
+
+
+def get_tracing_settings() -> dict:
+    return {
+        "sample_rate": float(os.getenv("TRACE_SAMPLE_RATE", str(DEFAULT_SAMPLE_RATE))),
+        # Whether requests picked by the sample rate are profiled as well
+        "profile_sampled": get_env_flag("TRACE_PROFILE_SAMPLED"),
+        "profile_interval": float(
+            os.getenv("TRACE_PROFILE_INTERVAL", str(DEFAULT_PROFILE_INTERVAL))
+        ),
+        "max_traces": int(os.getenv("TRACE_MAX_TRACES", str(DEFAULT_MAX_TRACES))),
+        "max_spans": int(os.getenv("TRACE_MAX_SPANS", str(DEFAULT_MAX_SPANS))),
+    }
+
+
+def get_profiles_folder() -> str:
+    profiles_folder = os.path.join(get_log_folder(), PROFILES_FOLDER)
+    os.makedirs(profiles_folder, exist_ok=True)
+    return profiles_folder
+
+
+class Span:
+    def __init__(
+        self,
+        span_id: int,
+        parent_id: Optional[int],
+        name: str,
+        start: float,
+        attributes: dict,
+        sampled: bool = True,
+    ):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.duration: Optional[float] = None
+        self.thread = threading.current_thread().name
+        self.thread_id = threading.get_ident()
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        # Whether its thread is sampled while it is open
+        self.sampled = sampled
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "thread": self.thread,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """Spans of one request, with offsets in seconds from its start.
+
+    Spans of background jobs the request started keep arriving after it returns,
+    up to max_spans; later ones are counted but not kept.
+    """
+
+    def __init__(self, name: str, profile: bool, max_spans: int = DEFAULT_MAX_SPANS):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.profile = profile
+        self.max_spans = max_spans
+        self.dropped_spans = 0
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.spans: list[Span] = []
+        # Folded stacks ("outer;inner") of the threads inside a span -> sample count
+        self.samples: Counter = Counter()
+        self._started = time.perf_counter()
+        self._active_threads: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def offset(self) -> float:
+        return time.perf_counter() - self._started
+
+    def open_span(
+        self,
+        name: str,
+        parent: Optional[Span],
+        attributes: dict,
+        sampled: bool = True,
+    ) -> Span:
+        with self._lock:
+            kept = len(self.spans) < self.max_spans
+            span = Span(
+                len(self.spans),
+                parent.span_id if parent else None,
+                name,
+                self.offset(),
+                attributes,
+                sampled=sampled and kept,
+            )
+            if not kept:
+                self.dropped_spans += 1
+                return span
+            self.spans.append(span)
+            if span.sampled:
+                self._active_threads[span.thread_id] += 1
+        return span
+
+    def close_span(self, span: Span) -> None:
+        span.duration = self.offset() - span.start
+        if not span.sampled:
+            return
+        with self._lock:
+            # Spans around a generator may be closed on another thread than opened
+            self._active_threads[span.thread_id] -= 1
+            if self._active_threads[span.thread_id] <= 0:
+                del self._active_threads[span.thread_id]
+
+    def active_threads(self) -> list[int]:
+        with self._lock:
+            return list(self._active_threads)
+
+    def summary(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "status_code": self.status_code,
+            "spans": len(self.spans),
+            "dropped_spans": self.dropped_spans,
+            "profile": self.profile,
+        }
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {**self.summary(), "span_list": spans}
+
+    def folded_stacks(self) -> str:
+        """Samples in the collapsed format flame graph tools read"""
+        with self._lock:
+            samples = self.samples.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in samples)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    """Record the block as a span of the current trace; does nothing when untraced"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    parent = _current_span.get()
+    record = trace.open_span(name, parent, attributes)
+    _current_span.set(record)
+    try:
+        yield
+    except Exception as e:
+        record.error = str(e)
+        raise
+    finally:
+        trace.close_span(record)
+        # Not a token reset: a span around a generator may close in another context
+        _current_span.set(parent)
+
+
+def traced(name: str) -> Callable:
+    """Record every call of a function as a span"""
+
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def trace_future(name: str, future: Future, **attributes) -> None:
+    """Record a span from now until work running elsewhere resolves the future"""
+    trace = _current_trace.get()
+    if trace is None or future.done():
+        return
+
+    # The work does not run on this thread, so there is nothing of it to sample
+    record = trace.open_span(name, _current_span.get(), attributes, sampled=False)
+
+    def on_done(f: Future) -> None:
+        record.duration = trace.offset() - record.start
+        if not f.cancelled() and f.exception() is not None:
+            record.error = str(f.exception())
+
+    future.add_done_callback(on_done)
+
+
+class StackSampler:
+    """Sample the stacks of threads inside a span of a profiled trace.
+
+    Unlike cProfile, which only sees the thread it was enabled on, this follows a
+    request onto the worker threads its frames are decoded and encoded on.
+    """
+
+    def __init__(self):
+        self._traces: set[Trace] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces.add(trace)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="trace-sampler", daemon=True
+                )
+                self._thread.start()
+
+    def remove(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces.discard(trace)
+
+    def _run(self) -> None:
+        interval = get_tracing_settings()["profile_interval"]
+        while True:
+            with self._lock:
+                if not self._traces:
+                    self._thread = None
+                    return
+                traces = list(self._traces)
+
+            frames = sys._current_frames()
+            for trace in traces:
+                for thread_id in trace.active_threads():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = _fold(frame)
+                        with trace._lock:
+                            trace.samples[stack] += 1
+            del frames
+            time.sleep(interval)
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Tracer:
+    """Decide which requests to trace and keep the most recent traces"""
+
+    def __init__(self):
+        self.settings = get_tracing_settings()
+        self._traces: deque[Trace] = deque(maxlen=self.settings["max_traces"])
+        self._sampler = StackSampler()
+
+    def choose(self, header: Optional[str]) -> Optional[bool]:
+        """Whether to profile a request, or None if it is not traced at all"""
+        if header:
+            mode = header.strip().lower()
+            if mode == TRACE_MODE_PROFILE:
+                return True
+            if mode in TRUE_VALUES:
+                return False
+        if random.random() < self.settings["sample_rate"]:
+            return self.settings["profile_sampled"]
+        return None
+
+    def start(self, name: str, profile: bool) -> Trace:
+        trace = Trace(name, profile, self.settings["max_spans"])
+        self._traces.append(trace)
+        if profile:
+            self._sampler.add(trace)
+        return trace
+
+    def finish(self, trace: Trace) -> None:
+        trace.duration = trace.offset()
+        if trace.profile:
+            self._sampler.remove(trace)
+            try:
+                self._write_profile(trace)
+            except Exception as e:
+                logger.error(f"Failed to write profile {trace.trace_id}: {e}")
+        logger.debug(
+            f"Trace {trace.trace_id} {trace.name}: {len(trace.spans)} spans "
+            f"in {trace.duration:.3f}s"
+        )
+
+    def _write_profile(self, trace: Trace) -> None:
+        base_path = os.path.join(get_profiles_folder(), trace.trace_id)
+        with open(f"{base_path}.folded", "w", encoding="utf-8") as f:
+            f.write(trace.folded_stacks())
+        with open(f"{base_path}.json", "w", encoding="utf-8") as f:
+            json.dump(trace.to_dict(), f)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        for trace in self._traces:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+    def recent(self) -> list[dict]:
+        return [trace.summary() for trace in reversed(self._traces)]
+
+
+tracer = Tracer()
+
+
+class TracingMiddleware:
+    """Trace requests that ask for it with the trace header or are sampled"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = tracer.choose(Headers(scope=scope).get(TRACE_HEADER))
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace = tracer.start(f"{scope['method']} {scope['path']}", profile)
+        token = _current_trace.set(trace)
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                trace.status_code = message["status"]
+                MutableHeaders(scope=message).append(TRACE_ID_HEADER, trace.trace_id)
+            await send(message)
+
+        try:
+            # Streamed responses finish inside this call, so their spans are included
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _current_trace.reset(token)
+            tracer.finish(trace)
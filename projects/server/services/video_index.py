@@ -0,0 +1,155 @@
+import os
+import bisect
+import logging
+import cv2
+from typing import Optional
+from pydantic import BaseModel
+
+from services.path import hash_file
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_FILE_SUFFIX = ".index.json"
+INDEX_VERSION = 2
+
+_index_flight = SingleFlight()
+
+
+class VideoIndex(BaseModel):
+    version: int = INDEX_VERSION
+    source_size: int
+    source_mtime: float
+    source_sha256: str
+    fps: float
+    frame_count: int
+    keyframes: list[int]
+    frame_pts: list[float]
+
+    @property
+    def duration(self) -> float:
+        return self.frame_count / self.fps
+
+    @property
+    def gop_size(self) -> int:
+        """Longest distance between two keyframes, in frames"""
+        bounds = self.keyframes + [self.frame_count]
+        return max(b - a for a, b in zip(bounds, bounds[1:]))
+
+    def frame_at(self, timestamp: float) -> int:
+        """Map a presentation timestamp in seconds to the frame shown at that time"""
+        if not self.frame_pts:
+            return int(timestamp * self.fps)
+        position = bisect.bisect_right(self.frame_pts, timestamp * 1000 + 1e-6)
+        return max(position - 1, 0)
+
+    def keyframe_before(self, frame_number: int) -> int:
+        position = bisect.bisect_right(self.keyframes, frame_number)
+        return self.keyframes[position - 1] if position else 0
+
+
+def get_index_path(video_path: str) -> str:
+    return f"{video_path}{INDEX_FILE_SUFFIX}"
+
+
+def _open_packet_capture(video_path: str) -> tuple[cv2.VideoCapture, bool]:
+    # Raw packet mode demuxes without decoding and exposes keyframe flags
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if cap.isOpened():
+        return cap, True
+
+    logger.warning("Raw packet capture unavailable, indexing with full decode")
+    return cv2.VideoCapture(video_path), False
+
+
+def build_video_index(video_path: str) -> VideoIndex:
+    logger.info(f"Building seek index for video: {video_path}")
+
+    stat = os.stat(video_path)
+    cap, raw = _open_packet_capture(video_path)
+
+    if not cap.isOpened():
+        logger.error(f"Cannot open video file: {video_path}")
+        raise ValueError(f"Cannot open video file: {video_path}")
+
+    packets = []
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        while cap.grab():
+            pts = cap.get(cv2.CAP_PROP_POS_MSEC)
+            is_keyframe = raw and bool(cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME))
+            packets.append((pts, is_keyframe))
+    finally:
+        cap.release()
+
+    if fps <= 0:
+        raise ValueError(f"Invalid video FPS: {fps}")
+
+    # Packets arrive in decode order; frame numbers follow presentation order
+    packets.sort(key=lambda packet: packet[0])
+    keyframes = [i for i, (_, is_keyframe) in enumerate(packets) if is_keyframe]
+    if not keyframes or keyframes[0] != 0:
+        keyframes.insert(0, 0)
+
+    index = VideoIndex(
+        source_size=stat.st_size,
+        source_mtime=stat.st_mtime,
+        source_sha256=hash_file(video_path),
+        fps=fps,
+        frame_count=len(packets),
+        keyframes=keyframes,
+        frame_pts=[pts for pts, _ in packets],
+    )
+    logger.info(
+        f"Indexed {index.frame_count} frames, {len(keyframes)} keyframes, GOP size: {index.gop_size}"
+    )
+    return index
+
+
+def load_video_index(video_path: str) -> Optional[VideoIndex]:
+    index_path = get_index_path(video_path)
+    if not os.path.exists(index_path):
+        return None
+
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = VideoIndex.model_validate_json(f.read())
+    except Exception as e:
+        logger.warning(f"Discarding unreadable seek index {index_path}: {e}")
+        return None
+
+    stat = os.stat(video_path)
+    if (
+        index.version != INDEX_VERSION
+        or index.source_size != stat.st_size
+        or index.source_mtime != stat.st_mtime
+    ):
+        logger.info(f"Seek index is stale: {index_path}")
+        return None
+
+    return index
+
+
+def save_video_index(video_path: str, index: VideoIndex) -> None:
+    index_path = get_index_path(video_path)
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(index.model_dump_json())
+    os.replace(temp_path, index_path)
+    logger.debug(f"Seek index saved: {index_path}")
+
+
+def _load_or_build_video_index(video_path: str) -> VideoIndex:
+    index = load_video_index(video_path)
+    if index is not None:
+        logger.info(f"Seek index found: {get_index_path(video_path)}")
+        return index
+
+    index = build_video_index(video_path)
+    save_video_index(video_path, index)
+    return index
+
+
+def get_or_build_video_index(video_path: str) -> VideoIndex:
+    return _index_flight.do(video_path, _load_or_build_video_index, video_path)
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Services create their cache folders and job store on import; keep them out of the
+# checkout
+_data_dir = tempfile.mkdtemp(prefix="pixelda-tests-")
+os.environ.setdefault("CACHE_FOLDER", os.path.join(_data_dir, "cache"))
+os.environ.setdefault("JOB_STORE_PATH", os.path.join(_data_dir, "jobs.sqlite3"))
@@ -0,0 +1,161 @@
+import os
+import time
+
+import pytest
+
+from services import asset_cache
+from services.cache_manager import (
+    LOW_WATERMARK,
+    STALE_PARTIAL_SECONDS,
+    CacheArea,
+    CacheManager,
+    touch,
+)
+
+
+def write(folder, name: str, size: int = 100, age: float = 0.0) -> str:
+    path = os.path.join(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    used = time.time() - age
+    os.utime(path, (used, used))
+    return path
+
+
+def remaining(folder) -> set[str]:
+    return set(os.listdir(folder))
+
+
+@pytest.fixture
+def manager():
+    return CacheManager()
+
+
+def make_area(manager: CacheManager, folder, max_bytes: int, **kwargs) -> CacheArea:
+    return manager.register(CacheArea("test", str(folder), max_bytes, **kwargs))
+
+
+def test_under_budget_nothing_is_evicted(manager, tmp_path):
+    for i in range(5):
+        write(tmp_path, f"{i}.png", age=100 * i)
+    area = make_area(manager, tmp_path, 1000)
+
+    assert manager._collect_area(area) == {"evicted": 0, "freed_bytes": 0}
+    assert len(remaining(tmp_path)) == 5
+
+
+def test_evicts_least_recently_used_down_to_the_low_watermark(manager, tmp_path):
+    for i in range(5):
+        write(tmp_path, f"{i}.png", age=100 * i)
+    area = make_area(manager, tmp_path, 400)
+
+    # 500 bytes against a 360 byte target: the two oldest entries go
+    assert area.max_bytes * LOW_WATERMARK == 360
+    assert manager._collect_area(area) == {"evicted": 2, "freed_bytes": 200}
+    assert remaining(tmp_path) == {"0.png", "1.png", "2.png"}
+    assert area.evictions == 2
+    assert area.evicted_bytes == 200
+
+
+def test_touch_keeps_an_entry(manager, tmp_path):
+    for i in range(5):
+        write(tmp_path, f"{i}.png", age=100 * i)
+    touch(os.path.join(tmp_path, "4.png"))
+    area = make_area(manager, tmp_path, 400)
+
+    manager._collect_area(area)
+
+    assert remaining(tmp_path) == {"0.png", "1.png", "4.png"}
+
+
+def test_sidecars_and_directories_are_evicted_whole(manager, tmp_path):
+    write(tmp_path, "old.mp4", age=300)
+    write(tmp_path, "old.json", size=10, age=300)
+    write(tmp_path, "frames/0001.png", age=200)
+    write(tmp_path, "frames/0002.png", age=200)
+    write(tmp_path, "new.mp4")
+    area = make_area(manager, tmp_path, 200)
+
+    assert manager._collect_area(area) == {"evicted": 2, "freed_bytes": 310}
+    assert remaining(tmp_path) == {"new.mp4"}
+
+
+def test_pinned_entries_are_skipped(manager, tmp_path):
+    paths = [write(tmp_path, f"{i}.png", age=100 * i) for i in range(5)]
+    area = make_area(manager, tmp_path, 400)
+
+    with manager.pinned(paths[4]):
+        manager._collect_area(area)
+
+    assert remaining(tmp_path) == {"0.png", "1.png", "4.png"}
+    # Once unpinned it is the oldest again
+    area.max_bytes = 300
+    manager._collect_area(area)
+    assert remaining(tmp_path) == {"0.png", "1.png"}
+
+
+def test_hidden_files_are_left_alone(manager, tmp_path):
+    write(tmp_path, ".index.json", size=1000, age=1000)
+    write(tmp_path, "a.png")
+    area = make_area(manager, tmp_path, 200)
+
+    assert manager._collect_area(area)["evicted"] == 0
+    assert remaining(tmp_path) == {".index.json", "a.png"}
+
+
+def test_stale_partial_files_are_removed_under_budget(manager, tmp_path):
+    write(tmp_path, "stale.mp4.part", age=STALE_PARTIAL_SECONDS + 60)
+    write(tmp_path, "fresh.mp4.part")
+    write(tmp_path, "done.mp4", age=STALE_PARTIAL_SECONDS + 60)
+    area = make_area(manager, tmp_path, 10_000)
+
+    assert manager._collect_area(area) == {"evicted": 1, "freed_bytes": 100}
+    assert remaining(tmp_path) == {"fresh.mp4.part", "done.mp4"}
+
+
+def test_fresh_partial_files_are_kept_over_budget(manager, tmp_path):
+    write(tmp_path, "writing.mp4.part", size=1000, age=3600)
+    write(tmp_path, "done.mp4")
+    area = make_area(manager, tmp_path, 100)
+
+    manager._collect_area(area)
+
+    assert remaining(tmp_path) == {"writing.mp4.part"}
+
+
+def test_on_evict_receives_the_removed_paths(manager, tmp_path):
+    old = write(tmp_path, "old.mp4", age=200)
+    sidecar = write(tmp_path, "old.json", size=10, age=200)
+    write(tmp_path, "new.mp4")
+    evicted = []
+    area = make_area(manager, tmp_path, 150, on_evict=evicted.extend)
+
+    manager._collect_area(area)
+
+    assert sorted(evicted) == sorted([old, sidecar])
+
+
+def test_evicted_asset_blobs_leave_the_index(manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_cache, "get_assets_folder", lambda: str(tmp_path))
+    monkeypatch.setattr(asset_cache, "_index", None)
+    old_blob = asset_cache.ingest_asset(
+        "a" * 32 + ".png", write(tmp_path, "staging-old.png", size=300)
+    )
+    os.utime(old_blob, (time.time() - 600,) * 2)
+    asset_cache.ingest_asset("b" * 32 + ".png", write(tmp_path, "staging-new.png"))
+    # A second name for the old blob
+    duplicate = write(tmp_path, "staging-dup.png", size=300)
+    asset_cache.ingest_asset("c" * 32 + ".png", duplicate)
+    os.utime(old_blob, (time.time() - 600,) * 2)
+    area = make_area(manager, tmp_path, 200, on_evict=asset_cache._forget_blobs)
+
+    manager._collect_area(area)
+
+    assert not os.path.exists(old_blob)
+    assert asset_cache.get_asset_path("a" * 32 + ".png") is None
+    assert asset_cache.get_asset_path("c" * 32 + ".png") is None
+    assert asset_cache.get_asset_path("b" * 32 + ".png") is not None
+    # The index on disk was rewritten too
+    monkeypatch.setattr(asset_cache, "_index", None)
+    assert set(asset_cache._get_index()) == {"b" * 32 + ".png"}
@@ -0,0 +1,204 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from services import downloader as downloader_module
+from services.downloader import Downloader, IncompleteDownloadError, get_partial_path
+
+BODY = bytes(range(256)) * 64
+
+# How the stub answers each request, in order; the last mode repeats
+MODE_RANGE = "range"  # honours Range with 206 and Content-Range
+MODE_IGNORE_RANGE = "ignore_range"  # always sends the whole body with 200
+MODE_SHORT = "short"  # announces the whole body, then closes halfway through
+MODE_UNSATISFIABLE = "unsatisfiable"  # 416 for any Range request
+
+
+class StubServer:
+    """A local file host whose behaviour each test scripts"""
+
+    def __init__(self):
+        self.modes = [MODE_RANGE]
+        self.requests: list[dict] = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/file.bin"
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_mode(self) -> str:
+        return self.modes.pop(0) if len(self.modes) > 1 else self.modes[0]
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                range_header = self.headers.get("Range")
+                stub.requests.append({"range": range_header})
+                mode = stub._next_mode()
+
+                if range_header and mode == MODE_UNSATISFIABLE:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(BODY)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                if range_header and mode == MODE_RANGE:
+                    start = int(range_header.split("=")[1].rstrip("-"))
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range", f"bytes {start}-{len(BODY) - 1}/{len(BODY)}"
+                    )
+                    body = BODY[start:]
+                else:
+                    self.send_response(200)
+                    body = BODY
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+                if mode == MODE_SHORT:
+                    self.wfile.write(body[: len(body) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def downloader(monkeypatch):
+    monkeypatch.setattr(downloader_module, "RETRY_DELAY", 0)
+    # Small chunks so a dropped connection leaves bytes in the partial file
+    monkeypatch.setattr(downloader_module, "CHUNK_SIZE", 1024)
+    instance = Downloader(parallelism=2, connect_timeout=5, read_timeout=5, retries=2)
+    yield instance
+    instance.shutdown()
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_downloads_into_place_without_a_partial_file(stub, downloader, tmp_path):
+    path = str(tmp_path / "file.bin")
+    assert downloader.download(stub.url, path) == path
+    assert read(path) == BODY
+    assert not os.path.exists(get_partial_path(path))
+    assert stub.requests == [{"range": None}]
+
+
+def test_short_read_resumes_with_a_range_request(stub, downloader, tmp_path):
+    stub.modes = [MODE_SHORT, MODE_RANGE]
+    path = str(tmp_path / "file.bin")
+
+    downloader.download(stub.url, path)
+
+    assert read(path) == BODY
+    assert stub.requests[0] == {"range": None}
+    assert stub.requests[1] == {"range": f"bytes={len(BODY) // 2}-"}
+
+
+def test_partial_file_from_an_earlier_call_is_resumed(stub, downloader, tmp_path):
+    path = str(tmp_path / "file.bin")
+    with open(get_partial_path(path), "wb") as f:
+        f.write(BODY[:1000])
+
+    downloader.download(stub.url, path)
+
+    assert read(path) == BODY
+    assert stub.requests == [{"range": "bytes=1000-"}]
+
+
+def test_ignored_range_restarts_from_the_beginning(stub, downloader, tmp_path):
+    stub.modes = [MODE_IGNORE_RANGE]
+    path = str(tmp_path / "file.bin")
+    with open(get_partial_path(path), "wb") as f:
+        f.write(BODY[:1000])
+
+    downloader.download(stub.url, path)
+
+    # Overwritten, not appended to
+    assert read(path) == BODY
+    assert stub.requests == [{"range": "bytes=1000-"}]
+
+
+def test_unsatisfiable_range_discards_the_partial_file(stub, downloader, tmp_path):
+    stub.modes = [MODE_UNSATISFIABLE, MODE_RANGE]
+    path = str(tmp_path / "file.bin")
+    with open(get_partial_path(path), "wb") as f:
+        f.write(b"x" * (len(BODY) + 10))
+
+    downloader.download(stub.url, path)
+
+    assert read(path) == BODY
+    assert [r["range"] for r in stub.requests] == [f"bytes={len(BODY) + 10}-", None]
+
+
+def test_gives_up_after_the_retries(stub, downloader, tmp_path):
+    stub.modes = [MODE_SHORT]
+    path = str(tmp_path / "file.bin")
+
+    with pytest.raises((requests.RequestException, IncompleteDownloadError)):
+        downloader.download(stub.url, path)
+
+    assert len(stub.requests) == downloader.retries + 1
+    assert not os.path.exists(path)
+
+
+def test_concurrent_calls_for_one_path_share_a_transfer(stub, downloader, tmp_path):
+    path = str(tmp_path / "file.bin")
+    finalized = []
+
+    def finalize(partial: str) -> str:
+        finalized.append(partial)
+        return partial
+
+    futures = [downloader.submit(stub.url, path, finalize=finalize) for _ in range(5)]
+
+    assert {future.result() for future in futures} == {path}
+    assert len(stub.requests) == 1
+    assert finalized == [path]
+
+
+class FakeResponse:
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+@pytest.mark.parametrize(
+    "headers, offset, expected",
+    [
+        ({"Content-Range": "bytes 100-199/200", "Content-Length": "100"}, 100, 200),
+        ({"Content-Range": "bytes 100-199/*"}, 100, None),
+        ({"Content-Length": "150"}, 50, 200),
+        ({"Content-Length": "150", "Content-Encoding": "gzip"}, 0, None),
+        ({}, 0, None),
+    ],
+)
+def test_expected_size(headers, offset, expected):
+    assert Downloader._expected_size(FakeResponse(headers), offset) == expected
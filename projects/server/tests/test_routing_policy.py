@@ -0,0 +1,208 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services import routing_policy as routing
+from services.routing_policy import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    CircuitBreaker,
+    RollingStats,
+    RoutingPolicy,
+    get_routing_settings,
+)
+from defs import ROUTING_FAILOVER
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(routing, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def settings():
+    return {
+        **get_routing_settings(),
+        "window": 20,
+        "min_samples": 10,
+        "breaker_error_rate": 0.5,
+        "breaker_failures": 3,
+        "breaker_cooldown": 30.0,
+    }
+
+
+def test_breaker_trips_after_consecutive_failures(clock, settings):
+    breaker = CircuitBreaker(settings)
+    assert breaker.record(False) is None
+    assert breaker.record(False) is None
+    assert breaker.allow()
+
+    assert breaker.record(False) == BREAKER_OPEN
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.trips == 1
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_consecutive_failures(clock, settings):
+    breaker = CircuitBreaker(settings)
+    for _ in range(2):
+        breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.consecutive_failures == 1
+
+
+def test_breaker_trips_on_error_rate_once_enough_samples(clock, settings):
+    breaker = CircuitBreaker(settings)
+    # Alternating outcomes never reach the consecutive limit
+    for _ in range(4):
+        assert breaker.record(False) is None
+        assert breaker.record(True) is None
+    assert breaker.record(False) is None
+    assert breaker.state == BREAKER_CLOSED
+
+    # The tenth outcome makes the window big enough to judge: 5 of 10 failed
+    assert breaker.record(False) == BREAKER_OPEN
+
+
+def test_breaker_stays_closed_below_error_rate(clock, settings):
+    breaker = CircuitBreaker(settings)
+    for _ in range(10):
+        breaker.record(True)
+        breaker.record(True)
+        breaker.record(False)
+    assert breaker.state == BREAKER_CLOSED
+
+
+def test_open_breaker_lets_one_probe_through_after_cooldown(clock, settings):
+    breaker = CircuitBreaker(settings)
+    for _ in range(3):
+        breaker.record(False)
+
+    clock.advance(29.9)
+    assert not breaker.allow()
+    assert breaker.state == BREAKER_OPEN
+
+    clock.advance(0.1)
+    assert breaker.allow()
+    assert breaker.state == BREAKER_HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+
+
+def test_half_open_probe_is_retried_when_its_outcome_never_arrives(clock, settings):
+    breaker = CircuitBreaker(settings)
+    for _ in range(3):
+        breaker.record(False)
+    clock.advance(30)
+    assert breaker.allow()
+
+    clock.advance(29)
+    assert not breaker.allow()
+    clock.advance(1)
+    assert breaker.allow()
+    assert breaker.state == BREAKER_HALF_OPEN
+
+
+def test_half_open_success_closes(clock, settings):
+    breaker = CircuitBreaker(settings)
+    for _ in range(3):
+        breaker.record(False)
+    clock.advance(30)
+    assert breaker.allow()
+
+    assert breaker.record(True) == BREAKER_CLOSED
+    assert breaker.allow()
+    assert breaker.allow()
+    # The failures before the trip no longer count towards the error rate
+    assert list(breaker.outcomes) == []
+    assert breaker.consecutive_failures == 0
+
+
+def test_half_open_failure_reopens_for_another_cooldown(clock, settings):
+    breaker = CircuitBreaker(settings)
+    for _ in range(3):
+        breaker.record(False)
+    clock.advance(30)
+    assert breaker.allow()
+
+    assert breaker.record(False) == BREAKER_OPEN
+    assert breaker.trips == 2
+    assert not breaker.allow()
+    clock.advance(30)
+    assert breaker.allow()
+
+
+def test_rolling_stats_leave_abandoned_attempts_out_of_the_error_rate(clock):
+    stats = RollingStats(window=10, window_seconds=60)
+    stats.add(1.0, True)
+    stats.add(2.0, False)
+    stats.add(8.0, None)
+    stats.add(9.0, None)
+
+    summary = stats.summary()
+    assert summary["samples"] == 4
+    assert summary["error_rate"] == 0.5
+    # Abandoned attempts are slow lower bounds, so they stay in the latencies;
+    # failures say nothing about how long a result takes
+    assert stats.latency_percentile(100, min_samples=1) == 9.0
+    assert summary["p50"] == 8.0
+
+
+def test_rolling_stats_need_min_samples_for_a_percentile(clock):
+    stats = RollingStats(window=10, window_seconds=60)
+    for latency in (1.0, 2.0):
+        stats.add(latency, True)
+    stats.add(3.0, False)
+
+    assert stats.latency_percentile(90, min_samples=3) is None
+    assert stats.latency_percentile(90, min_samples=2) == 2.0
+
+
+def test_rolling_stats_forget_samples_outside_the_window(clock):
+    stats = RollingStats(window=3, window_seconds=60)
+    stats.add(1.0, False)
+    clock.advance(61)
+    stats.add(2.0, True)
+    assert stats.summary()["samples"] == 1
+    assert stats.summary()["error_rate"] == 0.0
+
+    for latency in (3.0, 4.0, 5.0):
+        stats.add(latency, True)
+    assert stats.latency_percentile(0, min_samples=1) == 3.0
+
+
+def test_abandoned_attempts_do_not_trip_the_breaker(clock, settings):
+    policy = RoutingPolicy()
+    policy.settings = settings
+    for _ in range(10):
+        policy.record_abandoned("doubao", "video", 120.0)
+    assert policy.allow("doubao")
+    assert policy.stats()["doubao"]["consecutive_failures"] == 0
+
+
+def test_plan_starts_on_a_healthy_alternate_while_the_primary_is_open(clock, settings):
+    policy = RoutingPolicy()
+    policy.settings = settings
+    for _ in range(3):
+        policy.record_failure("tongyi", "video", 5.0)
+
+    request = SimpleNamespace(
+        routing=ROUTING_FAILOVER, model_type="tongyi", fallback_api_key="key"
+    )
+    assert policy.plan("video", request)[:2] == ["doubao", "tongyi"]
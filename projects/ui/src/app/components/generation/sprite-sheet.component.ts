@@ -5,7 +5,7 @@ import { TranslateModule } from '@ngx-translate/core';
 import {
   GenerationService,
   FrameSplitRequest,
-  FrameSplitResponse,
+  FrameSplitEvent,
 } from '../../services/generation.service';
 import { SettingsService } from '../../services/settings.service';
 
@@ -163,17 +163,21 @@ export class SpriteSheetComponent implements OnInit, OnDestroy {
       count: this.splitCount,
     };
 
-    this.generationService.splitVideoFrames(request).subscribe({
-      next: (response: FrameSplitResponse) => {
+    const frames: string[] = [];
+    this.generationService.splitVideoFramesStream(request).subscribe({
+      next: (event: FrameSplitEvent) => {
+        if (event.event === 'frame' && event.url && event.index !== undefined) {
+          frames[event.index] = event.url;
+          this.generatedFrames.set(frames.filter((url) => !!url));
+        } else if (event.event === 'error') {
+          this.errorMessage.set(event.error_info || 'SPRITE_SHEET.ERROR_SPLIT_FAILED');
+        }
+      },
+      complete: () => {
         this.isSplitting.set(false);
+        this.selectedFrames.clear();
 
-        if (response.frames && response.frames.length > 0) {
-          this.generatedFrames.set(response.frames);
-          this.selectedFrames.clear();
-          this.errorMessage.set('');
-        } else if (response.error_info) {
-          this.errorMessage.set(response.error_info);
-        } else {
+        if (this.generatedFrames().length === 0 && !this.errorMessage()) {
           this.errorMessage.set('SPRITE_SHEET.ERROR_NO_FRAMES_GENERATED');
         }
       },
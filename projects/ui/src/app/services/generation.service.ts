@@ -1,5 +1,10 @@
 import { Injectable } from '@angular/core';
-import { HttpClient, HttpErrorResponse } from '@angular/common/http';
+import {
+  HttpClient,
+  HttpDownloadProgressEvent,
+  HttpErrorResponse,
+  HttpEventType,
+} from '@angular/common/http';
 import { Observable, throwError } from 'rxjs';
 import { catchError } from 'rxjs/operators';
 
@@ -45,6 +50,16 @@ export interface FrameSplitResponse {
   error_info?: string;
 }
 
+export interface FrameSplitEvent {
+  event: 'frame' | 'done' | 'error';
+  task_id: string;
+  index?: number;
+  timestamp?: number;
+  url?: string;
+  count?: number;
+  error_info?: string;
+}
+
 export interface ZipFramesRequest {
   name: string;
   frame_urls: string[];
@@ -53,6 +68,7 @@ export interface ZipFramesRequest {
 
 export interface GenerationResponse {
   url: string;
+  asset_url?: string;
   task_id?: string;
   error_info?: string;
 }
@@ -89,6 +105,10 @@ export class GenerationService {
       .pipe(catchError(this.handleError));
   }
 
+  splitVideoFramesStream(request: FrameSplitRequest): Observable<FrameSplitEvent> {
+    return this.postNdjsonStream<FrameSplitEvent>('/generate/video_split_frames/stream', request);
+  }
+
   zipFrames(request: ZipFramesRequest): Observable<Blob> {
     return this.http
       .post(`${this.apiUrl}/frames/zip`, request, { responseType: 'blob' })
@@ -101,6 +121,45 @@ export class GenerationService {
     return `${prefix}_${timestamp}_${randomSuffix}`;
   }
 
+  private postNdjsonStream<T>(path: string, body: unknown): Observable<T> {
+    return new Observable<T>((subscriber) => {
+      let consumed = 0;
+      const emitLines = (text: string, final: boolean) => {
+        const end = final ? text.length : text.lastIndexOf('\n') + 1;
+        if (end <= consumed) {
+          return;
+        }
+        const lines = text.substring(consumed, end).split('\n');
+        consumed = end;
+        for (const line of lines) {
+          if (line.trim()) {
+            subscriber.next(JSON.parse(line) as T);
+          }
+        }
+      };
+
+      const subscription = this.http
+        .post(`${this.apiUrl}${path}`, body, {
+          observe: 'events',
+          reportProgress: true,
+          responseType: 'text',
+        })
+        .subscribe({
+          next: (event) => {
+            if (event.type === HttpEventType.DownloadProgress) {
+              emitLines((event as HttpDownloadProgressEvent).partialText ?? '', false);
+            } else if (event.type === HttpEventType.Response) {
+              emitLines(event.body ?? '', true);
+              subscriber.complete();
+            }
+          },
+          error: (error) => subscriber.error(error),
+        });
+
+      return () => subscription.unsubscribe();
+    }).pipe(catchError(this.handleError));
+  }
+
   private handleError(error: HttpErrorResponse) {
     let errorMessage = 'An unknown error occurred!';
     if (error.error instanceof ErrorEvent) {